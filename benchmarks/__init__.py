@@ -0,0 +1,3 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks of the client's parsing, battle state update and decision hot
+paths. Run them with ``python -m benchmarks.bench``."""
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""Runs the benchmarks and writes their results as JSON
+
+Each benchmark runs its function once per payload of the corpus, for a
+number of rounds. The default corpus is synthetic: the frames of the mock
+server's scripted battles, not payloads recorded from Showdown. Pass a
+transcript recorded with Client(transcript_path=...) with --transcript to
+benchmark real battles. Results hold the time per call of the best, median and
+mean rounds, so runs made on different commits can be compared with
+--compare.
+
+Examples:
+    python -m benchmarks.bench -o before.json
+    python -m benchmarks.bench --transcript battles.jsonl.gz
+    python -m benchmarks.bench --compare before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import showdown
+from showdown import logic, utils
+from showdown.room import Battle
+from . import corpus as corpus_module
+
+def measure(func, items, rounds):
+    """
+    Calls func on every item, rounds times, and returns the timings of the
+    rounds.
+    """
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for item in items:
+            func(item)
+        times.append(time.perf_counter() - start)
+    return times
+
+async def measure_async(coro_func, items, rounds, after_round=None):
+    """
+    Like measure, for a coroutine function. after_round is called after each
+    round, outside of the timings.
+    """
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for item in items:
+            await coro_func(item)
+        times.append(time.perf_counter() - start)
+        if after_round is not None:
+            after_round()
+    return times
+
+def summarize(times, ops):
+    """
+    Returns the result of a benchmark from the timings of its rounds and the
+    number of calls made in each round.
+    """
+    best = min(times)
+    return {
+        'ops': ops,
+        'rounds': len(times),
+        'best': best / ops,
+        'median': statistics.median(times) / ops,
+        'mean': statistics.mean(times) / ops,
+        'ops_per_sec': ops / best if best else None
+    }
+
+def _room_id(frame):
+    return utils.parse_socket_input(frame)[0][0]
+
+async def _feed(battle, frame):
+    """
+    Applies frame to battle, as the client and the battle's actor would.
+    """
+    for _, line in utils.parse_socket_input(frame):
+        battle.add_content(utils.ParsedLine(line, battle.id))
+    if '|request|' in frame:
+        await battle.update_own_team(frame)
+    elif '|turn|' in frame:
+        battle.add_turn()
+        await battle.update_turn(frame)
+    elif 'pokemonnamecol' in frame:
+        battle.update_smogon_data_pokemon(frame)
+    elif 'movenamecol' in frame:
+        battle.update_smogon_data_move(frame)
+
+async def prepare_battle(client, corpus):
+    """
+    Returns a Battle ready to decide, built from the frames of the first
+    battle of the corpus with a request.
+    """
+    room_id = _room_id(corpus.requests[0])
+    battle = Battle(room_id, client=client)
+    for frame in corpus.frames:
+        if _room_id(frame) != room_id:
+            continue
+        await _feed(battle, frame)
+        if battle.opponent_team is not None and battle._data_status()[0]:
+            break
+    else:
+        raise ValueError('No battle of the corpus received all its data')
+    return battle
+
+def _drain(client):
+    while not client.output_queue.empty():
+        client.output_queue.get_nowait()
+
+async def run_benchmarks(corpus, rounds=5, only=None):
+    """
+    |coro|
+
+    Runs the benchmarks on corpus and returns their results, as a dict of
+    {name : result}. only is an optional collection of the names of the
+    benchmarks to run.
+    """
+    client = showdown.Client(send_interval=0)
+    # The state update benchmarks change the state of their battle, the
+    # decision ones get a battle of their own
+    battle = await prepare_battle(client, corpus)
+    deciding_battle = await prepare_battle(client, corpus)
+    _drain(client)
+    own = deciding_battle.own_team.get_active_pokemon()
+    opponent = deciding_battle.opponent_team.get_active_pokemon()
+    opponent.set_stats_enemy_pokemon()
+    attacks = [(own, opponent, move) for move in own.get_possible_moves()]
+    pokemons = [pokemon for pokemon in deciding_battle.own_team.pokemons
+        if pokemon.get_possible_moves()]
+
+    sync_benchmarks = {
+        'parse_socket_input': (utils.parse_socket_input, corpus.frames),
+        'parse_text_input': (utils.parse_text_input, corpus.lines),
+        'to_team_str': (utils.to_team_str, corpus.teams * 100),
+        'update_smogon_data_pokemon': (battle.update_smogon_data_pokemon,
+            corpus.pokemon_data),
+        'update_smogon_data_move': (battle.update_smogon_data_move,
+            corpus.move_data),
+        'damage_calcul': (lambda args: logic.damage_calcul(*args),
+            attacks * 250),
+        'select_move': (lambda pokemon: logic.select_move(pokemon, opponent),
+            pokemons * 250),
+    }
+    async_benchmarks = {
+        'update_turn': (battle.update_turn, corpus.turns),
+        'update_own_team': (battle.update_own_team, corpus.requests),
+        'select_best_decision': (
+            lambda _: deciding_battle.select_best_decision(),
+            range(200)),
+    }
+
+    results = {}
+    for name, (func, items) in sync_benchmarks.items():
+        if only and name not in only:
+            continue
+        items = list(items)
+        results[name] = summarize(measure(func, items, rounds), len(items))
+    for name, (coro_func, items) in async_benchmarks.items():
+        if only and name not in only:
+            continue
+        items = list(items)
+        times = await measure_async(coro_func, items, rounds,
+            after_round=lambda: _drain(client))
+        results[name] = summarize(times, len(items))
+    return results
+
+def git_commit():
+    """
+    Returns the commit the benchmarks run on, or None outside of a git
+    repository.
+    """
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline):
+    """
+    Returns the lines of a report comparing the best time per call of
+    results to the ones of baseline.
+    """
+    lines = ['{:<28} {:>12} {:>12} {:>8}'.format('benchmark', 'baseline',
+        'current', 'speedup')]
+    for name, result in results['benchmarks'].items():
+        base = baseline['benchmarks'].get(name, None)
+        if base is None:
+            continue
+        lines.append('{:<28} {:>10.2f}us {:>10.2f}us {:>7.2f}x'.format(name,
+            base['best'] * 1e6, result['best'] * 1e6,
+            base['best'] / result['best']))
+    return lines
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the benchmarks of '
+        'the client\'s hot paths.')
+    parser.add_argument('-o', '--output', help='File the JSON results are '
+        'written to. Defaults to stdout.')
+    parser.add_argument('--transcript', help='Transcript of real battles the '
+        'corpus is read from. Defaults to a synthetic corpus made of the mock '
+        'server\'s scripted battles.')
+    parser.add_argument('--battles', type=int, default=10, help='Number of '
+        'scripted battles in the synthetic corpus.')
+    parser.add_argument('--turns', type=int, default=10, help='Number of '
+        'turns of each scripted battle of the synthetic corpus.')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--only', nargs='+', help='Names of the benchmarks '
+        'to run.')
+    parser.add_argument('--compare', help='Results of a previous run to '
+        'compare with, printed to stderr.')
+    args = parser.parse_args(argv)
+
+    if args.transcript:
+        corpus = corpus_module.transcript_corpus(args.transcript)
+    else:
+        corpus = corpus_module.mock_corpus(args.battles, args.turns)
+    benchmarks = asyncio.run(run_benchmarks(corpus, rounds=args.rounds,
+        only=args.only))
+    results = {
+        'commit': git_commit(),
+        'time': time.time(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'corpus': dict(corpus.summary(),
+            source=args.transcript or 'mockserver'),
+        'benchmarks': benchmarks
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'wt') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    if args.compare:
+        with open(args.compare, 'rt') as f:
+            baseline = json.load(f)
+        print('\n'.join(compare(results, baseline)), file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
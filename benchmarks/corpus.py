@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""Module building the payloads the benchmarks run on
+
+The default corpus is synthetic. It is made of the frames
+showdown.mockserver sends during its scripted battles, which follow the
+format of Showdown's frames but are not recorded from a server. A
+transcript recorded with Client(transcript_path=...) can be used instead,
+so benchmarks run on real battles.
+"""
+import os
+from showdown import mockserver, transcript, utils
+
+TEAM_PATH = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'data', 'mono-ghost.txt')
+
+PLAYER_NAME = 'benchbot'
+
+class Corpus:
+    """
+    Payloads of the benchmarks, sorted by kind.
+
+    Attributes:
+        frames (:obj:`list`) : Every websocket frame, in order.
+        lines (:obj:`list`) : The protocol lines of the frames.
+        requests (:obj:`list`) : The |request| frames.
+        turns (:obj:`list`) : The frames holding a |turn| line.
+        pokemon_data (:obj:`list`) : The /data responses about pokemons.
+        move_data (:obj:`list`) : The /data responses about moves.
+        teams (:obj:`list`) : Human readable teams, as exported by Showdown's
+            teambuilder.
+    """
+    def __init__(self):
+        self.frames = []
+        self.lines = []
+        self.requests = []
+        self.turns = []
+        self.pokemon_data = []
+        self.move_data = []
+        self.teams = []
+
+    def __repr__(self):
+        return '<Corpus {} frames>'.format(len(self.frames))
+
+    def add_frame(self, frame):
+        """
+        Adds frame to the corpus, filing it under the kinds it belongs to.
+        """
+        self.frames.append(frame)
+        self.lines.extend(line for _, line in utils.parse_socket_input(frame))
+        if '|request|' in frame:
+            self.requests.append(frame)
+        elif '|turn|' in frame:
+            self.turns.append(frame)
+        elif 'pokemonnamecol' in frame:
+            self.pokemon_data.append(frame)
+        elif 'movenamecol' in frame:
+            self.move_data.append(frame)
+
+    def summary(self):
+        return {kind: len(getattr(self, kind)) for kind in ('frames', 'lines',
+            'requests', 'turns', 'pokemon_data', 'move_data', 'teams')}
+
+def mock_corpus(battles=10, turns=10):
+    """
+    Returns the frames of the specified number of scripted battles, as
+    streamed by showdown.mockserver.MockServer.
+    """
+    corpus = Corpus()
+    for battle in range(battles):
+        room_id = 'battle-gen8randombattle-{}'.format(battle + 1)
+        corpus.add_frame(mockserver.init_frame(room_id, PLAYER_NAME,
+            'gen8randombattle'))
+        for turn in range(1, turns + 1):
+            corpus.add_frame(mockserver.request_frame(room_id, PLAYER_NAME,
+                turn))
+            corpus.add_frame(mockserver.turn_frame(room_id, turn))
+            if turn == 1:
+                for data_id in list(mockserver.SPECIES_DATA) \
+                    + list(mockserver.MOVE_DATA):
+                    corpus.add_frame(mockserver.data_frame(room_id, data_id))
+    with open(TEAM_PATH, 'rt') as f:
+        corpus.teams.append(f.read())
+    return corpus
+
+def transcript_corpus(path):
+    """
+    Returns the corpus of the frames received in the transcript at path.
+    """
+    corpus = Corpus()
+    for _, direction, data in transcript.read_transcript(path):
+        if direction == 'in' and data.startswith('a'):
+            corpus.add_frame(data)
+    with open(TEAM_PATH, 'rt') as f:
+        corpus.teams.append(f.read())
+    return corpus
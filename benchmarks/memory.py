@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+"""Runs a long series of battles against the mock server and reports the
+memory the client retains
+
+The client plays battles through showdown.mockserver, keeping a fixed number
+of them running at once. The baseline tracemalloc snapshot is taken once the
+battles of a warm-up have ended and the client has settled, then snapshots
+are taken every few battles, and the allocation sites that grew the most
+since the baseline are reported. Once every battle has ended and the client
+has settled again, the memory retained per battle is compared to a budget,
+and the run exits with status 1 if it is over budget.
+
+Examples:
+    python -m benchmarks.memory --battles 2000 --every 200
+    python -m benchmarks.memory --battles 5000 --budget 1024 -o memory.json
+"""
+import argparse
+import asyncio
+import gc
+import json
+import linecache
+import logging
+import sys
+import time
+import tracemalloc
+import showdown
+from showdown import room
+from showdown.mockserver import MockServer
+
+#Logging setup
+logger = logging.getLogger(__name__)
+
+PLAYER_NAME = 'memorybot'
+
+SEARCH_FORMAT = 'gen8randombattle'
+
+#Allocations made by the harness itself, left out of the snapshots
+SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, linecache.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+def client_state(client):
+    """
+    Returns the sizes of the client's collections that grow with the number
+    of battles played.
+    """
+    return {
+        'rooms': len(client.rooms),
+        'battles': sum(1 for room_obj in client.rooms.values()
+            if isinstance(room_obj, room.Battle)),
+        'users': len(client.users),
+        'tasks': client.task_counts(),
+        'log_bytes': client.log_store.memory_usage()['total'],
+        'traces': len(client.tracer)
+    }
+
+def take_snapshot():
+    """
+    Collects garbage and returns a filtered tracemalloc snapshot.
+    """
+    gc.collect()
+    return tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+
+def _traced(snapshot):
+    return sum(stat.size for stat in snapshot.statistics('filename'))
+
+def growth_sites(snapshot, baseline, top=15, key_type='lineno'):
+    """
+    Returns the top allocation sites of snapshot, sorted by the memory they
+    gained since baseline, as dicts.
+    """
+    sites = []
+    for stat in snapshot.compare_to(baseline, key_type)[:top]:
+        frame = stat.traceback[0]
+        sites.append({
+            'site': '{}:{}'.format(frame.filename, frame.lineno),
+            'size_diff': stat.size_diff,
+            'size': stat.size,
+            'count_diff': stat.count_diff,
+            'traceback': stat.traceback.format()
+                if len(stat.traceback) > 1 else None
+        })
+    return sites
+
+class MemoryClient(showdown.Client):
+    """
+    Client of the runs, which signals when it is logged in.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.logged_in = asyncio.Event()
+
+    async def on_login(self, login_response):
+        self.logged_in.set()
+
+class MemoryRun:
+    """
+    Plays battles against a mock server and snapshots the client's memory
+    along the way.
+
+    Args:
+        battles (:obj:`int`) : The number of battles played after the
+            warm-up.
+        every (:obj:`int`) : The number of battles between two snapshots.
+            The warm-up is as long.
+        concurrency (:obj:`int`) : The number of battles running at once.
+        turns (:obj:`int`) : The number of turns of each battle.
+        top (:obj:`int`) : The number of growth sites reported per snapshot.
+        settle_timeout (:obj:`int` or obj:`float`) : Seconds given to the
+            client to release its battles once they have all ended, after
+            the warm-up and at the end of the run.
+
+    Attributes:
+        snapshots (:obj:`list`) : The reports of the snapshots taken, as
+            dicts with the number of battles finished, the memory traced and
+            its growth, the growth sites and the state of the client.
+    """
+    def __init__(self, battles, every, concurrency=50, turns=3, top=15,
+        settle_timeout=10):
+        assert battles > 0, 'battles should be strictly positive'
+        assert every > 0, 'every should be strictly positive'
+        assert concurrency > 0, 'concurrency should be strictly positive'
+        self.battles = battles
+        self.every = every
+        self.concurrency = concurrency
+        self.turns = turns
+        self.top = top
+        self.settle_timeout = settle_timeout
+        self.snapshots = []
+        self._baseline = None
+        self._baseline_traced = 0
+        self._baseline_finished = 0
+
+    async def run(self):
+        """
+        |coro|
+
+        Plays the warm-up and the battles, and returns the report of the
+        last snapshot, taken once the client has settled.
+        """
+        async with MockServer(port=0, turns=self.turns) as mock:
+            client = MemoryClient(PLAYER_NAME, 'password',
+                send_interval=0, battle_concurrency=self.concurrency,
+                watchdog_threshold=None, **mock.client_kwargs())
+            mock.attach(client)
+            client.start()
+            try:
+                await client.logged_in.wait()
+                # The baseline is taken without any live battle, like the
+                # last snapshot
+                await self._play(client, mock, self.every)
+                await self._settle(client, mock)
+                await self._play(client, mock, self.battles, self.every)
+                return await self._settle(client, mock)
+            finally:
+                await self._disconnect(client)
+
+    async def _disconnect(self, client):
+        """
+        Closes the client's websocket and waits for its tasks to stop.
+        """
+        if client.websocket is not None:
+            await client.websocket.close()
+        deadline = time.monotonic() + self.settle_timeout
+        while client.connected and time.monotonic() < deadline:
+            await asyncio.sleep(.05)
+        client._on_disconnect()
+
+    async def _play(self, client, mock, battles, every=None):
+        """
+        Plays battles, taking a snapshot every few battles if every is given.
+        """
+        start = mock.stats['battles_finished']
+        total = start + battles
+        searched = start
+        next_snapshot = start + every if every is not None else None
+        while mock.stats['battles_finished'] < total:
+            finished = mock.stats['battles_finished']
+            while searched < total and searched - finished < self.concurrency:
+                await client.add_output('|/search {}'.format(SEARCH_FORMAT))
+                searched += 1
+            if next_snapshot is not None and finished >= next_snapshot \
+                and finished < total:
+                self._snapshot(client, finished)
+                next_snapshot += every
+            await asyncio.sleep(.01)
+
+    async def _settle(self, client, mock):
+        """
+        Waits for the client to release its rooms and empty its queues, or
+        for settle_timeout, then takes a snapshot. The first one is the
+        baseline.
+        """
+        deadline = time.monotonic() + self.settle_timeout
+        while time.monotonic() < deadline:
+            if not client.rooms and client.input_queue.empty() \
+                and client.output_queue.empty():
+                break
+            await asyncio.sleep(.05)
+        else:
+            logger.warning('The client still had %d rooms after %s seconds',
+                len(client.rooms), self.settle_timeout)
+        return self._snapshot(client, mock.stats['battles_finished'])
+
+    def _snapshot(self, client, finished):
+        snapshot = take_snapshot()
+        traced = _traced(snapshot)
+        if self._baseline is None:
+            self._baseline = snapshot
+            self._baseline_traced = traced
+            self._baseline_finished = finished
+        battles = finished - self._baseline_finished
+        growth = traced - self._baseline_traced
+        report = {
+            'battles_finished': finished,
+            'time': time.time(),
+            'traced': traced,
+            'growth': growth,
+            'per_battle': growth / battles if battles else None,
+            'sites': growth_sites(snapshot, self._baseline, self.top,
+                'traceback' if tracemalloc.get_traceback_limit() > 1
+                else 'lineno'),
+            'client': client_state(client)
+        }
+        self.snapshots.append(report)
+        logger.info('%d battles finished, %d bytes traced (%+d since the '
+            'baseline)', finished, traced, growth)
+        return report
+
+def format_report(report, budget=None):
+    """
+    Returns the lines of a human readable report of a snapshot.
+    """
+    lines = ['{} battles finished, {:.1f} KiB traced, {:+.1f} KiB since the '
+        'baseline'.format(report['battles_finished'], report['traced'] / 1024,
+        report['growth'] / 1024)]
+    if report['per_battle'] is not None:
+        lines.append('Retained per battle: {:.0f} bytes{}'.format(
+            report['per_battle'], ' (budget {})'.format(budget)
+            if budget is not None else ''))
+    lines.append('Client: {}'.format(json.dumps(report['client'])))
+    lines.append('Top growth sites:')
+    for site in report['sites']:
+        lines.append('  {:>+10.1f} KiB {:>+8d} blocks  {}'.format(
+            site['size_diff'] / 1024, site['count_diff'], site['site']))
+        if site['traceback']:
+            lines.extend('      ' + line for line in site['traceback'])
+    return lines
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Play many battles against '
+        'the mock server and report the memory the client retains.')
+    parser.add_argument('--battles', type=int, default=2000, help='Number of '
+        'battles played after the warm-up.')
+    parser.add_argument('--every', type=int, default=200, help='Number of '
+        'battles between two snapshots, and length of the warm-up.')
+    parser.add_argument('--concurrency', type=int, default=50, help='Number '
+        'of battles running at once.')
+    parser.add_argument('--turns', type=int, default=3)
+    parser.add_argument('--budget', type=float, default=2048, help='Bytes '
+        'the client may retain per battle once every battle has ended.')
+    parser.add_argument('--top', type=int, default=15, help='Number of growth '
+        'sites reported.')
+    parser.add_argument('--frames', type=int, default=1, help='Number of '
+        'frames kept per allocation. Above 1, growth sites are reported with '
+        'their traceback.')
+    parser.add_argument('--settle-timeout', type=float, default=10)
+    parser.add_argument('-o', '--output', help='File the JSON reports of '
+        'every snapshot are written to.')
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper())
+
+    memory_run = MemoryRun(args.battles, args.every, args.concurrency,
+        args.turns, args.top, args.settle_timeout)
+    tracemalloc.start(args.frames)
+    try:
+        report = asyncio.run(memory_run.run())
+    finally:
+        tracemalloc.stop()
+
+    if args.output:
+        with open(args.output, 'wt') as f:
+            json.dump({'budget': args.budget, 'snapshots':
+                memory_run.snapshots}, f, indent=2)
+    print('\n'.join(format_report(report, args.budget)))
+    if report['per_battle'] is not None and report['per_battle'] > args.budget:
+        print('Over budget: {:.0f} bytes retained per battle, budget is '
+            '{:.0f}'.format(report['per_battle'], args.budget),
+            file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""Module for the BattleArchive class, a compressed on-disk battle log store"""
+import gzip
+import json
+import logging
+import os
+import time
+import zlib
+
+#Logging setup
+logger = logging.getLogger(__name__)
+
+INDEX_FILE_NAME = 'index.jsonl'
+SEGMENT_FILE_NAME = 'segment-{:05d}.gz'
+
+class BattleArchive:
+    """
+    Append-only archive of battle protocol logs. The lines of each battle are
+    compressed as they arrive. Once the battle is finished, its compressed
+    log is appended as a gzip member to the current segment file, and an
+    entry describing it is appended to an index file. Segment files are
+    regular gzip files and can be read with any gzip tool.
+
+    Args:
+        directory (:obj:`str`) : Directory holding the segment files and the
+            index. Created if it doesn't exist.
+        segment_size (:obj:`int`, optional) : Size in bytes past which a new
+            segment file is started. Defaults to 64 MiB.
+        compress_level (:obj:`int`, optional) : zlib compression level, from 1
+            (fastest) to 9 (smallest). Defaults to 6.
+
+    Attributes:
+        stats (:obj:`dict`) : Number of battles archived, lines received, and
+            raw and compressed bytes written.
+
+    Notes:
+        Index entries are JSON objects with the keys room_id, segment, offset,
+        length, format, rated, players, winner (the winner's name, 'tie', or
+        None if the battle didn't finish), lines, start and end.
+    """
+    def __init__(self, directory, segment_size=64 * 2 ** 20, compress_level=6):
+        assert segment_size > 0, 'segment_size should be strictly positive'
+        self.directory = directory
+        self.segment_size = segment_size
+        self.compress_level = compress_level
+        self.stats = {
+            'battles': 0,
+            'lines': 0,
+            'raw_bytes': 0,
+            'compressed_bytes': 0
+        }
+        self._open = {}
+        os.makedirs(directory, exist_ok=True)
+        self._segment = self._last_segment()
+
+    def __len__(self):
+        return len(self._open)
+
+    def __repr__(self):
+        return '<BattleArchive `{}` open={}>'.format(self.directory, len(self))
+
+    def _last_segment(self):
+        segments = [name for name in os.listdir(self.directory)
+            if name.startswith('segment-') and name.endswith('.gz')]
+        return int(max(segments)[8:13]) if segments else 0
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, SEGMENT_FILE_NAME.format(segment))
+
+    def append(self, room_id, line):
+        """
+        Adds a protocol line to the log of the battle specified by room_id,
+        starting a new log if there is none open for it.
+        """
+        entry = self._open.get(room_id, None)
+        if entry is None:
+            compressor = zlib.compressobj(self.compress_level, zlib.DEFLATED,
+                16 + zlib.MAX_WBITS)
+            entry = self._open[room_id] = [compressor, [], 0, time.time(),
+                None]
+        data = (line + '\n').encode()
+        chunk = entry[0].compress(data)
+        if chunk:
+            entry[1].append(chunk)
+        entry[2] += 1
+        if line.startswith('|win|'):
+            entry[4] = line[5:]
+        elif line == '|tie' or line.startswith('|tie|'):
+            entry[4] = 'tie'
+        self.stats['lines'] += 1
+        self.stats['raw_bytes'] += len(data)
+
+    def finish(self, battle):
+        """
+        Writes the log of the specified battle to the current segment file and
+        adds its entry to the index. Does nothing if no log is open for it.
+
+        Args:
+            battle (:obj:`showdown.room.Battle`) : The battle to archive.
+
+        Returns:
+            dict or None : The index entry of the battle, or None if nothing
+                was written.
+        """
+        entry = self._open.pop(battle.id, None)
+        if entry is None:
+            return None
+        compressor, chunks, lines, start, winner = entry
+        chunks.append(compressor.flush())
+        data = b''.join(chunks)
+
+        path = self._segment_path(self._segment)
+        if os.path.exists(path) and os.path.getsize(path) >= self.segment_size:
+            self._segment += 1
+            path = self._segment_path(self._segment)
+        with open(path, 'ab') as f:
+            offset = f.tell()
+            f.write(data)
+
+        index_entry = {
+            'room_id': battle.id,
+            'segment': self._segment,
+            'offset': offset,
+            'length': len(data),
+            'format': battle.tier,
+            'rated': battle.rated,
+            'players': [player.name if player is not None else None
+                for player in (battle.p1, battle.p2)],
+            'winner': winner,
+            'lines': lines,
+            'start': start,
+            'end': time.time()
+        }
+        with open(os.path.join(self.directory, INDEX_FILE_NAME), 'at') as f:
+            f.write(json.dumps(index_entry) + '\n')
+        self.stats['battles'] += 1
+        self.stats['compressed_bytes'] += len(data)
+        return index_entry
+
+    def close(self, rooms=None):
+        """
+        Writes every open log to the archive. The battle objects are looked up
+        in rooms, a dict of {room_id : Battle}. Logs of battles missing from
+        it are discarded.
+        """
+        for room_id in list(self._open):
+            battle = (rooms or {}).get(room_id, None)
+            if battle is not None:
+                self.finish(battle)
+            else:
+                logger.warning('Discarding the log of `{}`'.format(room_id))
+                self._open.pop(room_id)
+
+    def index(self, **filters):
+        """
+        Iterates over the index entries matching every filter. Filters are
+        index keys mapped to the value the entry should have, except for
+        player, which matches entries where either player has that name.
+
+        Ex: archive.index(format='gen8ou', player='Zarel')
+        """
+        player = filters.pop('player', None)
+        path = os.path.join(self.directory, INDEX_FILE_NAME)
+        if not os.path.exists(path):
+            return
+        with open(path, 'rt') as f:
+            for line in f:
+                entry = json.loads(line)
+                if player is not None and player not in entry['players']:
+                    continue
+                if all(entry.get(key) == value
+                    for key, value in filters.items()):
+                    yield entry
+
+    def read(self, entry):
+        """
+        Returns the list of protocol lines of the battle described by entry,
+        an index entry or a room id. If a room id was archived several times,
+        the latest entry is read.
+        """
+        if isinstance(entry, str):
+            room_id, entry = entry, None
+            for entry in self.index(room_id=room_id):
+                pass
+            if entry is None:
+                raise KeyError(room_id)
+        with open(self._segment_path(entry['segment']), 'rb') as f:
+            f.seek(entry['offset'])
+            data = f.read(entry['length'])
+        return gzip.decompress(data).decode().splitlines()
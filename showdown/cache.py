@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""Module for the TTLCache class used to cache HTTP lookups"""
+import asyncio
+import time
+from collections import OrderedDict
+
+class TTLCache:
+    """
+    Size bounded cache whose entries expire a fixed number of seconds after
+    being stored. When the cache is full, the least recently used entry is
+    evicted. Concurrent TTLCache.get_or_fetch calls for the same missing key
+    share a single fetch.
+
+    Args:
+        maxsize (:obj:`int`, optional) : The maximum number of entries.
+            Defaults to 1024.
+        ttl (:obj:`int` or obj:`float`, optional) : The number of seconds an
+            entry stays valid. Defaults to 300.
+        timer (:obj:`callable`, optional) : Function returning the current
+            time in seconds. Defaults to time.monotonic.
+
+    Attributes:
+        stats (:obj:`dict`) : Number of hits, misses, coalesced lookups,
+            evictions and expirations since the cache was created.
+
+    Notes:
+        Cached values are shared between callers and should not be mutated.
+    """
+    def __init__(self, maxsize=1024, ttl=300, timer=time.monotonic):
+        assert maxsize > 0, 'maxsize should be strictly positive'
+        assert ttl >= 0, 'ttl should be nonnegative'
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'evictions': 0,
+            'expirations': 0
+        }
+        self._entries = OrderedDict()
+        self._pending = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self._lookup(key) is not _MISSING
+
+    def __repr__(self):
+        return '<TTLCache {}/{} ttl={}>'.format(len(self), self.maxsize,
+            self.ttl)
+
+    def _lookup(self, key):
+        entry = self._entries.get(key, None)
+        if entry is None:
+            return _MISSING
+        expires, value = entry
+        if self.timer() >= expires:
+            del self._entries[key]
+            self.stats['expirations'] += 1
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def get(self, key, default=None):
+        """
+        Returns the value stored for key, or default if it is missing or
+        has expired.
+        """
+        value = self._lookup(key)
+        if value is _MISSING:
+            self.stats['misses'] += 1
+            return default
+        self.stats['hits'] += 1
+        return value
+
+    def set(self, key, value):
+        """
+        Stores value for key, evicting the least recently used entries if the
+        cache is full.
+        """
+        self._entries[key] = (self.timer() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def invalidate(self, key):
+        """
+        Removes the entry stored for key, if any.
+        """
+        self._entries.pop(key, None)
+
+    def clear(self):
+        """
+        Removes every entry of the cache.
+        """
+        self._entries.clear()
+
+    async def get_or_fetch(self, key, fetch):
+        """
+        |coro|
+
+        Returns the value stored for key. If it is missing or has expired,
+        awaits fetch() to get it and stores the result. If a fetch for key is
+        already in progress, waits for its result instead of starting another.
+
+        Args:
+            key (hashable) : The key of the entry.
+            fetch (:obj:`callable`) : Function without arguments returning an
+                awaitable that resolves to the value of the entry.
+
+        Returns:
+            The value of the entry.
+
+        Raises:
+            Any exception raised by fetch. Failed fetches are not cached.
+        """
+        value = self._lookup(key)
+        if value is not _MISSING:
+            self.stats['hits'] += 1
+            return value
+        pending = self._pending.get(key, None)
+        if pending is not None:
+            self.stats['coalesced'] += 1
+            return await asyncio.shield(pending)
+
+        self.stats['misses'] += 1
+        future = asyncio.get_event_loop().create_future()
+        self._pending[key] = future
+        try:
+            value = await fetch()
+        except BaseException as err:
+            if isinstance(err, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(err)
+                future.exception() # Mark as retrieved if nobody is waiting
+            raise
+        else:
+            self.set(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            del self._pending[key]
+
+    def hit_rate(self):
+        """
+        Returns the fraction of lookups answered without a fetch, between 0
+        and 1. Coalesced lookups count as hits.
+        """
+        hits = self.stats['hits'] + self.stats['coalesced']
+        total = hits + self.stats['misses']
+        return hits / total if total else 0.0
+
+_MISSING = object()
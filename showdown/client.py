@@ -1,32 +1,61 @@
 # -*- coding: utf-8 -*-
 """Module for showdown's Client class"""
 import asyncio
-import aiohttp
-import requests
 import websockets
+from websockets.exceptions import ConnectionClosedOK
 import json
 import time
 import logging
 import traceback
 import warnings
 import math
-from functools import wraps, partial
-from . import message, room, server, user, utils, docutils
+from functools import wraps
+from . import message, room, server, user, utils, docutils, tasks, cache, \
+    replays, archive, logstore, transcript, tracing, metrics, watchdog, \
+    profiler
+from .httpclient import HTTPClient
 
 #Logging setup
 logger = logging.getLogger(__name__)
 
+INGEST_POLICIES = ('block', 'drop_oldest', 'drop_newest')
+
+HOOK_NAMES = ('on_connect', 'on_login', 'on_room_init', 'on_room_deinit',
+    'on_query_response', 'on_challenge_update', 'on_chat_message',
+    'on_private_message', 'on_receive')
+
+def _room_frame(room_id, lines):
+    """
+    Returns a socket frame holding the lines of the room specified by room_id,
+    in the format they were received in.
+    """
+    return 'a' + json.dumps(['>{}\n{}'.format(room_id, '\n'.join(lines))])
+
 class OutputToken:
     """
     Class used with the client's output queue to schedule when outputs should
     be used, delayed, or discarded.
+
+    Attributes:
+        created (float) : The time at which the token was queued.
+        resolved (float or None) : The time at which the token was sent or
+            discarded. None while the token is still in the output queue.
+        future (asyncio.Future) : Future resolved with True once the content
+            has been written to the websocket, or with False if it was
+            discarded.
     """
-    def __init__(self, content, ignore_before, discard_after):
+    def __init__(self, content, ignore_before, discard_after, loop=None):
         self.content = [content] if type(content) is str else content
         self.ignore_before = ignore_before
         self.discard_after = discard_after
         self.sent = False
         self.discarded = False
+        self.created = time.time()
+        self.resolved = None
+        self.future = (loop or asyncio.get_event_loop()).create_future()
+
+    def __repr__(self):
+        return '<OutputToken {}>'.format(self.content)
 
     def expired(self):
         return time.time() > self.discard_after
@@ -34,6 +63,48 @@ class OutputToken:
     def ready(self):
         return time.time() > self.ignore_before
 
+    def done(self):
+        return self.future.done()
+
+    def latency(self):
+        """
+        Returns the time the token spent in the output queue, in seconds. If
+        the token hasn't been sent or discarded yet, the time spent so far is
+        returned instead.
+        """
+        return (self.resolved or time.time()) - self.created
+
+    async def wait(self, timeout=None):
+        """
+        |coro|
+
+        Waits until the token has been sent or discarded.
+
+        Args:
+            timeout (:obj:`int` or obj:`float`, optional) : Maximum number of
+                seconds to wait. Defaults to None (wait forever).
+
+        Returns:
+            bool : True if the content was sent, False if it was discarded.
+
+        Raises:
+            asyncio.TimeoutError : Raised when the timeout expires first.
+        """
+        return await asyncio.wait_for(asyncio.shield(self.future), timeout)
+
+    def set_sent(self):
+        self.sent = True
+        self._resolve(True)
+
+    def set_discarded(self):
+        self.discarded = True
+        self._resolve(False)
+
+    def _resolve(self, result):
+        self.resolved = time.time()
+        if not self.future.done():
+            self.future.set_result(result)
+
 class Client(user.User):
     """
     Class for interacting with Showdown's websocket interface. Includes hooks
@@ -65,12 +136,120 @@ class Client(user.User):
             client will connect to. This value is None by default, and will be
             retrieved automatically from 
             https://pokemonshowdown.com/servers/{host_name}.json
+            when the client starts.
+        ingest_queue_size (:obj:`int`, optional) : The maximum number of
+            received frames waiting to be processed. Defaults to 1000.
+        ingest_workers (:obj:`int`, optional) : The number of tasks processing
+            received frames. Frames are processed in order only with a single
+            worker, which is the default.
+        ingest_policy (:obj:`str`, optional) : What the reader does when the
+            ingest queue is full. 'block' (the default) waits for room in the
+            queue, 'drop_oldest' discards the oldest queued frame and
+            'drop_newest' discards the frame that was just received.
+        battle_concurrency (:obj:`int`, optional) : The maximum number of
+            battles allowed to run their decision policy at the same time.
+            Defaults to 8.
+        max_hook_tasks (:obj:`int`, optional) : The maximum number of hook
+            tasks (on_receive, on_chat_message, ...) allowed to run at the same
+            time. Defaults to 100.
+        http_timeout (:obj:`int` or obj:`float`, optional) : Number of seconds
+            after which an HTTP request is abandoned. Defaults to 15.
+        max_http_requests (:obj:`int`, optional) : The maximum number of HTTP
+            requests in flight at the same time. Defaults to 16.
+        cache_ttl (:obj:`int` or obj:`float`, optional) : Number of seconds
+            user data and ladder lookups are cached for. Defaults to 300.
+        cache_size (:obj:`int`, optional) : The maximum number of entries of
+            each of the client's caches. Defaults to 1024.
+        replay_dir (:obj:`str`, optional) : Directory where replays waiting
+            for upload are persisted. Defaults to None (kept in memory only).
+        replay_upload_concurrency (:obj:`int`, optional) : The number of
+            replay uploads allowed to run at the same time. Defaults to 2.
+        archive_dir (:obj:`str`, optional) : Directory of the compressed
+            archive battle logs are written to. Defaults to None (battles
+            aren't archived).
+        log_budgets (:obj:`dict`, optional) : Maximum number of logs kept
+            per room type, overriding max_room_logs.
+            Ex: {'battle': 2000, 'chat': 500}. Defaults to None.
+        max_log_bytes (:obj:`int`, optional) : The maximum number of bytes
+            used by the logs of all rooms. Past it, the oldest logs of the
+            largest rooms are dropped. Defaults to 32 MiB. None disables the
+            cap.
+        compress_logs (:obj:`bool`, optional) : Whether older room logs are
+            kept compressed. Defaults to True.
+        send_interval (:obj:`int` or obj:`float`, optional) : Number of
+            seconds the sender waits after each message, to stay under the
+            server's rate limit. Defaults to .5. Use 0 against a local
+            showdown.mockserver.MockServer.
+        transcript_path (:obj:`str`, optional) : Path of a transcript every
+            frame received and message sent is recorded to, for replays with
+            showdown.transcript.replay. Defaults to None (nothing is
+            recorded).
+        trace_buffer_size (:obj:`int`, optional) : The number of decision
+            traces kept by the client's tracer. Defaults to 1000.
+        metrics_interval (:obj:`int` or obj:`float`, optional) : Number of
+            seconds between two samples of the client's rates and event loop
+            lag. Defaults to 5.
+        metrics_path (:obj:`str`, optional) : File the metrics are written to
+            after each sample, in the Prometheus text format. Defaults to None
+            (metrics aren't written).
+        metrics_port (:obj:`int`, optional) : Port the metrics are served on
+            over HTTP, at /metrics. Defaults to None (metrics aren't served).
+        metrics_host (:obj:`str`, optional) : Interface the metrics are
+            served on. Defaults to 'localhost'.
+        watchdog_threshold (:obj:`int` or obj:`float`, optional) : Number of
+            seconds past which the event loop is reported as blocked by the
+            client's watchdog. Defaults to .25. None disables the watchdog.
+        battle_grace_period (:obj:`int` or obj:`float`, optional) : Number of
+            seconds an ended battle's actor is given to apply its last events.
+            The client then leaves the battle and releases it, as on a deinit
+            message. Defaults to 5. None keeps ended battles until the server
+            deinitializes them.
 
     Attributes:
         server (showdown.server.Server) : object representing the server the 
             client is connected to.
         websocket_url (str) : The url over which the client's websocket 
-            connection is established
+            connection is established. None until the server's host is known.
+        http (showdown.httpclient.HTTPClient) : Asynchronous HTTP facade used
+            for every HTTP request made by the client, its server and users.
+            Its session is opened when Client.start() is called.
+        user_data_cache (showdown.cache.TTLCache) : Cache of user profiles,
+            keyed by user id.
+        ladder_cache (showdown.cache.TTLCache) : Cache of ladder lookups,
+            keyed by (server_id, user_id), or ('format', format_id) for the
+            ladders of battle formats.
+        replay_uploader (showdown.replays.ReplayUploader) : Queue of replays
+            waiting to be uploaded after a 'savereplay' query response.
+        archive (showdown.archive.BattleArchive or None) : Archive every
+            battle's log is written to. None if no archive_dir was given.
+        log_store (showdown.logstore.LogStore) : Memory accounting of the
+            logs of the client's rooms. Use log_store.memory_usage() to query
+            it.
+        log_budgets (dict) : Maximum number of logs kept per room type.
+        send_interval (float) : Number of seconds the sender waits after each
+            message.
+        transcript (showdown.transcript.TranscriptRecorder or None) :
+            Recorder of the client's websocket traffic. None if no
+            transcript_path was given.
+        stage_stats (dict) : Timings of the processing stages of the client
+            and its battles, as {stage : {'count', 'total', 'max'}} with times
+            in seconds. Stages are 'process_input', the battle event types
+            ('request', 'turn', 'pokemon_data', 'move_data') and 'policy'.
+        tracer (showdown.tracing.Tracer) : Ring buffer of the latencies of
+            the last decisions of the client's battles, from the arrival of
+            the |request| frame to the decision being sent. Use
+            tracer.summary() for percentiles per battle format.
+        metrics (showdown.metrics.MetricsRegistry) : Counters, gauges and
+            histograms describing the client: queue depths and time spent in
+            the output queue, frames sent and received per second, live
+            tasks, open rooms, cache hit ratios and event loop lag.
+        watchdog (showdown.watchdog.Watchdog or None) : Watchdog measuring
+            the event loop lag and reporting the coroutines blocking the loop.
+            None if watchdog_threshold is None.
+        battle_grace_period (float or None) : Number of seconds an ended
+            battle's actor is given before the battle is released.
+        users (showdown.user.UserRegistry) : Registry sharing a single User
+            object per user id between the client's rooms and messages.
         password (str) : The password the client uses to login
         challengekeyid (str) : Id assigned by the server to identify the 
             client. Used to login.
@@ -78,6 +257,13 @@ class Client(user.User):
             client. Used to login.
         output_queue (asyncio.Queue) : Queue used to manage what is sent back
             to the server websocket.
+        input_queue (asyncio.Queue) : Bounded queue of (timestamp, frame)
+            tuples read from the websocket and waiting to be processed.
+        ingest_stats (dict) : Counters describing the ingest queue: frames
+            received, processed and dropped, how often the reader blocked on
+            a full queue, and the last and maximum processing lag in seconds.
+        decision_semaphore (asyncio.Semaphore) : Semaphore acquired by battle
+            actors while they run their decision policy.
         rooms (dict) : Dictionary with entries of {str : showdown.room.Room} 
             that maps room_id's to Rooms the client is currently connected to.
         max_room_logs (int) : The maximum number of logs stored in this client's
@@ -94,27 +280,139 @@ class Client(user.User):
     """
 
     def __init__(self, name='', password='', *, loop=None, max_room_logs=5000,
-                    server_id='showdown', server_host=None):
+                    server_id='showdown', server_host=None,
+                    ingest_queue_size=1000, ingest_workers=1,
+                    ingest_policy='block', battle_concurrency=8,
+                    max_hook_tasks=100, http_timeout=15,
+                    max_http_requests=16, cache_ttl=300, cache_size=1024,
+                    replay_dir=None, replay_upload_concurrency=2,
+                    archive_dir=None, log_budgets=None,
+                    max_log_bytes=32 * 2 ** 20, compress_logs=True,
+                    send_interval=.5, transcript_path=None,
+                    trace_buffer_size=1000, metrics_interval=5,
+                    metrics_path=None, metrics_port=None,
+                    metrics_host='localhost', watchdog_threshold=.25,
+                    battle_grace_period=5):
+        assert ingest_policy in INGEST_POLICIES, \
+            'ingest_policy must be one of {}'.format(INGEST_POLICIES)
+        assert ingest_workers >= 1, 'ingest_workers must be at least 1'
+        assert battle_grace_period is None or battle_grace_period >= 0, \
+            'battle_grace_period must be None or positive'
         super().__init__(name, client=self)
 
         # URL setup
         self.server = server.Server(id=server_id, host=server_host, client=self)
-        self.websocket_url = self.server.generate_ws_url()
-        logger.info('Using websocket at {}'.format(self.websocket_url))
+        self.websocket_url = None #Set once the server's host is known
+        if self.server.host is not None:
+            self.websocket_url = self.server.generate_ws_url()
 
         # Initialize client attributes
         self.password = password
         self.challengekeyid, self.challstr = None, None
         self.output_queue = asyncio.Queue()
+        self.input_queue = asyncio.Queue(maxsize=ingest_queue_size)
+        self.ingest_workers = ingest_workers
+        self.ingest_policy = ingest_policy
+        self.ingest_stats = {
+            'received': 0,
+            'processed': 0,
+            'dropped': 0,
+            'blocked': 0,
+            'last_lag': 0.0,
+            'max_lag': 0.0
+        }
+        self.decision_semaphore = asyncio.Semaphore(battle_concurrency)
         self.rooms = {}
         self.challenges = {}
         self.connected = False
         self.max_room_logs = max_room_logs
         self.autologin = True
         self.websocket = None #Initialized in _handler
+        self.http = HTTPClient(timeout=http_timeout,
+            max_requests=max_http_requests)
         self.session = None
+        self.user_data_cache = cache.TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self.ladder_cache = cache.TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self.replay_uploader = replays.ReplayUploader(self.server,
+            directory=replay_dir, max_concurrency=replay_upload_concurrency)
+        self.archive = archive.BattleArchive(archive_dir) \
+            if archive_dir is not None else None
+        self.log_budgets = log_budgets or {}
+        self.log_store = logstore.LogStore(max_bytes=max_log_bytes,
+            compress=compress_logs)
+        self.users = user.UserRegistry(client=self)
+        self.send_interval = send_interval
+        self.transcript = transcript.TranscriptRecorder(transcript_path) \
+            if transcript_path is not None else None
+        self.stage_stats = {}
+        self.tracer = tracing.Tracer(maxlen=trace_buffer_size)
+        self.metrics_interval = metrics_interval
+        self.metrics_path = metrics_path
+        self.metrics_port = metrics_port
+        self.metrics_host = metrics_host
+        self.battle_grace_period = battle_grace_period
         self.loop = loop or asyncio.get_event_loop()
-        self._tasks = []
+        self._tasks = tasks.TaskSet(loop=self.loop,
+            max_concurrency=max_hook_tasks,
+            stop_exceptions=(ConnectionClosedOK,))
+        self.metrics = self._create_metrics()
+        self.watchdog = watchdog.Watchdog(self, threshold=watchdog_threshold) \
+            if watchdog_threshold is not None else None
+        self.detect_hooks()
+
+    def _create_metrics(self):
+        registry = metrics.MetricsRegistry()
+        registry.counter('frames_received_total',
+            'Frames read from the websocket.')
+        registry.counter('frames_sent_total',
+            'Messages written to the websocket.')
+        registry.counter('outputs_discarded_total',
+            'Outputs discarded from the output queue after their lifespan.')
+        registry.gauge('frames_received_per_second',
+            'Frames read per second over the last sample.')
+        registry.gauge('frames_sent_per_second',
+            'Messages written per second over the last sample.')
+        registry.gauge('input_queue_depth', 'Frames waiting to be processed.',
+            func=self.input_queue.qsize)
+        registry.gauge('output_queue_depth', 'Outputs waiting to be sent.',
+            func=self.output_queue.qsize)
+        registry.histogram('output_queue_seconds',
+            'Time outputs spent in the output queue.')
+        registry.gauge('frames_dropped', 'Frames dropped by the ingest policy.',
+            func=lambda: self.ingest_stats['dropped'])
+        registry.gauge('tasks_live', 'Live tasks of the client.',
+            func=lambda: len(self._tasks))
+        registry.gauge('tasks_waiting',
+            'Bounded tasks waiting for a free slot.',
+            func=lambda: self._tasks.counts()['waiting'])
+        registry.gauge('rooms_open', 'Rooms the client is in.',
+            func=lambda: len(self.rooms))
+        registry.gauge('battles_open', 'Battles the client is in.',
+            func=lambda: sum(1 for room_obj in self.rooms.values()
+                if isinstance(room_obj, room.Battle)))
+        registry.counter('battles_ended_total',
+            'Battles won, lost or tied.')
+        registry.counter('battles_released_total',
+            'Battles left and released by the client.')
+        registry.histogram('battle_duration_seconds',
+            'Time from the init of a battle to its end.',
+            buckets=(30, 60, 120, 300, 600, 900, 1200, 1800, 3600))
+        for name, hit_rate in (
+            ('user_data_cache', self.user_data_cache.hit_rate),
+            ('ladder_cache', self.ladder_cache.hit_rate),
+            ('users', self.users.hit_rate)):
+            registry.gauge('{}_hit_ratio'.format(name),
+                'Ratio of {} lookups answered without a fetch.'.format(name),
+                func=hit_rate)
+        registry.gauge('log_bytes', 'Bytes used by the logs of the rooms.',
+            func=lambda: self.log_store.memory_usage()['total'])
+        registry.gauge('loop_lag_seconds',
+            'Delay of the last heartbeat past its schedule.')
+        registry.histogram('loop_lag_histogram_seconds',
+            'Delays of the heartbeats past their schedule.')
+        registry.counter('loop_stalls_total',
+            'Times the event loop was blocked past the watchdog threshold.')
+        return registry
 
     def start(self, autologin=True):
         """
@@ -129,10 +427,11 @@ class Client(user.User):
             bool : True if exited gracefully (on an interrupt), else False
         """
         self.autologin = autologin
+        self.detect_hooks()
         try:
             if self.loop.is_running():
-                task = self.add_task(self._handler())
-                task.add_done_callback(lambda f: _on_disconnect())
+                task = self.add_task(self._handler(), bounded=False)
+                task.add_done_callback(lambda f: self._on_disconnect())
                 logger.info("The client's event loop was already running. "
                             "The client will run as a task on the loop.")
                 return
@@ -150,46 +449,170 @@ class Client(user.User):
     @docutils.format()
     async def _handler(self):
         """
-        Creates websocket connection and adds any methods flagged by the 
+        Opens the client's HTTP session, resolves the server's host if needed,
+        creates websocket connection and adds any methods flagged by the 
         on_interval decorator to the event loop.
         """
-        async with websockets.connect(self.websocket_url) as self.websocket, \
-                                  aiohttp.ClientSession() as self.session:
-            self.connected = True
-            self.server.set_session(self.session)
-            tasks = []
-            for att in dir(self):
-                att = getattr(self, att)
-                if hasattr(att, '_is_interval_task') and att._is_interval_task:
-                    self._tasks.append(asyncio.ensure_future(att()))
-            try:
-                done, pending = await asyncio.wait(self._tasks, 
-                                    return_when=asyncio.FIRST_COMPLETED)
-                for task in pending:
-                    task.cancel()
-            except:
-                import traceback
-                traceback.print_exc()
+        async with self.http:
+            self.session = self.http.session
+            self.server.set_http(self.http)
+            await self.server.resolve_host()
+            if self.websocket_url is None:
+                self.websocket_url = self.server.generate_ws_url()
+            logger.info('Using websocket at {}'.format(self.websocket_url))
+            async with websockets.connect(self.websocket_url) as self.websocket:
+                self.replay_uploader.start(self)
+                await self._run_interval_tasks()
+
+    async def _run_interval_tasks(self):
+        """
+        Adds any methods flagged by the on_interval decorator to the event
+        loop, and waits until one of them stops. Auxiliary tasks, like the
+        metrics sampler and the watchdog, don't stop the others when they end,
+        and are cancelled with them.
+        """
+        self.connected = True
+        interval_tasks = []
+        auxiliary_tasks = []
+        for att in dir(self):
+            att = getattr(self, att)
+            if hasattr(att, '_is_interval_task') and att._is_interval_task:
+                tasks_list = auxiliary_tasks \
+                    if getattr(att, '_is_auxiliary', False) else interval_tasks
+                tasks_list.append(self.add_task(att(), bounded=False))
+        for _ in range(self.ingest_workers - 1):
+            interval_tasks.append(
+                self.add_task(self.receiver(), bounded=False))
+        if self.watchdog is not None:
+            auxiliary_tasks.append(
+                self.add_task(self.watchdog.run(), bounded=False))
+        try:
+            done, pending = await asyncio.wait(interval_tasks,
+                                return_when=asyncio.FIRST_COMPLETED)
+            for task in list(pending) + auxiliary_tasks:
+                task.cancel()
+        except:
+            import traceback
+            traceback.print_exc()
 
     def _on_disconnect(self):
         if self.connected:
-            for t in self._tasks:
-                if not t.cancelled():
-                    t.cancel()
-                    logger.info('Cancelled: {}'.format(t))
-            self._tasks = []
+            self._tasks.cancel_all()
+            while not self.output_queue.empty():
+                self.output_queue.get_nowait().set_discarded()
             self.connected = False
+            if self.archive is not None:
+                self.archive.close(self.rooms)
+            if self.transcript is not None:
+                self.transcript.close()
             self.on_disconnect()
 
-    def add_task(self, coro):
-        return self._tasks.append(
-            asyncio.ensure_future(
-                coro,
-                loop = self.loop
-            )
-        )
+    def add_task(self, coro, bounded=True):
+        """
+        Schedules coro as a task managed by the client. Finished tasks are
+        dropped automatically and their exceptions are logged.
+
+        Args:
+            coro (coroutine) : The coroutine to schedule.
+            bounded (:obj:`bool`, optional) : Whether the task counts towards
+                the client's max_hook_tasks limit. Should be False for long
+                running tasks. Defaults to True.
+
+        Returns:
+            asyncio.Task : The scheduled task.
+        """
+        return self._tasks.add(coro, bounded=bounded)
 
-    def on_interval(interval=0.0):
+    def detect_hooks(self):
+        """
+        Finds the hooks (Client.on_receive, Client.on_chat_message, ...) that
+        have been overridden by a subclass or set on the instance. Hooks that
+        still do nothing by default are skipped by the client, along with the
+        objects that would have been built for them. Called on init and when
+        the client starts.
+
+        Returns:
+            frozenset : The names of the overridden hooks.
+        """
+        self._hooks = frozenset(name for name in HOOK_NAMES
+            if name in vars(self) or
+               getattr(type(self), name) is not getattr(Client, name))
+        logger.debug('Active hooks: {}'.format(sorted(self._hooks)))
+        return self._hooks
+
+    def task_counts(self):
+        """
+        Returns a dict with the number of live tasks managed by the client,
+        the number of hook tasks waiting for a free slot, and the number of
+        tasks started, finished, failed and cancelled so far.
+        """
+        return self._tasks.counts()
+
+    async def profile(self, path, duration=None, *, battle=None, hook=None,
+        interval=.005, output_format=None):
+        """
+        |coro|
+
+        Profiles the client's event loop with a sampling profiler, then
+        writes the samples to path. Can be called at any time, for example
+        from a hook or with Client.add_task, without restarting the client.
+
+        Args:
+            path (:obj:`str`) : File the samples are written to. See
+                showdown.profiler.SamplingProfiler.dump for the formats.
+            duration (:obj:`int` or obj:`float`, optional) : Number of seconds
+                to profile for. If None, profiles until battle ends.
+            battle (:obj:`showdown.room.Battle` or obj:`str`, optional) : The
+                battle, or its room id, to profile. Only samples taken while
+                its actor runs are kept. Defaults to None (every task).
+            hook (:obj:`str`, optional) : Name of a function, such as a hook,
+                to profile. Only samples going through it are kept.
+                Ex: 'on_chat_message'. Defaults to None.
+            interval (:obj:`int` or obj:`float`, optional) : Number of seconds
+                between two samples. Defaults to .005.
+            output_format (:obj:`str`, optional) : 'pstats' or 'collapsed'.
+                Defaults to guessing from path's extension.
+
+        Returns:
+            showdown.profiler.SamplingProfiler : The profiler, holding the
+                samples.
+        """
+        assert duration is not None or battle is not None, \
+            'A duration or a battle is required'
+        if isinstance(battle, str):
+            battle = self.rooms[battle]
+        sampler = profiler.SamplingProfiler(self.loop,
+            interval=interval, task=battle._actor if battle else None,
+            function=hook)
+        sampler.start()
+        try:
+            if duration is not None:
+                await asyncio.sleep(duration)
+            else:
+                while not battle.ended and battle._actor is not None \
+                    and not battle._actor.done():
+                    await asyncio.sleep(.5)
+        finally:
+            sampler.stop()
+        sampler.dump(path, output_format)
+        return sampler
+
+    def record_stage(self, stage, elapsed):
+        """
+        Adds a timing of elapsed seconds for stage to the client's stage_stats.
+        """
+        stats = self.stage_stats.get(stage, None)
+        if stats is None:
+            stats = self.stage_stats[stage] = {
+                'count': 0,
+                'total': 0.0,
+                'max': 0.0
+            }
+        stats['count'] += 1
+        stats['total'] += elapsed
+        stats['max'] = max(stats['max'], elapsed)
+
+    def on_interval(interval=0.0, auxiliary=False):
         """
         A decorator creator to flag methods that the client should loop in an 
         interval
@@ -197,6 +620,9 @@ class Client(user.User):
         Args:
             interval (:obj:`float`, optional) :  The length of the interval to 
                 run the method on in seconds. Defaults to 0.0.
+            auxiliary (:obj:`bool`, optional) : Whether the method is an
+                auxiliary task, whose end doesn't stop the client's other
+                tasks. Defaults to False.
 
         Returns:
             func - A decorator function that loops the passed in func on the 
@@ -219,6 +645,7 @@ class Client(user.User):
                     elapsed = time.time() - start_time
                     await asyncio.sleep(max(0, interval - elapsed))
             wrapper._is_interval_task = True
+            wrapper._is_auxiliary = auxiliary
             return wrapper
         return decorator
 
@@ -236,19 +663,68 @@ class Client(user.User):
         out = await self.output_queue.get()
         now = time.time()
         if not out.ready():
-            logger.info('>>> Requeuing {}'.format(out))
+            logger.debug('>>> Requeuing %s', out)
             await self.output_queue.put(out)
             await asyncio.sleep(.05)
             return
         if out.expired():
-            logger.info('>>> Discarding {}'.format(out))
-            out.discarded = True
+            logger.info('>>> Discarding %s', out)
+            out.set_discarded()
+            self.metrics['outputs_discarded_total'].inc()
             return
         content = [out.content] if type(out.content) is str else out.content
-        logger.info('>>> Sending:\n{}'.format(content))
-        await self.websocket.send(json.dumps(content))
-        out.sent = True
-        await asyncio.sleep(len(content) * .5)
+        logger.debug('>>> Sending:\n%s', content)
+        data = json.dumps(content)
+        try:
+            await self.websocket.send(data)
+        except:
+            #Waiters of the output shouldn't hang on a closed connection
+            out.set_discarded()
+            raise
+        if self.transcript is not None:
+            self.transcript.record('out', data)
+        out.set_sent()
+        self.metrics['frames_sent_total'].inc()
+        self.metrics['output_queue_seconds'].observe(out.latency())
+        await asyncio.sleep(len(content) * self.send_interval)
+
+    @on_interval(auxiliary=True)
+    async def metrics_sampler(self):
+        """
+        |coro|
+
+        Samples the rates of the client's metrics every metrics_interval
+        seconds, and the event loop lag if the client has no watchdog. The lag
+        is then how late the sampler wakes up past its schedule. Metrics are
+        written to metrics_path after each sample, and served on metrics_port
+        if set.
+        """
+        if self.metrics_port is not None:
+            try:
+                await self.metrics.serve(self.metrics_host, self.metrics_port)
+            except OSError as err:
+                logger.error('Could not serve metrics on %s:%s, giving up: %r',
+                    self.metrics_host, self.metrics_port, err)
+                self.metrics_port = None
+        received = self.metrics['frames_received_total'].value
+        sent = self.metrics['frames_sent_total'].value
+        start = self.loop.time()
+        await asyncio.sleep(self.metrics_interval)
+        elapsed = self.loop.time() - start
+        if self.watchdog is None:
+            lag = max(elapsed - self.metrics_interval, 0)
+            self.metrics['loop_lag_seconds'].set(lag)
+            self.metrics['loop_lag_histogram_seconds'].observe(lag)
+        self.metrics['frames_received_per_second'].set(
+            (self.metrics['frames_received_total'].value - received) / elapsed)
+        self.metrics['frames_sent_per_second'].set(
+            (self.metrics['frames_sent_total'].value - sent) / elapsed)
+        if self.metrics_path is not None:
+            try:
+                self.metrics.dump(self.metrics_path)
+            except OSError as err:
+                logger.error('Could not write metrics to %s: %r',
+                    self.metrics_path, err)
 
     @docutils.format()
     async def add_output(self, content, delay=0, lifespan=math.inf):
@@ -262,7 +738,8 @@ class Client(user.User):
             {lifespan}
 
         Returns:
-            namedtuple : Token representing the content to be sent.
+            OutputToken : Token representing the content to be sent. Await
+                OutputToken.wait() to know when it has been sent or discarded.
         """
         assert type(lifespan) in (int, float), \
             'lifespan must be float or int'
@@ -276,69 +753,92 @@ class Client(user.User):
         now = time.time()
         ignore_before = now + delay
         discard_after = now + lifespan
-        token = OutputToken(content, ignore_before, discard_after)
+        token = OutputToken(content, ignore_before, discard_after,
+            loop=self.loop)
         await self.output_queue.put(token)
         return token
 
     @on_interval()
-    async def receiver(self):
+    async def reader(self):
         """
         |coro|
 
-        Awaits input from websocket and parses the important stuff. Subclasses 
-        can hook into the input through Client.on_receive.
+        Awaits input from websocket and puts it in the client's input_queue
+        with the time it was received. Processing is left to the receiver
+        tasks so that slow processing doesn't delay reading from the socket.
         """
         socket_input = await self.websocket.recv()
-        logger.debug('<<< Received:\n{}'.format(socket_input))
+        logger.debug('<<< Received:\n%s', socket_input)
+        if self.transcript is not None:
+            self.transcript.record('in', socket_input)
+        self.ingest_stats['received'] += 1
+        self.metrics['frames_received_total'].inc()
+        item = (time.time(), socket_input)
+
+        if not self.input_queue.full():
+            self.input_queue.put_nowait(item)
+        elif self.ingest_policy == 'drop_newest':
+            self.ingest_stats['dropped'] += 1
+            logger.warning('Ingest queue full, dropping newest frame')
+        elif self.ingest_policy == 'drop_oldest':
+            self.input_queue.get_nowait()
+            self.input_queue.task_done()
+            self.input_queue.put_nowait(item)
+            self.ingest_stats['dropped'] += 1
+            logger.warning('Ingest queue full, dropping oldest frame')
+        else:
+            self.ingest_stats['blocked'] += 1
+            await self.input_queue.put(item)
+
+    @on_interval()
+    async def receiver(self):
+        """
+        |coro|
+
+        Takes the next frame from the client's input_queue and processes it
+        through Client.process_input.
+        """
+        received_time, socket_input = await self.input_queue.get()
+        lag = time.time() - received_time
+        self.ingest_stats['last_lag'] = lag
+        self.ingest_stats['max_lag'] = max(self.ingest_stats['max_lag'], lag)
+        start = time.perf_counter()
+        try:
+            await self.process_input(socket_input, received_time)
+        finally:
+            self.record_stage('process_input', time.perf_counter() - start)
+            self.ingest_stats['processed'] += 1
+            self.input_queue.task_done()
+
+    async def process_input(self, socket_input, received_time=None):
+        """
+        |coro|
 
+        Parses the important stuff out of a frame received from the websocket.
+        Subclasses can hook into the input through Client.on_receive.
+        received_time is the time the frame was read from the websocket, used
+        to trace the latency of decisions. Defaults to now.
+        """
         if "error" in socket_input:
-            print("\nErreur ici : ", socket_input)
-
-        if "active" in socket_input and "rqid" in socket_input and "wait" not in socket_input:
-            print("UPDATING STATE")
-            assert len(self.rooms) == 1
-            for key in self.rooms:
-                current_battle = self.rooms.get(key)
-                await current_battle.update_own_team(socket_input)
-
-        if "turn|" in socket_input or "|upkeep" in socket_input:
-            print("UPDATING TURN")
-            assert len(self.rooms) == 1
-            for key in self.rooms:
-                current_battle = self.rooms.get(key)
-                if "turn|" in socket_input:
-                    current_battle.add_turn()
-                await current_battle.update_turn(socket_input)
-
-        if "|raw|" in socket_input and "pokemonnamecol" in socket_input:
-            print("UPDATING POKEMON INFO")
-            assert len(self.rooms) == 1
-            for key in self.rooms:
-                current_battle = self.rooms.get(key)
-                current_battle.update_smogon_data_pokemon(socket_input)
-
-        if "|raw|" in socket_input and "movenamecol" in socket_input:
-            print("UPDATING POKEMON INFO")
-            assert len(self.rooms) == 1
-            for key in self.rooms:
-                current_battle = self.rooms.get(key)
-                current_battle.update_smogon_data_move(socket_input)
+            logger.warning('Received an error: %s', socket_input)
 
         #Showdown sends this response on initial connection
         if socket_input == 'o':
             logger.info('Connected on {}'.format(self.websocket_url))
             self.connected = True
-            self.add_task(self.on_connect())
+            if 'on_connect' in self._hooks:
+                self.add_task(self.on_connect())
             return
 
         inputs = utils.parse_socket_input(socket_input)
         for room_id, inp in inputs:
-            logger.debug('||| Parsing:\n{}'.format(inp))
-            inp_type, params = utils.parse_text_input(inp)
+            logger.debug('||| Parsing:\n%s', inp)
+            line = utils.ParsedLine(inp, room_id)
+            inp_type = line.inp_type
             
             #Set challstr attributes and autologin
             if inp_type == 'challstr':
-                self.challengekeyid, self.challstr = params
+                self.challengekeyid, self.challstr = line.params
                 if self.name and self.password and self.autologin:
                     await self.login()
                 elif self.autologin:
@@ -349,26 +849,30 @@ class Client(user.User):
 
             #Process query response
             elif inp_type == 'queryresponse':
-                response_type, data = params[0], '|'.join(params[1:])
-                data = json.loads(data)
-                self.add_task(
-                    self.on_query_response(response_type, data),
-                )
-                if response_type == 'savereplay':
+                params = line.params
+                response_type = params[0]
+                has_hook = 'on_query_response' in self._hooks
+                if has_hook or response_type == 'savereplay':
+                    data = json.loads('|'.join(params[1:]))
+                if has_hook:
                     self.add_task(
-                        self.server.save_replay_async(data)
+                        self.on_query_response(response_type, data),
                     )
+                if response_type == 'savereplay':
+                    self.replay_uploader.submit(data)
 
             #Challenge updates
             elif inp_type == 'updatechallenges':
-                self.challenges = json.loads(params[0])
-                self.add_task(
-                    self.on_challenge_update(self.challenges)
-                )
+                self.challenges = json.loads(line.params[0])
+                if 'on_challenge_update' in self._hooks:
+                    self.add_task(
+                        self.on_challenge_update(self.challenges)
+                    )
 
             #Messages
-            elif inp_type == 'c:' or inp_type == 'c':
-                timestamp = None
+            elif (inp_type == 'c:' or inp_type == 'c') and \
+                'on_chat_message' in self._hooks:
+                timestamp, params = None, line.params
                 if inp_type == 'c:':
                     timestamp, params = int(params[0]), params[1:]
                 author_str, *content = params
@@ -378,8 +882,8 @@ class Client(user.User):
                 self.add_task(
                     self.on_chat_message(chat_message)
                 )
-            elif inp_type == 'pm':
-                author_str, recipient_str, *content = params
+            elif inp_type == 'pm' and 'on_private_message' in self._hooks:
+                author_str, recipient_str, *content = line.params
                 content = '|'.join(content)
                 private_message = message.PrivateMessage(
                     author_str, recipient_str, content, client=self)
@@ -389,26 +893,96 @@ class Client(user.User):
 
             #Rooms
             elif inp_type == 'init':
-                room_type = params[0]
+                room_type = line.params[0]
                 room_obj = room.class_map.get(room_type, room.Room)(
-                    room_id, client=self, max_logs=self.max_room_logs)
+                    room_id, client=self, max_logs=self.log_budgets.get(
+                    room_type, self.max_room_logs))
                 self.rooms[room_id] = room_obj
-                self.add_task(
-                    self.on_room_init(room_obj)
-                )
-            elif inp_type == 'deinit':
-                if room_id in self.rooms:
+                if isinstance(room_obj, room.Battle):
+                    room_obj.start()
+                if 'on_room_init' in self._hooks:
                     self.add_task(
-                        self.on_room_deinit(self.rooms.pop(room_id))
+                        self.on_room_init(room_obj)
                     )
+            elif inp_type == 'deinit':
+                self.release_room(room_id)
 
             #add content to proper room
-            if isinstance(self.rooms.get(room_id, None), room.Room):
-                self.rooms[room_id].add_content(inp)
+            room_obj = self.rooms.get(room_id, None)
+            if isinstance(room_obj, room.Room):
+                room_obj.add_content(line)
+
+            #Release battles once they are over
+            if (inp_type == 'win' or inp_type == 'tie') and \
+                isinstance(room_obj, room.Battle) and room_obj.ended:
+                self._on_battle_end(room_obj)
+
+            if 'on_receive' in self._hooks:
+                self.add_task(
+                    self.on_receive(room_id, inp_type, line.params),
+                )
+
+        #Hand the frame to the actors of the battles it concerns. A frame
+        #holding rows of several rooms is split, so that each battle only
+        #gets its own rows
+        room_ids = set(room_id for room_id, _ in inputs)
+        for room_id in room_ids:
+            room_obj = self.rooms.get(room_id, None)
+            if isinstance(room_obj, room.Battle):
+                room_input = socket_input if len(room_ids) == 1 else \
+                    _room_frame(room_id, [inp for inp_room_id, inp in inputs
+                        if inp_room_id == room_id])
+                room_obj.post(room_input, received_time)
+
+    def release_room(self, room_id):
+        """
+        Removes the room specified by room_id from the client's rooms. Battles
+        have their actor stopped and their log archived. Called when a deinit
+        message is received, and when an ended battle is released.
 
+        Returns:
+            showdown.room.Room : The released room, or None if the client
+                wasn't in it.
+        """
+        room_obj = self.rooms.pop(room_id, None)
+        if room_obj is None:
+            return None
+        if isinstance(room_obj, room.Battle):
+            room_obj.stop()
+            room_obj.archive()
+        if 'on_room_deinit' in self._hooks:
             self.add_task(
-                self.on_receive(room_id, inp_type, params),
+                self.on_room_deinit(room_obj)
             )
+        return room_obj
+
+    def _on_battle_end(self, battle):
+        self.metrics['battles_ended_total'].inc()
+        self.metrics['battle_duration_seconds'].observe(
+            time.time() - battle.init_time)
+        if self.battle_grace_period is not None:
+            self.add_task(self._release_battle(battle), bounded=False)
+
+    async def _release_battle(self, battle):
+        """
+        |coro|
+
+        Gives the actor of an ended battle battle_grace_period seconds to
+        apply the events left in its mailbox, then leaves the battle and
+        releases it.
+        """
+        try:
+            await asyncio.wait_for(battle.mailbox.join(),
+                self.battle_grace_period)
+        except asyncio.TimeoutError:
+            logger.info('%s still had %d events to apply when released',
+                battle.id, battle.mailbox.qsize())
+        if self.rooms.get(battle.id, None) is not battle:
+            # Already released by a deinit message
+            return
+        await self.leave(battle.id)
+        self.release_room(battle.id)
+        self.metrics['battles_released_total'].inc()
 
     async def login(self):
         """
@@ -432,11 +1006,14 @@ class Client(user.User):
                 ' Raw login result:\n{}'.format(self.name, result_data))
         else:
             logger.info('Login succeeded')
-        await self.websocket.send('["|/trn {},0,{}"]'
-            .format(self.name, login_data['assertion']))
-        self.add_task(
-            self.on_login(login_data)
-        )
+        data = '["|/trn {},0,{}"]'.format(self.name, login_data['assertion'])
+        await self.websocket.send(data)
+        if self.transcript is not None:
+            self.transcript.record('out', data)
+        if 'on_login' in self._hooks:
+            self.add_task(
+                self.on_login(login_data)
+            )
 
     @docutils.format()
     async def set_avatar(self, avatar_id, delay=0, lifespan=math.inf):
@@ -465,8 +1042,11 @@ class Client(user.User):
                 Ex: 'leave', 'mute', 'forfeit'
             {delay}
             {lifespan}
+
+        Returns:
+            OutputToken : Token representing the command to be sent.
         """
-        await self.add_output('{}|/{} {}'.format(
+        return await self.add_output('{}|/{} {}'.format(
             room_id, command_name, ', '.join(args)),
             delay=delay, lifespan=lifespan)
 
@@ -502,7 +1082,7 @@ class Client(user.User):
             {delay}
             {lifespan}
         """
-        battle_format = utils.name_to_id(battle_format)
+        battle_format = utils.to_id(battle_format)
         team = team or 'null'
         await self.upload_team(team, delay=delay, lifespan=lifespan)
         await self.add_output('|/vtm {}'.format(battle_format),
@@ -524,7 +1104,7 @@ class Client(user.User):
             You can specify the team to be None or the empty string for 
             battle_formats like randombattles, where no team is needed to be provided.
         """
-        battle_format = utils.name_to_id(battle_format)
+        battle_format = utils.to_id(battle_format)
         await self.upload_team(team, delay=delay, lifespan=lifespan)
         await self.add_output('|/search {}'.format(battle_format),
             delay=delay, lifespan=lifespan)
@@ -652,7 +1232,7 @@ class Client(user.User):
             {strict_error}
         """
         content = utils.clean_message_content(content, strict=strict)
-        user_id = utils.name_to_id(user_name)
+        user_id = utils.to_id(user_name)
         await self.add_output('|/msg {}, {}'.format(user_id, content),
             delay=0, lifespan=math.inf)
 
@@ -780,8 +1360,8 @@ class Client(user.User):
         Returns:
             None
         """
-        battle_format = utils.name_to_id(battle_format)
-        output = '|/cmd roomlist {}'.format(utils.name_to_id(battle_format))
+        battle_format = utils.to_id(battle_format)
+        output = '|/cmd roomlist {}'.format(utils.to_id(battle_format))
         if min_elo is not None:
             output += ', {}'.format(min_elo)
         await self.add_output(output,
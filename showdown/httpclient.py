@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""Module for the HTTPClient class, the asynchronous HTTP layer of showdown"""
+import asyncio
+import json
+import logging
+import aiohttp
+from collections import namedtuple
+
+#Logging setup
+logger = logging.getLogger(__name__)
+
+class HTTPResponse(namedtuple('HTTPResponse', ['status', 'text'])):
+    """
+    Result of a request made through an HTTPClient. The body is read before
+    the connection is released to the pool, so the response can be used
+    after the request has completed.
+
+    Attributes:
+        status (:obj:`int`) : The HTTP status code of the response.
+        text (:obj:`str`) : The decoded body of the response.
+    """
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return self.status < 400
+
+    def json(self):
+        return json.loads(self.text)
+
+class HTTPClient:
+    """
+    Asynchronous HTTP facade shared by a client's Server and User objects.
+    Requests go through a single aiohttp session backed by a pooled
+    connector, with a timeout on each request and a limit on the number of
+    requests in flight.
+
+    Args:
+        session (:obj:`aiohttp.ClientSession`, optional) : Session to send
+            requests with. If None, a session is created by HTTPClient.open
+            and closed by HTTPClient.close.
+        max_connections (:obj:`int`, optional) : Size of the connection pool
+            of the created session. Defaults to 20.
+        max_connections_per_host (:obj:`int`, optional) : Maximum number of
+            pooled connections to a single host. Defaults to 8.
+        max_requests (:obj:`int`, optional) : Maximum number of requests in
+            flight at the same time. Defaults to 16.
+        timeout (:obj:`int` or obj:`float`, optional) : Number of seconds
+            after which a request is abandoned. Defaults to 15.
+
+    Attributes:
+        session (:obj:`aiohttp.ClientSession` or None) : The session used to
+            send requests. None until the HTTPClient is opened.
+        stats (:obj:`dict`) : Number of requests sent, failed and in flight.
+    """
+    def __init__(self, session=None, *, max_connections=20,
+        max_connections_per_host=8, max_requests=16, timeout=15):
+        self.session = session
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.max_requests = max_requests
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.stats = {
+            'sent': 0,
+            'failed': 0,
+            'in_flight': 0
+        }
+        self._owns_session = session is None
+        self._semaphore = asyncio.Semaphore(max_requests)
+
+    def __repr__(self):
+        return '<HTTPClient in_flight={}>'.format(self.stats['in_flight'])
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def open(self):
+        """
+        |coro|
+
+        Creates the pooled session if none was given.
+        """
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_connections,
+                limit_per_host=self.max_connections_per_host)
+            self.session = aiohttp.ClientSession(connector=connector,
+                timeout=self.timeout)
+            self._owns_session = True
+
+    async def close(self):
+        """
+        |coro|
+
+        Closes the session if it was created by this object.
+        """
+        if self._owns_session and self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def request(self, method, url, *, params=None, data=None,
+        headers=None):
+        """
+        |coro|
+
+        Sends a request and reads its body.
+
+        Args:
+            method (:obj:`str`) : The HTTP method. Ex: 'GET', 'POST'
+            url (:obj:`str`) : The url to send the request to.
+            params (:obj:`dict`, optional) : Query string parameters.
+            data (:obj:`dict`, optional) : Form data of the request.
+            headers (:obj:`dict`, optional) : Additional headers.
+
+        Returns:
+            HTTPResponse : The status and body of the response.
+
+        Raises:
+            aiohttp.ClientError : Raised when the request fails.
+            asyncio.TimeoutError : Raised when the request times out.
+        """
+        if self.session is None:
+            raise Exception('HTTPClient.open must be awaited before sending '
+                            'requests.')
+        async with self._semaphore:
+            self.stats['in_flight'] += 1
+            try:
+                async with self.session.request(method, url, params=params,
+                    data=data, headers=headers, timeout=self.timeout) as resp:
+                    response = HTTPResponse(resp.status, await resp.text())
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                self.stats['failed'] += 1
+                logger.warning('{} {} failed'.format(method, url))
+                raise
+            finally:
+                self.stats['in_flight'] -= 1
+                self.stats['sent'] += 1
+        return response
+
+    async def get(self, url, **kwargs):
+        """
+        |coro|
+
+        Sends a GET request. See HTTPClient.request.
+        """
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        """
+        |coro|
+
+        Sends a POST request. See HTTPClient.request.
+        """
+        return await self.request('POST', url, **kwargs)
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""Module for the integer id registries of species, moves, types, abilities,
+items and stats"""
+from . import utils
+
+class IdRegistry:
+    """
+    Two-way mapping between canonical ids and small integers. Each canonical
+    id gets the next free integer the first time it is registered, so
+    integers are stable for the lifetime of the process and can index lists
+    and arrays.
+
+    Args:
+        kind (:obj:`str`) : What the registry holds. Ex: 'types'
+        names (iterable, optional) : Names registered in order when the
+            registry is created. Defaults to ().
+        frozen (:obj:`bool`, optional) : If True, IdRegistry.num doesn't
+            register new names and returns None for unknown ones. Defaults to
+            False.
+
+    Examples:
+        >>> TYPES.num('Electric')
+        3
+        >>> TYPES.name(3)
+        'electric'
+    """
+    def __init__(self, kind, names=(), frozen=False):
+        self.kind = kind
+        self._nums = {}
+        self._names = []
+        self.frozen = False
+        for name in names:
+            self.num(name)
+        self.frozen = frozen
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return utils.to_id(name) in self._nums
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __repr__(self):
+        return '<IdRegistry `{}` {} ids>'.format(self.kind, len(self))
+
+    def num(self, name):
+        """
+        Returns the integer of name, registering it if needed. name is
+        normalized with showdown.utils.to_id first. Returns None for a None
+        name, or for an unknown name if the registry is frozen.
+        """
+        if name is None:
+            return None
+        name = utils.to_id(name)
+        num = self._nums.get(name, None)
+        if num is None and not self.frozen:
+            num = self._nums[name] = len(self._names)
+            self._names.append(name)
+        return num
+
+    def get(self, name):
+        """
+        Returns the integer of name without registering it, or None if name
+        is None or unknown. Used for lookups, so that names that were never
+        parsed don't grow the registry.
+        """
+        if name is None:
+            return None
+        return self._nums.get(utils.to_id(name), None)
+
+    def name(self, num):
+        """
+        Returns the canonical id registered for num.
+        """
+        return self._names[num]
+
+#Type ids follow the order of the type chart, see showdown.logic.TYPE_CHART
+TYPES = IdRegistry('types', ('normal', 'fire', 'water', 'electric', 'grass',
+    'ice', 'fighting', 'poison', 'ground', 'flying', 'psychic', 'bug', 'rock',
+    'ghost', 'dragon', 'dark', 'steel', 'fairy'))
+STATS = IdRegistry('stats', ('atk', 'def', 'spa', 'spd', 'spe'), frozen=True)
+SPECIES = IdRegistry('species')
+MOVES = IdRegistry('moves')
+ABILITIES = IdRegistry('abilities')
+ITEMS = IdRegistry('items')
@@ -1,9 +1,14 @@
 
+import os
 from .teams import *
+from . import ids
 #from teams import *
 from random import randint
 import re
 
+TYPE_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               '..', 'data', 'pokemon_type.txt')
+
 def determince_speed_tie(pokemon1, pokemon2):
     if int(pokemon1.get_speed()) >= int(pokemon2.get_speed()):
         return True
@@ -11,38 +16,37 @@ def determince_speed_tie(pokemon1, pokemon2):
 
 #retourne la table des types
 def type_table():
-    weakness_lines=[]
     weakness_table=[]
-    weakness_file = open("./data/pokemon_type.txt",'r')
-    #weakness_file = open("../data/pokemon_type.txt",'r')
-    
-    for weakness_line in weakness_file:
-        if (not('fairy,1' in weakness_line)):
-            # remove \n when not last line
-            weakness_lines+=[weakness_line[0:len(weakness_line)-1]]
-        else:
-            weakness_lines+=[weakness_line]
-    weakness_file.close()
-    for i in weakness_lines:
-        weakness_table+=[i.split(',')]
+    with open(TYPE_TABLE_PATH,'r') as weakness_file:
+        for weakness_line in weakness_file:
+            weakness_table+=[weakness_line.rstrip('\n').split(',')]
     return (weakness_table)
 
+#table des types indexée par les ids de showdown.ids.TYPES :
+#TYPE_CHART[type attaque][type défense]
+def load_type_chart():
+    table_type=type_table()
+    defending_types=[ids.TYPES.num(name) for name in table_type[0][1:]]
+    type_chart=[[1.0]*len(ids.TYPES) for _ in range(len(ids.TYPES))]
+    for row in table_type[1:]:
+        attack_type_num=ids.TYPES.num(row[0])
+        for defending_type_num, multiplier in zip(defending_types, row[1:]):
+            type_chart[attack_type_num][defending_type_num]=float(multiplier)
+    return type_chart
+
+TYPE_CHART = load_type_chart()
+
 #retourne le coefficient multiplicateur CM entre l'attaque et lle pokémon qui subbit l'attaque 
+#les types inconnus de la table sont neutres
 def type_multipplicator(attack,pokemon):
-    table_type=type_table()
-    type_pokemon=Pokemon.get_types(pokemon)
-    type_attack=Move.get_move_type(attack)
-    attack_type_indice=0
-    for indice in range(0,len(table_type)):
-        if(type_attack==table_type[indice][0]):
-            attack_type_indice=indice
+    type_attack=Move.get_move_type_num(attack)
+    if type_attack is None or type_attack>=len(TYPE_CHART):
+        return 1
+    chart_row=TYPE_CHART[type_attack]
     CM=1
-    for pokemon_type in type_pokemon:
-        pokemon_type_indice=0
-        for indice in range(0,len(table_type)):
-            if(pokemon_type==table_type[0][indice]):
-                pokemon_type_indice=indice
-        CM=CM*float(table_type[attack_type_indice][pokemon_type_indice])
+    for pokemon_type in Pokemon.get_type_nums(pokemon):
+        if pokemon_type<len(chart_row):
+            CM=CM*chart_row[pokemon_type]
     return CM
 
 def damage_calcul(pokemon1,pokemon2,attack):
@@ -63,10 +67,8 @@ def damage_calcul(pokemon1,pokemon2,attack):
     if (Move.get_category(attack) =='physical'):
         Att=int(Pokemon.get_attack(pokemon1))
         Def=int(Pokemon.get_defense(pokemon2))
-    pokemon_type=Pokemon.get_types(pokemon1)
-    for type_pokemon in pokemon_type:
-        if (type_pokemon==Move.get_move_type(attack)):
-            Stab=1.5
+    if Move.get_move_type_num(attack) in Pokemon.get_type_nums(pokemon1):
+        Stab=1.5
     lvl=int(Pokemon.get_level(pokemon1))
     if (not(Move.get_category(attack)=='status')) and Move.get_power(attack) is not None:
         Pui=int(Move.get_power(attack))
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""Module for the LogStore and RoomLog classes used to store room logs"""
+import logging
+import sys
+import weakref
+import zlib
+from collections import deque
+
+#Logging setup
+logger = logging.getLogger(__name__)
+
+#Lines up to this length are interned, as short lines ('|', '|upkeep',
+#'|turn|3', joins and leaves...) repeat across rooms
+INTERN_MAX_LENGTH = 32
+
+#Size of the bookkeeping of a compressed chunk, in bytes
+CHUNK_OVERHEAD = 64
+
+class RoomLog:
+    """
+    Append-only log of a room's protocol lines, used in place of a deque.
+    The most recent lines are kept as strings. Once chunk_size of them have
+    accumulated, they are packed into a chunk, compressed with zlib if
+    compression is enabled. When the log holds more than maxlen lines, the
+    oldest ones are dropped.
+
+    Args:
+        maxlen (:obj:`int`, optional) : The maximum number of lines kept.
+            Defaults to 5000.
+        store (:obj:`showdown.logstore.LogStore`, optional) : The store
+            accounting for the log's memory usage. Defaults to None.
+        room_id (:obj:`str`, optional) : The id of the room of the log.
+
+    Attributes:
+        maxlen (:obj:`int`) : The maximum number of lines kept.
+        dropped (:obj:`int`) : The number of lines dropped to respect maxlen
+            or the memory cap of the store.
+    """
+    def __init__(self, maxlen=5000, store=None, room_id=None):
+        self.maxlen = maxlen
+        self.room_id = room_id
+        self.dropped = 0
+        self._store = store
+        self._chunks = deque()
+        self._recent = deque()
+        self._len = 0
+        self._size = [0]
+        if store is not None:
+            store._register(self)
+
+    def __len__(self):
+        return self._len
+
+    def __bool__(self):
+        return self._len > 0
+
+    def __repr__(self):
+        return '<RoomLog `{}` {}/{}>'.format(self.room_id, self._len,
+            self.maxlen)
+
+    def __iter__(self):
+        for count, chunk in list(self._chunks):
+            lines = self._unpack(chunk)
+            if count != len(lines):
+                lines = lines[len(lines) - count:]
+            yield from lines
+        yield from list(self._recent)
+
+    def __reversed__(self):
+        return reversed(list(self))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError('RoomLog index out of range')
+        recent_start = self._len - len(self._recent)
+        if index >= recent_start:
+            return self._recent[index - recent_start]
+        for count, chunk in self._chunks:
+            if index < count:
+                lines = self._unpack(chunk)
+                return lines[len(lines) - count + index]
+            index -= count
+
+    def _unpack(self, chunk):
+        if isinstance(chunk, bytes):
+            return zlib.decompress(chunk).decode().split('\n')
+        return chunk
+
+    def _pack(self, lines):
+        if self._store is not None and not self._store.compress:
+            return lines, sum(sys.getsizeof(line) for line in lines)
+        chunk = zlib.compress('\n'.join(lines).encode(),
+            self._store.compress_level if self._store is not None else 6)
+        return chunk, len(chunk) + CHUNK_OVERHEAD
+
+    def _chunk_size(self):
+        return self._store.chunk_size if self._store is not None else 256
+
+    def _resize(self, delta):
+        self._size[0] += delta
+        if self._store is not None:
+            self._store._size += delta
+
+    def append(self, line):
+        """
+        Adds line to the end of the log, dropping the oldest line if the log
+        is full.
+        """
+        if len(line) <= INTERN_MAX_LENGTH:
+            line = sys.intern(line)
+        self._recent.append(line)
+        self._len += 1
+        self._resize(sys.getsizeof(line))
+        if len(self._recent) >= self._chunk_size():
+            lines = tuple(self._recent)
+            self._recent.clear()
+            chunk, size = self._pack(lines)
+            self._chunks.append((len(lines), chunk))
+            self._resize(size - sum(sys.getsizeof(line) for line in lines))
+        while self._len > self.maxlen:
+            self.popleft()
+        if self._store is not None:
+            self._store._check()
+
+    def extend(self, lines):
+        for line in lines:
+            self.append(line)
+
+    def popleft(self):
+        """
+        Drops the oldest line of the log. Lines of a chunk are only released
+        once every line of the chunk has been dropped.
+        """
+        if not self._len:
+            raise IndexError('pop from an empty RoomLog')
+        self._len -= 1
+        self.dropped += 1
+        if self._chunks:
+            count, chunk = self._chunks[0]
+            if count == 1:
+                self._chunks.popleft()
+                self._resize(-self._chunk_memory(chunk))
+            else:
+                self._chunks[0] = (count - 1, chunk)
+        else:
+            self._resize(-sys.getsizeof(self._recent.popleft()))
+
+    def _chunk_memory(self, chunk):
+        if isinstance(chunk, bytes):
+            return len(chunk) + CHUNK_OVERHEAD
+        return sum(sys.getsizeof(line) for line in chunk)
+
+    def _drop_oldest_chunk(self):
+        if self._chunks:
+            count, chunk = self._chunks.popleft()
+            self._len -= count
+            self.dropped += count
+            self._resize(-self._chunk_memory(chunk))
+        elif self._recent:
+            self.popleft()
+
+    def clear(self):
+        self._chunks.clear()
+        self._recent.clear()
+        self._len = 0
+        self._resize(-self._size[0])
+
+    def memory_usage(self):
+        """
+        Returns the approximate number of bytes used by the log's lines.
+        """
+        return self._size[0]
+
+class LogStore:
+    """
+    Shared accounting for the logs of a client's rooms. When the total memory
+    used by the logs exceeds max_bytes, lines are dropped from the log using
+    the most memory, oldest first, until the total is under the cap again.
+
+    Args:
+        max_bytes (:obj:`int`, optional) : The maximum number of bytes used by
+            all the logs. Defaults to 32 MiB. None disables the cap.
+        compress (:obj:`bool`, optional) : Whether the older lines of each log
+            are compressed. Defaults to True.
+        chunk_size (:obj:`int`, optional) : The number of lines packed in each
+            chunk. Defaults to 256.
+        compress_level (:obj:`int`, optional) : zlib compression level, from 1
+            (fastest) to 9 (smallest). Defaults to 6.
+
+    Attributes:
+        evictions (:obj:`int`) : The number of times a chunk, or a single line
+            of a log without chunks, was dropped to respect the memory cap.
+    """
+    def __init__(self, max_bytes=32 * 2 ** 20, compress=True, chunk_size=256,
+        compress_level=6):
+        assert max_bytes is None or max_bytes > 0, \
+            'max_bytes should be None or strictly positive'
+        assert chunk_size > 0, 'chunk_size should be strictly positive'
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.chunk_size = chunk_size
+        self.compress_level = compress_level
+        self.evictions = 0
+        self._logs = weakref.WeakSet()
+        self._size = 0
+
+    def __repr__(self):
+        return '<LogStore {} bytes in {} logs>'.format(self._size,
+            len(self._logs))
+
+    def open(self, room_id=None, maxlen=5000):
+        """
+        Returns a new RoomLog accounted for by the store.
+        """
+        return RoomLog(maxlen=maxlen, store=self, room_id=room_id)
+
+    def _register(self, log):
+        self._logs.add(log)
+        # Release the memory of logs of rooms that have been dropped
+        weakref.finalize(log, self._release, log._size)
+
+    def _release(self, size):
+        self._size -= size[0]
+
+    def _check(self):
+        if self.max_bytes is None or self._size <= self.max_bytes:
+            return
+        while self._size > self.max_bytes:
+            log = max(self._logs, key=RoomLog.memory_usage, default=None)
+            if log is None or not log:
+                break
+            log._drop_oldest_chunk()
+            self.evictions += 1
+
+    def memory_usage(self):
+        """
+        Returns a dict with the total number of bytes used by the logs, the
+        number of lines they hold, and the bytes used by each room.
+        """
+        logs = list(self._logs)
+        return {
+            'total': self._size,
+            'max_bytes': self.max_bytes,
+            'lines': sum(len(log) for log in logs),
+            'evictions': self.evictions,
+            'rooms': {log.room_id: log.memory_usage() for log in logs}
+        }
@@ -24,6 +24,7 @@ class ChatMessage:
                 sent
             author_str (obj:`str`) : A string representing the name and rank of
                 the author
+            author (obj:`showdown.user.User`) : The author of the message
             content (obj:`str`) : A string representing the content of the 
                 message
             client (obj:`showdown.client.Client` or None) : The Client to be
@@ -32,7 +33,8 @@ class ChatMessage:
     def __init__(self, room_id, timestamp, author_str, content, client=None):
         self.room_id = room_id
         self.timestamp = timestamp
-        self.author = user.User(author_str, client=client)
+        self.author_str = author_str
+        self.author = user.get_user(author_str, client=client)
         self.content = content
         self.client = client
 
@@ -40,7 +42,7 @@ class ChatMessage:
         return '<ChatMessage ({}) [{}] {}: {}>'.format(
                  self.room_id, 
                  utils.timestamp_to_hh_mm_ss(self.timestamp), 
-                 str(self.author),
+                 self.author_str.strip(),
                  utils.abbreviate(self.content)
                )
 
@@ -48,7 +50,7 @@ class ChatMessage:
         return '({}) [{}] {}: {}'.format(
                 self.room_id,
                 utils.timestamp_to_hh_mm_ss(self.timestamp), 
-                str(self.author),
+                self.author_str.strip(),
                 self.content
             )
 
@@ -78,22 +80,24 @@ class PrivateMessage:
     """
     def __init__(self, author_str, recipient_str, content, client=None):
         self.timestamp = int(time.time())
-        self.author = user.User(author_str, client=client)
-        self.recipient = user.User(recipient_str, client=client)
+        self.author_str = author_str
+        self.recipient_str = recipient_str
+        self.author = user.get_user(author_str, client=client)
+        self.recipient = user.get_user(recipient_str, client=client)
         self.content = content
         self.client = client
 
     def __repr__(self):
         return '<PrivateMessage ({}->{}) [{}]: {}>'.format(
-               str(self.author), 
-               str(self.recipient),
+               self.author_str.strip(), 
+               self.recipient_str.strip(),
                utils.timestamp_to_hh_mm_ss(self.timestamp), 
                utils.abbreviate(self.content))
 
     def __str__(self):
         return '(private message) [{}] {}: {}'.format(
                 utils.timestamp_to_hh_mm_ss(self.timestamp), 
-                str(self.author),
+                self.author_str.strip(),
                 self.content
             )
 
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""Module for the MetricsRegistry class, exposing a client's counters, gauges
+and histograms"""
+import bisect
+import logging
+import os
+from aiohttp import web
+
+#Logging setup
+logger = logging.getLogger(__name__)
+
+#Upper bounds of the default histogram buckets, in seconds
+DEFAULT_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5,
+    10)
+
+class Counter:
+    """
+    Value that only goes up. Ex: the number of frames received.
+    """
+    kind = 'counter'
+
+    def __init__(self, name, help=''):
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def __repr__(self):
+        return '<Counter `{}` {}>'.format(self.name, self.value)
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def collect(self):
+        return self.value
+
+class Gauge:
+    """
+    Value that goes up and down. Ex: the depth of a queue. If func is given,
+    the value is read from it whenever the gauge is collected.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name, help='', func=None):
+        self.name = name
+        self.help = help
+        self.func = func
+        self.value = 0
+
+    def __repr__(self):
+        return '<Gauge `{}` {}>'.format(self.name, self.collect())
+
+    def set(self, value):
+        self.value = value
+
+    def collect(self):
+        return self.func() if self.func is not None else self.value
+
+class Histogram:
+    """
+    Distribution of observed values, counted in buckets of increasing upper
+    bounds. Ex: the time outputs spend in the output queue.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, help='', buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def __repr__(self):
+        return '<Histogram `{}` count={}>'.format(self.name, self.count)
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def collect(self):
+        """
+        Returns a dict with the count and sum of the observed values, and the
+        cumulative count of each bucket, keyed by its upper bound.
+        """
+        cumulative, buckets = 0, {}
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {'count': self.count, 'sum': self.sum, 'buckets': buckets}
+
+class MetricsRegistry:
+    """
+    Named counters, gauges and histograms of a client. The metrics can be
+    collected as a dict, rendered in the Prometheus text format, written to a
+    file, or served over HTTP.
+
+    Args:
+        prefix (:obj:`str`, optional) : Prefix added to the name of every
+            metric when rendered. Defaults to 'showdown_'.
+
+    Example:
+        >>> frames = registry.counter('frames_received_total', 'Frames read')
+        >>> frames.inc()
+        >>> print(registry.render())
+    """
+    def __init__(self, prefix='showdown_'):
+        self.prefix = prefix
+        self._metrics = {}
+        self._runner = None
+
+    def __len__(self):
+        return len(self._metrics)
+
+    def __getitem__(self, name):
+        return self._metrics[name]
+
+    def __repr__(self):
+        return '<MetricsRegistry {} metrics>'.format(len(self))
+
+    def _add(self, metric):
+        assert metric.name not in self._metrics, \
+            'Metric `{}` is already registered'.format(metric.name)
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help=''):
+        return self._add(Counter(name, help))
+
+    def gauge(self, name, help='', func=None):
+        return self._add(Gauge(name, help, func))
+
+    def histogram(self, name, help='', buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, buckets))
+
+    def collect(self):
+        """
+        Returns a dict of {name : value} of every metric. Histograms are
+        collected as dicts, see Histogram.collect.
+        """
+        return {name: metric.collect()
+            for name, metric in self._metrics.items()}
+
+    def render(self):
+        """
+        Returns the metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        for name, metric in self._metrics.items():
+            name = self.prefix + name
+            if metric.help:
+                lines.append('# HELP {} {}'.format(name, metric.help))
+            lines.append('# TYPE {} {}'.format(name, metric.kind))
+            value = metric.collect()
+            if metric.kind == 'histogram':
+                for bound, count in value['buckets'].items():
+                    lines.append('{}_bucket{{le="{}"}} {}'.format(name, bound,
+                        count))
+                lines.append('{}_sum {}'.format(name, value['sum']))
+                lines.append('{}_count {}'.format(name, value['count']))
+            else:
+                lines.append('{} {}'.format(name, value))
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path):
+        """
+        Writes the rendered metrics to path. The file is replaced atomically,
+        so readers never see a partial dump.
+        """
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wt') as f:
+            f.write(self.render())
+        os.replace(temp_path, path)
+
+    async def serve(self, host='localhost', port=9100):
+        """
+        |coro|
+
+        Starts serving the rendered metrics over HTTP at /metrics. Does
+        nothing if the registry is already being served. Raises OSError if
+        the port can't be bound.
+        """
+        if self._runner is not None:
+            return
+        app = web.Application()
+        app.router.add_get('/metrics', self._metrics_handler)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        try:
+            await web.TCPSite(self._runner, host, port).start()
+        except:
+            await self.stop()
+            raise
+        logger.info('Serving metrics on http://{}:{}/metrics'.format(host,
+            port))
+
+    async def stop(self):
+        """
+        |coro|
+
+        Stops serving the metrics.
+        """
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _metrics_handler(self, request):
+        return web.Response(text=self.render(),
+            content_type='text/plain', charset='utf-8')
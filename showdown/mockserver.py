@@ -0,0 +1,470 @@
+# -*- coding: utf-8 -*-
+"""Module for the MockServer class, a local stand-in for a Showdown server
+
+The mock server speaks enough of Showdown's protocol to drive a Client and
+its Battle objects end to end without network access: the connection
+handshake and challstr, a login stub, chat and private message echoes,
+/data replies, and scripted battles streaming requests and turns.
+
+Example:
+    >>> async with MockServer(port=8001, autostart_battles=200) as mock:
+    ...     client = showdown.Client('bot', 'pass', send_interval=0,
+    ...         **mock.client_kwargs())
+    ...     client.start()
+
+It can also be run on its own with ``python -m showdown.mockserver``.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import random
+import string
+from aiohttp import web, WSMsgType
+from . import utils
+
+#Logging setup
+logger = logging.getLogger(__name__)
+
+#Species and moves of the scripted battles, with the data sent for /data
+#Ex: species id : (name, types, abilities, base stats)
+SPECIES_DATA = {
+    'pikachu': ('Pikachu', ['Electric'], ['Static', 'Lightning Rod'],
+        [35, 55, 40, 50, 50, 90]),
+    'snorlax': ('Snorlax', ['Normal'], ['Immunity', 'Thick Fat'],
+        [160, 110, 65, 65, 110, 30]),
+    'charizard': ('Charizard', ['Fire', 'Flying'], ['Blaze', 'Solar Power'],
+        [78, 84, 78, 109, 85, 100]),
+}
+#Ex: move id : (name, type, category, power, accuracy, description)
+MOVE_DATA = {
+    'thunderbolt': ('Thunderbolt', 'Electric', 'Special', 90, 100,
+        '10% chance to paralyze the target.'),
+    'quickattack': ('Quick Attack', 'Normal', 'Physical', 40, 100,
+        'Usually goes first.'),
+    'irontail': ('Iron Tail', 'Steel', 'Physical', 100, 75,
+        '30% chance to lower the target\'s Defense by 1.'),
+    'voltswitch': ('Volt Switch', 'Electric', 'Special', 70, 100,
+        'User switches out after damaging the target.'),
+    'bodyslam': ('Body Slam', 'Normal', 'Physical', 85, 100,
+        '30% chance to paralyze the target.'),
+    'earthquake': ('Earthquake', 'Ground', 'Physical', 100, 100,
+        'Hits adjacent Pokemon. Double damage on Dig.'),
+    'rest': ('Rest', 'Psychic', 'Status', None, None,
+        'User sleeps 2 turns and restores HP and status.'),
+    'curse': ('Curse', 'Ghost', 'Status', None, None,
+        'Curses if Ghost, else -1 Spe, +1 Atk, +1 Def.'),
+}
+SCRIPTED_TEAM = [
+    {'ident': 'p1: Pikachu', 'details': 'Pikachu, L84, M',
+     'condition': '211/211', 'active': True,
+     'stats': {'atk': 165, 'def': 130, 'spa': 165, 'spd': 148, 'spe': 231},
+     'moves': ['thunderbolt', 'quickattack', 'irontail', 'voltswitch'],
+     'baseAbility': 'static', 'item': 'lightball', 'pokeball': 'pokeball',
+     'ability': 'static'},
+    {'ident': 'p1: Snorlax', 'details': 'Snorlax, L80, F',
+     'condition': '380/380', 'active': False,
+     'stats': {'atk': 230, 'def': 150, 'spa': 150, 'spd': 230, 'spe': 100},
+     'moves': ['bodyslam', 'earthquake', 'rest', 'curse'],
+     'baseAbility': 'thickfat', 'item': 'leftovers', 'pokeball': 'pokeball',
+     'ability': 'thickfat'},
+]
+OPPONENT_NAME = 'MockFoe'
+
+#Frame builders
+def frame(room_id, *lines):
+    """
+    Returns a websocket frame holding lines for the room specified by
+    room_id. Lines for the global room are sent with an empty room_id.
+    """
+    header = '>{}\n'.format(room_id) if room_id else ''
+    return 'a' + json.dumps([header + '\n'.join(lines)])
+
+def init_frame(room_id, player_name, battle_format):
+    """
+    Returns the frame opening a battle between player_name and the mock
+    opponent.
+    """
+    return frame(room_id, '|init|battle',
+        '|title|{} vs. {}'.format(player_name, OPPONENT_NAME),
+        '|j| {}'.format(player_name), '|j| {}'.format(OPPONENT_NAME),
+        '|player|p1|{}|1|'.format(player_name),
+        '|player|p2|{}|2|'.format(OPPONENT_NAME),
+        '|tier|{}'.format(battle_format), '|rated|')
+
+def request_frame(room_id, player_name, rqid, team=SCRIPTED_TEAM):
+    """
+    Returns the |request| frame asking player_name to choose a move for the
+    first active pokemon of team.
+    """
+    active = next(pokemon for pokemon in team if pokemon['active'])
+    moves = [{'move': MOVE_DATA[move][0], 'id': move, 'pp': 24, 'maxpp': 24,
+              'target': 'normal', 'disabled': False}
+             for move in active['moves']]
+    request = {'active': [{'moves': moves}],
+               'side': {'name': player_name, 'id': 'p1', 'pokemon': team},
+               'rqid': rqid}
+    return frame(room_id, '|request|' + json.dumps(request,
+        separators=(',', ':')))
+
+def turn_frame(room_id, turn):
+    """
+    Returns the frame of the events leading to the specified turn.
+    """
+    lines = ['|', '|t:|1600000000']
+    if turn == 1:
+        lines += ['|start', '|switch|p1a: Pikachu|Pikachu, L84, M|211/211',
+                  '|switch|p2a: Charizard|Charizard, L82, F|100/100']
+    else:
+        lines += ['|move|p1a: Pikachu|Thunderbolt|p2a: Charizard',
+                  '|-damage|p2a: Charizard|{}/100'.format(max(100 - 15 * turn, 1)),
+                  '|move|p2a: Charizard|Flamethrower|p1a: Pikachu',
+                  '|-damage|p1a: Pikachu|100/211']
+    lines += ['|upkeep', '|turn|{}'.format(turn)]
+    return frame(room_id, *lines)
+
+def pokemon_data_frame(room_id, species_id):
+    """
+    Returns the |raw| reply to `/data species_id`, as sent by Showdown.
+    """
+    name, types, abilities, stats = SPECIES_DATA[species_id]
+    type_imgs = ''.join('<img src="https://play.pokemonshowdown.com/sprites/'
+        'types/{0}.png" alt="{0}" height="14" width="32">'.format(t)
+        for t in types)
+    ability_cols = ('<span class="col abilitycol">{}</span><span class="col '
+        'abilitycol"><em>{}</em></span>'.format(*abilities))
+    stat_cols = ' '.join('<span class="col statcol"><em>{}</em><br />{}'
+        '</span>'.format(label, value) for label, value
+        in zip(['HP', 'Atk', 'Def', 'SpA', 'SpD', 'Spe'], stats))
+    html = ('<ul class="utilichart"><li class="result"><span class="col '
+        'numcol">UU</span> <span class="col iconcol"><psicon pokemon="{0}"/>'
+        '</span> <span class="col pokemonnamecol" style="white-space:nowrap">'
+        '<a href="https://pokemonshowdown.com/dex/pokemon/{0}" target="_blank">'
+        '{1}</a></span> <span class="col typecol">{2}</span> <span style="float:'
+        'left;min-height:26px">{3}</span><span style="float:left;min-height:'
+        '26px">{4} <span class="col bstcol"><em>BST<br />{5}</em></span> '
+        '</span></li><li style="clear:both"></li></ul>').format(species_id,
+        name, type_imgs, ability_cols, stat_cols, sum(stats))
+    return frame(room_id, '|raw|' + html)
+
+def move_data_frame(room_id, move_id):
+    """
+    Returns the |raw| reply to `/data move_id`, as sent by Showdown.
+    """
+    name, move_type, category, power, accuracy, description = \
+        MOVE_DATA[move_id]
+    cols = ''
+    if power:
+        cols += ('<span class="col labelcol"><em>Power</em><br>{}</span> '
+            .format(power))
+    cols += ('<span class="col widelabelcol"><em>Accuracy</em><br>{}</span> '
+        .format('{}%'.format(accuracy) if accuracy else '&mdash;'))
+    cols += '<span class="col pplabelcol"><em>PP</em><br>16</span> '
+    html = ('<ul class="utilichart"><li class="result"><span class="col '
+        'movenamecol"><a href="https://pokemonshowdown.com/dex/moves/{0}" '
+        'target="_blank">{1}</a></span> <span class="col typecol"><img src="'
+        '//play.pokemonshowdown.com/sprites/types/{2}.png" alt="{2}" width="32"'
+        ' height="14"><img src="//play.pokemonshowdown.com/sprites/categories/'
+        '{3}.png" alt="{3}" width="32" height="14"></span> {4}<span class="col '
+        'movedesccol">{5}</span> </li><li style="clear:both"></li></ul>').format(
+        move_id, name, move_type, category, cols, description)
+    return frame(room_id, '|raw|' + html)
+
+def data_frame(room_id, name):
+    """
+    Returns the reply to `/data name`: pokemon or move data, or an error
+    message if the mock server doesn't know name.
+    """
+    data_id = utils.to_id(name)
+    if data_id in SPECIES_DATA:
+        return pokemon_data_frame(room_id, data_id)
+    if data_id in MOVE_DATA:
+        return move_data_frame(room_id, data_id)
+    return frame(room_id, '|error|No Pokémon, item, move, ability or '
+        'nature named \'{}\' was found.'.format(name))
+
+class MockBattle:
+    """
+    State of a scripted battle: the battle lasts a fixed number of turns,
+    each one started by the player's choice, and is won by the player.
+    """
+    def __init__(self, room_id, turns):
+        self.room_id = room_id
+        self.turns = turns
+        self.turn = 0
+        self.rqid = 0
+
+class MockServer:
+    """
+    Local websocket and HTTP server standing in for Showdown. Each websocket
+    connection is a separate user, who gets a challstr on connection and can
+    log in with any name and password through the action.php stub.
+
+    Battles start when the user sends /search (or any challenge command), or
+    right after login if autostart_battles is set. Each battle sends a
+    request and a turn, then a new request and turn for every /choose, /move
+    or /switch received, until the last turn, where the user wins.
+
+    Args:
+        host (:obj:`str`, optional) : The interface to listen on. Defaults to
+            'localhost'.
+        port (:obj:`int`, optional) : The port to listen on. Defaults to 8000.
+            0 picks a free port.
+        turns (:obj:`int`, optional) : The number of turns of each scripted
+            battle. Defaults to 5.
+        autostart_battles (:obj:`int`, optional) : The number of battles
+            started for each user as soon as they log in. Defaults to 0.
+        battle_format (:obj:`str`, optional) : The format of the battles
+            started automatically. Defaults to '[Gen 8] Random Battle'.
+        response_delay (:obj:`int` or obj:`float`, optional) : Seconds waited
+            before answering a battle choice or /data command, to simulate
+            network and simulator latency. Defaults to 0.
+
+    Attributes:
+        stats (:obj:`dict`) : Number of connections, logins, battles started
+            and finished, choices, /data commands, chat messages, and frames
+            sent and received.
+    """
+    def __init__(self, host='localhost', port=8000, *, turns=5,
+        autostart_battles=0, battle_format='[Gen 8] Random Battle',
+        response_delay=0):
+        assert turns > 0, 'turns should be strictly positive'
+        self.host = host
+        self.port = port
+        self.turns = turns
+        self.autostart_battles = autostart_battles
+        self.battle_format = battle_format
+        self.response_delay = response_delay
+        self.stats = {
+            'connections': 0,
+            'logins': 0,
+            'battles_started': 0,
+            'battles_finished': 0,
+            'choices': 0,
+            'data_requests': 0,
+            'chat_messages': 0,
+            'frames_sent': 0,
+            'frames_received': 0
+        }
+        self._battle_ids = itertools.count(1)
+        self._runner = None
+        self._tasks = set()
+        self.app = web.Application()
+        self.app.router.add_get('/showdown/{triplet}/{octet}/websocket',
+            self._websocket_handler)
+        self.app.router.add_post('/action.php', self._action_handler)
+        self.app.router.add_get('/servers/{server_id}.json',
+            self._server_info_handler)
+
+    def __repr__(self):
+        return '<MockServer {}>'.format(self.address)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    @property
+    def address(self):
+        return '{}:{}'.format(self.host, self.port)
+
+    @property
+    def action_url(self):
+        return 'http://{}/action.php'.format(self.address)
+
+    def client_kwargs(self):
+        """
+        Returns the keyword arguments pointing a Client to the mock server.
+        The client's server action_url should also be set to
+        MockServer.action_url, see MockServer.attach.
+        """
+        return {'server_host': self.address}
+
+    def attach(self, client):
+        """
+        Points the server object of client to the mock server's action.php
+        stub, so logins and replay uploads stay local.
+        """
+        client.server.host = self.address
+        client.server.action_url = self.action_url
+        client.websocket_url = client.server.generate_ws_url()
+
+    async def start(self):
+        """
+        |coro|
+
+        Starts listening for connections.
+        """
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        if self.port == 0:
+            self.port = site._server.sockets[0].getsockname()[1]
+        logger.info('Mock server listening on {}'.format(self.address))
+
+    async def stop(self):
+        """
+        |coro|
+
+        Stops the server and closes open connections.
+        """
+        for task in list(self._tasks):
+            task.cancel()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    #HTTP
+    async def _action_handler(self, request):
+        data = await request.post()
+        if data.get('act') == 'login':
+            self.stats['logins'] += 1
+            result = {'actionsuccess': True, 'assertion': 'mockassertion',
+                      'curuser': {'loggedin': True,
+                                  'username': data.get('name', '')}}
+            return web.Response(text=']' + json.dumps(result))
+        return web.Response(text='success')
+
+    async def _server_info_handler(self, request):
+        return web.json_response({'id': request.match_info['server_id'],
+            'host': self.host, 'port': self.port})
+
+    #Websocket
+    async def _websocket_handler(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.stats['connections'] += 1
+        connection = {'ws': ws, 'name': '', 'battles': {}}
+        await self._send(connection, 'o')
+        challstr = ''.join(random.choice(string.hexdigits) for _ in range(64))
+        await self._send(connection, frame('', '|challstr|4|' + challstr))
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    break
+                self.stats['frames_received'] += 1
+                for command in json.loads(msg.data):
+                    await self._handle_command(connection, command)
+        finally:
+            for task in list(self._tasks):
+                if getattr(task, 'connection', None) is connection:
+                    task.cancel()
+        return ws
+
+    async def _send(self, connection, data):
+        ws = connection['ws']
+        if not ws.closed:
+            await ws.send_str(data)
+            self.stats['frames_sent'] += 1
+
+    def _schedule(self, connection, coro):
+        task = asyncio.ensure_future(coro)
+        task.connection = connection
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _handle_command(self, connection, command):
+        room_id, _, text = command.partition('|')
+        if text.startswith('/'):
+            name, _, args = text[1:].partition(' ')
+            name = name.lower()
+        else:
+            name, args = None, text
+
+        if name == 'trn':
+            connection['name'] = args.split(',')[0]
+            await self._send(connection, frame('', '|updateuser| {}|1|1'
+                .format(connection['name'])))
+            for _ in range(self.autostart_battles):
+                await self._start_battle(connection, self.battle_format)
+        elif name in ('search', 'challenge', 'battle!', 'accept'):
+            battle_format = args.split(',')[-1].strip() or self.battle_format
+            await self._start_battle(connection, battle_format)
+        elif name in ('choose', 'move', 'switch') and \
+            room_id in connection['battles']:
+            self.stats['choices'] += 1
+            self._schedule(connection, self._next_turn(connection,
+                connection['battles'][room_id]))
+        elif name == 'data':
+            self.stats['data_requests'] += 1
+            self._schedule(connection, self._reply(connection,
+                data_frame(room_id, args)))
+        elif name == 'leave':
+            connection['battles'].pop(room_id, None)
+            await self._send(connection, frame(room_id, '|deinit'))
+        elif name == 'join':
+            await self._send(connection, frame(args, '|init|chat',
+                '|title|{}'.format(args), '|users|1, {}'.format(
+                connection['name'])))
+        elif name == 'pm' or name == 'msg':
+            recipient, _, content = args.partition(',')
+            await self._send(connection, frame('', '|pm| {}| {}|{}'.format(
+                connection['name'], recipient.strip(), content.strip())))
+        elif name is None and room_id:
+            self.stats['chat_messages'] += 1
+            await self._send(connection, frame(room_id, '|c| {}|{}'.format(
+                connection['name'], text)))
+
+    async def _reply(self, connection, data):
+        if self.response_delay:
+            await asyncio.sleep(self.response_delay)
+        await self._send(connection, data)
+
+    async def _start_battle(self, connection, battle_format):
+        room_id = 'battle-{}-{}'.format(utils.to_id(battle_format),
+            next(self._battle_ids))
+        battle = MockBattle(room_id, self.turns)
+        connection['battles'][room_id] = battle
+        self.stats['battles_started'] += 1
+        await self._send(connection, init_frame(room_id, connection['name'],
+            battle_format))
+        await self._next_turn(connection, battle, delay=False)
+
+    async def _next_turn(self, connection, battle, delay=True):
+        if delay and self.response_delay:
+            await asyncio.sleep(self.response_delay)
+        if connection['battles'].get(battle.room_id) is not battle:
+            return
+        battle.turn += 1
+        if battle.turn > battle.turns:
+            connection['battles'].pop(battle.room_id)
+            self.stats['battles_finished'] += 1
+            await self._send(connection, frame(battle.room_id,
+                '|-damage|p2a: Charizard|0 fnt', '|faint|p2a: Charizard',
+                '|', '|win|{}'.format(connection['name'])))
+            return
+        battle.rqid += 1
+        await self._send(connection, request_frame(battle.room_id,
+            connection['name'], battle.rqid))
+        await self._send(connection, turn_frame(battle.room_id, battle.turn))
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in Showdown '
+        'server for offline load testing.')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--turns', type=int, default=5)
+    parser.add_argument('--autostart-battles', type=int, default=0)
+    parser.add_argument('--response-delay', type=float, default=0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    mock = MockServer(args.host, args.port, turns=args.turns,
+        autostart_battles=args.autostart_battles,
+        response_delay=args.response_delay)
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(mock.start())
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.run_until_complete(mock.stop())
+
+if __name__ == '__main__':
+    main()
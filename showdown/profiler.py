@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""Module for the SamplingProfiler class, profiling a running client"""
+import asyncio
+import logging
+import marshal
+import sys
+import threading
+import time
+from collections import Counter
+
+#Logging setup
+logger = logging.getLogger(__name__)
+
+PSTATS_EXTENSIONS = ('.prof', '.pstats')
+
+def _func_key(code):
+    return (code.co_filename, code.co_firstlineno,
+        getattr(code, 'co_qualname', code.co_name))
+
+class SamplingProfiler:
+    """
+    Statistical profiler sampling the stack of the event loop's thread from
+    a separate thread, through sys._current_frames. The loop isn't slowed
+    down by tracing, so it can be used on a client under load.
+
+    Args:
+        loop (:obj:`asyncio.AbstractEventLoop`) : The loop to profile. It
+            should be running in the thread calling SamplingProfiler.start.
+        interval (:obj:`int` or obj:`float`, optional) : Number of seconds
+            between two samples. Defaults to .005.
+        task (:obj:`asyncio.Task`, optional) : If given, only samples taken
+            while this task runs are kept. Ex: the actor of a battle.
+        function (:obj:`str`, optional) : If given, only samples whose stack
+            goes through a function of that name are kept.
+            Ex: 'on_chat_message'
+
+    Notes:
+        The sampling thread needs the GIL to take a sample, so the effective
+        rate is capped by sys.getswitchinterval(), 200 samples per second by
+        default.
+
+    Attributes:
+        samples (:obj:`collections.Counter`) : Number of samples of each
+            stack, as tuples of (filename, line, function), outermost first.
+        stats (:obj:`dict`) : Number of samples taken and kept, and the
+            profiling start and end times.
+    """
+    def __init__(self, loop, interval=.005, task=None, function=None):
+        assert interval > 0, 'interval should be strictly positive'
+        self.loop = loop
+        self.interval = interval
+        self.task = task
+        self.function = function
+        self.samples = Counter()
+        self.stats = {
+            'taken': 0,
+            'kept': 0,
+            'start': None,
+            'end': None
+        }
+        self._thread_id = None
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def __repr__(self):
+        return '<SamplingProfiler {} samples>'.format(self.stats['kept'])
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """
+        Starts sampling the current thread.
+        """
+        assert not self.running, 'The profiler is already running'
+        self._thread_id = threading.get_ident()
+        self._stopped.clear()
+        self.stats['start'] = time.time()
+        self._thread = threading.Thread(target=self._sample_loop,
+            name='showdown-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops sampling and waits for the sampling thread to exit.
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.stats['end'] = time.time()
+
+    def _sample_loop(self):
+        while not self._stopped.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        frame = sys._current_frames().get(self._thread_id, None)
+        if frame is None:
+            return
+        self.stats['taken'] += 1
+        if self.task is not None \
+            and asyncio.current_task(self.loop) is not self.task:
+            return
+        stack = []
+        while frame is not None:
+            stack.append(_func_key(frame.f_code))
+            frame = frame.f_back
+        if self.function is not None \
+            and not any(key[2].split('.')[-1] == self.function
+                for key in stack):
+            return
+        stack.reverse()
+        self.samples[tuple(stack)] += 1
+        self.stats['kept'] += 1
+
+    def collapsed(self):
+        """
+        Returns the samples as collapsed stacks, one 'outer;...;inner count'
+        line per stack, as read by flamegraph.pl and speedscope.
+        """
+        lines = []
+        for stack, count in self.samples.most_common():
+            lines.append('{} {}'.format(';'.join(
+                '{} ({}:{})'.format(func, filename, line)
+                for filename, line, func in stack), count))
+        return '\n'.join(lines) + '\n'
+
+    def pstats_data(self):
+        """
+        Returns the samples as the stats dict of the pstats module. Times are
+        the number of samples times the interval, and call counts are sample
+        counts.
+        """
+        stats = {}
+        def entry(func):
+            if func not in stats:
+                stats[func] = [0, 0, 0.0, 0.0, {}]
+            return stats[func]
+
+        for stack, count in self.samples.items():
+            weight = count * self.interval
+            for func in set(stack):
+                func_stats = entry(func)
+                func_stats[0] += count
+                func_stats[1] += count
+                func_stats[3] += weight
+            entry(stack[-1])[2] += weight
+            for index, (caller, callee) in enumerate(zip(stack, stack[1:])):
+                callers = entry(callee)[4]
+                tt = weight if index == len(stack) - 2 else 0.0
+                cc, nc, caller_tt, ct = callers.get(caller, (0, 0, 0.0, 0.0))
+                callers[caller] = (cc + count, nc + count, caller_tt + tt,
+                    ct + weight)
+        return {func: tuple(func_stats) for func, func_stats in stats.items()}
+
+    def dump(self, path, output_format=None):
+        """
+        Writes the samples to path, as pstats if output_format is 'pstats',
+        or as collapsed stacks if it is 'collapsed'. By default, pstats are
+        written if path ends with .prof or .pstats. pstats files can be read
+        with pstats.Stats(path) or snakeviz.
+        """
+        if output_format is None:
+            output_format = 'pstats' if path.endswith(PSTATS_EXTENSIONS) \
+                else 'collapsed'
+        assert output_format in ('pstats', 'collapsed'), \
+            'output_format should be pstats or collapsed'
+        if output_format == 'pstats':
+            with open(path, 'wb') as f:
+                marshal.dump(self.pstats_data(), f)
+        else:
+            with open(path, 'wt') as f:
+                f.write(self.collapsed())
+        logger.info('Wrote %d samples to %s', self.stats['kept'], path)
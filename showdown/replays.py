@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""Module for the ReplayUploader class, a queue of replays to upload"""
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+
+#Logging setup
+logger = logging.getLogger(__name__)
+
+class ReplayUploader:
+    """
+    Queue of replays waiting to be uploaded through a server's
+    save_replay_async method. Uploads run on a bounded number of worker tasks
+    and failed uploads are retried with exponential backoff. If a directory is
+    given, every queued replay is also written to it until it has been
+    uploaded, so pending uploads survive a restart.
+
+    Args:
+        server (:obj:`showdown.server.Server`) : The server replays are
+            uploaded to.
+        directory (:obj:`str`, optional) : Directory where pending replays are
+            persisted. Defaults to None (replays are only kept in memory).
+        max_concurrency (:obj:`int`, optional) : The number of uploads allowed
+            to run at the same time. Defaults to 2.
+        max_attempts (:obj:`int`, optional) : The number of attempts made for
+            a replay before giving up. Defaults to 5.
+        base_delay (:obj:`int` or obj:`float`, optional) : Delay in seconds
+            before the first retry. Each retry doubles it. Defaults to 1.
+        max_delay (:obj:`int` or obj:`float`, optional) : Maximum delay in
+            seconds between two attempts. Defaults to 60.
+
+    Attributes:
+        stats (:obj:`dict`) : Number of replays submitted, uploaded, retried
+            and abandoned, uploads in flight, and bytes uploaded.
+
+    Notes:
+        Replays abandoned after max_attempts are kept in the directory with a
+        .failed extension.
+    """
+    def __init__(self, server, directory=None, *, max_concurrency=2,
+        max_attempts=5, base_delay=1, max_delay=60):
+        assert max_concurrency > 0, 'max_concurrency should be strictly positive'
+        assert max_attempts > 0, 'max_attempts should be strictly positive'
+        self.server = server
+        self.directory = directory
+        self.max_concurrency = max_concurrency
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stats = {
+            'submitted': 0,
+            'uploaded': 0,
+            'retries': 0,
+            'failed': 0,
+            'in_flight': 0,
+            'bytes': 0
+        }
+        self._queue = asyncio.Queue()
+        self._pending = {}
+        self._workers = []
+        self._started = None
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def __repr__(self):
+        return '<ReplayUploader pending={} in_flight={}>'.format(len(self),
+            self.stats['in_flight'])
+
+    def start(self, client):
+        """
+        Loads the replays persisted in the directory and starts the upload
+        workers as tasks of the specified client. Does nothing if the workers
+        are already running.
+        """
+        if any(not worker.done() for worker in self._workers):
+            return
+        self._started = self._started or time.time()
+        self._load()
+        self._workers = [client.add_task(self._worker(), bounded=False)
+            for _ in range(self.max_concurrency)]
+
+    def stop(self):
+        """
+        Cancels the upload workers. Replays being uploaded go back to the
+        queue.
+        """
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+
+    def submit(self, battle_data):
+        """
+        Queues the replay specified by battle_data, as received in a
+        'savereplay' query response, for upload.
+        """
+        replay_id = battle_data['id']
+        if replay_id in self._pending:
+            return
+        self._pending[replay_id] = [battle_data, 0]
+        self._persist(replay_id, battle_data)
+        self._queue.put_nowait(replay_id)
+        self.stats['submitted'] += 1
+
+    async def join(self):
+        """
+        |coro|
+
+        Waits until every queued replay has been uploaded or abandoned.
+        """
+        while self._pending:
+            await asyncio.sleep(.1)
+
+    def throughput(self):
+        """
+        Returns the number of replays uploaded per second since the uploader
+        was first started.
+        """
+        if self._started is None:
+            return 0.0
+        return self.stats['uploaded'] / max(time.time() - self._started, 1e-9)
+
+    async def _worker(self):
+        while True:
+            replay_id = await self._queue.get()
+            if replay_id not in self._pending:
+                continue
+            battle_data, attempts = self._pending[replay_id]
+            self.stats['in_flight'] += 1
+            try:
+                result = await self.server.save_replay_async(battle_data)
+                if not result.ok:
+                    raise ValueError('Upload rejected with status {}'
+                        .format(result.status))
+            except asyncio.CancelledError:
+                self._queue.put_nowait(replay_id)
+                raise
+            except Exception as err:
+                self._retry(replay_id, attempts + 1, err)
+            else:
+                self._pending.pop(replay_id)
+                self._remove(replay_id)
+                self.stats['uploaded'] += 1
+                self.stats['bytes'] += len(battle_data.get('log', ''))
+            finally:
+                self.stats['in_flight'] -= 1
+
+    def _retry(self, replay_id, attempts, err):
+        if attempts >= self.max_attempts:
+            logger.error('Giving up on replay `{}` after {} attempts: {!r}'
+                .format(replay_id, attempts, err))
+            self._pending.pop(replay_id)
+            self._remove(replay_id, failed=True)
+            self.stats['failed'] += 1
+            return
+        delay = min(self.base_delay * 2 ** (attempts - 1), self.max_delay)
+        logger.warning('Upload of replay `{}` failed ({!r}), retrying in {}s'
+            .format(replay_id, err, delay))
+        self._pending[replay_id][1] = attempts
+        self.stats['retries'] += 1
+        asyncio.get_event_loop().call_later(delay, self._queue.put_nowait,
+            replay_id)
+
+    def _path(self, replay_id):
+        file_name = re.sub(r'[^a-z0-9-]', '', replay_id.lower()) + '.json'
+        return os.path.join(self.directory, file_name)
+
+    def _persist(self, replay_id, battle_data):
+        if self.directory is None:
+            return
+        path = self._path(replay_id)
+        with open(path + '.tmp', 'wt') as f:
+            json.dump(battle_data, f)
+        os.replace(path + '.tmp', path)
+
+    def _remove(self, replay_id, failed=False):
+        if self.directory is None:
+            return
+        path = self._path(replay_id)
+        try:
+            if failed:
+                os.replace(path, path + '.failed')
+            else:
+                os.remove(path)
+        except OSError as err:
+            logger.error('Could not remove the spooled replay %s: %r', path,
+                err)
+
+    def _load(self):
+        if self.directory is None:
+            return
+        for file_name in sorted(os.listdir(self.directory)):
+            if not file_name.endswith('.json'):
+                continue
+            with open(os.path.join(self.directory, file_name), 'rt') as f:
+                battle_data = json.load(f)
+            replay_id = battle_data['id']
+            if replay_id not in self._pending:
+                self._pending[replay_id] = [battle_data, 0]
+                self._queue.put_nowait(replay_id)
+        logger.info('{} replays waiting for upload'.format(len(self)))
@@ -3,14 +3,17 @@
 
 import math
 import time
-from collections import deque
-from . import utils, user
+from . import utils, user, logstore
 import random
 import re
 import asyncio
+import logging
 from .teams import *
 from .logic import *
 
+#Logging setup
+logger = logging.getLogger(__name__)
+
 class Room:
     """
     Class representing a room on showdown. Tracks messages sent into the room,
@@ -27,18 +30,24 @@ class Room:
 
     Attributes:
         id (:obj:`str`) : The room's id.
-        logs (:obj:`collections.deque`) : Queue containing all of the logs
-            associated with the room.
+        logs (:obj:`showdown.logstore.RoomLog`) : Deque-like log containing
+            all of the logs associated with the room. Older logs are kept
+            compressed, and the logs of a client's rooms share its memory cap.
         userlist (:obj:`dict`) : Dictionary with entries of {user_id : User}
             containing all the room's current users.
+        auths (:obj:`dict`) : Dictionary with entries of {user_id : auth}
+            containing the auth group of the room's current users in this
+            room. Ex: {'zarel': '~'}
         client (:obj:`showdown.client.Client`) : The client to be
             used with the Room object's utility functions. Defaults to None.
         title (:obj:`str`) : The room's title. Ex: 'Lobby', 'Monotype'
     """
     def __init__(self, room_id, client=None, max_logs=5000):
         self.id = room_id
-        self.logs = deque(maxlen=max_logs)
+        self.logs = logstore.RoomLog(maxlen=max_logs, room_id=room_id,
+            store=getattr(client, 'log_store', None))
         self.userlist = {}
+        self.auths = {}
         self.client = client
         self.title = None
         self.init_time = time.time()
@@ -59,54 +68,64 @@ class Room:
         """
         Adds content to the Room object's logs attribute. Content is also
         parsed and used to update the Room's state through the update method.
+
+        Args:
+            content (:obj:`str` or :obj:`showdown.utils.ParsedLine`) : The
+                line to add. Lines already parsed by the client are passed
+                as ParsedLine objects so they aren't parsed again.
         """
-        self.logs.append(content)
-        inp_type, params = utils.parse_text_input(content)
-        self.update(inp_type, *params)
+        if not isinstance(content, utils.ParsedLine):
+            content = utils.ParsedLine(content, self.id)
+        self.logs.append(content.text)
+        self.update(content)
 
     def _add_user(self, user_str):
         """
         Adds a user object built from user_str to the Room's roomlist
         """
-        new_user = user.User(user_str, client=self.client)
+        new_user = user.get_user(user_str, client=self.client)
         self.userlist[new_user.id] = new_user
+        self.auths[new_user.id] = user.split_user_str(user_str)[0]
 
     def _remove_user(self, user_id):
         """
         Removes a user object built from user_str from the Room's roomlist
         """
         self.userlist.pop(user_id, None)
+        self.auths.pop(user_id, None)
 
-    def update(self, inp_type, *params):
+    def update(self, line):
         """
-        Updates the Room's state from input. This his method isn't intended to
-        be called directly, but rather through a client's receiver method.
+        Updates the Room's state from a showdown.utils.ParsedLine. This his
+        method isn't intended to be called directly, but rather through a
+        client's receiver method.
         """
+        inp_type = line.inp_type
 
         #Title set
         if inp_type == 'title':
-            self.title = params[0]
+            self.title = line.params[0]
 
         #Userlist init
         if inp_type == 'users':
-            user_strs = params[0].split(',')[1:]
+            user_strs = line.params[0].split(',')[1:]
             for user_str in user_strs:
                 self._add_user(user_str)
 
         #User name change
         elif inp_type == 'n':
-            user_str, old_id = params
+            user_str, old_id = line.params
             self._remove_user(old_id)
             self._add_user(user_str)
 
         #User leave
         elif inp_type == 'l':
-            user_id = utils.name_to_id(params[0])
+            user_id = utils.to_id(line.params[0])
             self._remove_user(user_id)
 
         #User join
         elif inp_type == 'j':
-            user_str = params[0]
+            user_str = line.params[0]
             self._add_user(user_str)
 
     @utils.require_client
@@ -160,10 +179,13 @@ class Battle(Room):
 
     Inherited attributes:
         id (:obj:`str`) : The room's id.
-        logs (:obj:`collections.deque`) : Queue containing all of the logs
-            associated wcurrith the room.
+        logs (:obj:`showdown.logstore.RoomLog`) : Deque-like log containing
+            all of the logs associated with the room.
         userlist (:obj:`dict`) : Dictionary with entries of {user_id : User}
             containing all the room's current users.
+        auths (:obj:`dict`) : Dictionary with entries of {user_id : auth}
+            containing the auth group of the room's current users in this
+            room. Ex: {'zarel': '~'}
         client (:obj:`showdown.client.Client`) : The client to be
             used with the Room object's utility functions. Defaults to None.
         title (:obj:`str`) : The room's title. Ex: 'Zarel vs. Aegisium Z'
@@ -185,8 +207,17 @@ class Battle(Room):
             of the battle. Defaults to None if the match has not ended yet.
         loser_id (:obj:`str`) : String representing the match id of the
             battle's loser. Ex: 'p1', 'p2'
-        ended (:obj:`bool`) : True if a player has won the match, else False
+        ended (:obj:`bool`) : True if a player has won the match or if it
+            ended in a tie, else False
+        mailbox (:obj:`asyncio.Queue`) : Queue of (event_type, frame) tuples
+            waiting to be applied by the battle's actor task.
+        data_resend_interval (:obj:`float`) : Number of seconds the actor
+            waits for missing /data responses before requesting them again.
+        trace (:obj:`showdown.tracing.TurnTrace`) : Trace of the decision in
+            progress, None if no request is waiting for a decision.
     """
+    data_resend_interval = 2.0
+
     def __init__(self, room_id, client=None, max_logs=5000):
         Room.__init__(self, room_id, client=client, max_logs=max_logs)
         self.rules = []
@@ -207,6 +238,16 @@ class Battle(Room):
         self.moves_collection = []
         self.moves_name_collection = []
 
+        # actor state
+        self.mailbox = asyncio.Queue()
+        self._actor = None
+        self._decision_pending = False
+        self._deciding = False
+        self._decision_waiters = []
+        self._decision_token = None
+        self._archived = False
+        self.trace = None
+
     def add_turn(self):
         self.current_turn += 1
 
@@ -238,7 +279,7 @@ class Battle(Room):
                 for smogon_id, normal_move in enumerate(normal_moves):
                     move_informations = normal_move.split(",")
 
-                    name = move_informations[1].split(":")[-1].replace("\\\"","").replace("}","").strip() #
+                    name = utils.to_id(move_informations[1].split(":")[-1])
 
                     if len(move_informations) == 6:
                         current_pp = move_informations[2].split(":")[-1].strip()
@@ -263,7 +304,8 @@ class Battle(Room):
                     player_name = re.split(r":", player_attributes[1])[1].replace("\\\"","").strip()
                     
             if player_name == "p3":
-                print("Erreur lors de la lecture du player : ", socket_input)
+                logger.warning('Could not read the player of request in %s: %s',
+                    self.id, socket_input)
 
             # Team construction
             side = re.findall(r"name.*pokemon.*\[.*}\]", socket_input)[0]
@@ -284,12 +326,11 @@ class Battle(Room):
                 pokemon_moveset = re.findall(r"\[.*?\]", pokemon)[0].split(r",")
 
                 if len(re.findall(r"details.*?,", pokemon)[0].split(r":")) == 2:
-                    name = re.findall(r"details.*?,", pokemon)[0].split(r":")[1].replace("\\\"","").replace(",","").replace("-","").replace(".","").replace(" ","").replace("'","").strip()
+                    name = utils.to_id(re.findall(r"details.*?,", pokemon)[0].split(r":")[1])
                 else:
                     # Type:Null pokemon
                     name_decomposed = re.findall(r"details.*?,", pokemon)[0].split(r":")
-                    name = name_decomposed[1] + name_decomposed[2]
-                    name = name.replace("\\\"","").replace(",","").replace("-","").replace(".","").replace(" ","").replace("'","").strip()
+                    name = utils.to_id(name_decomposed[1] + name_decomposed[2])
                     #name = "TypeNull"
                 level = stats[2].replace("\\\"","").replace("L","").strip()
                 if len(hp_stats) == 2:
@@ -308,13 +349,13 @@ class Battle(Room):
                 spAttack = pokemon_general_stats[2].split(r":")[-1].strip()
                 spDefense = pokemon_general_stats[3].split(r":")[-1].strip()
                 speed = pokemon_general_stats[4].split(r":")[-1].replace("}","").strip()
-                ability = re.findall(r"ability.*?}", pokemon)[0].split(r":")[1].replace("\\\"","").replace("}","").strip()
-                base_ability = re.findall(r"baseAbility.*?,", pokemon)[0].split(r":")[1].replace(",","").replace("\\\"","").replace("}","").strip()
-                item = re.findall(r"item.*?,", pokemon)[0].split(r":")[1].replace("\\\"","").replace("}","").replace(",","").strip()
+                ability = utils.to_id(re.findall(r"ability.*?}", pokemon)[0].split(r":")[1])
+                base_ability = utils.to_id(re.findall(r"baseAbility.*?,", pokemon)[0].split(r":")[1])
+                item = utils.to_id(re.findall(r"item.*?,", pokemon)[0].split(r":")[1])
 
                 pokemon_full_moveset = [None, None, None, None]
                 for move_index,pokemon_move_line in enumerate(pokemon_moveset):
-                    pokemon_full_moveset[move_index] = pokemon_move_line.replace("\\\"","").replace("[","").replace("]","").strip()
+                    pokemon_full_moveset[move_index] = utils.to_id(pokemon_move_line)
 
                 move1 = pokemon_full_moveset[0]
                 move2 = pokemon_full_moveset[1]
@@ -367,20 +408,20 @@ class Battle(Room):
             if force_Switch_needed:
                 await self.make_switch()
 
-        except IndexError as err:
-            print(".................. Erreur : ", err)
-            print("Error in parsing this input : ", socket_input)
+        except IndexError:
+            logger.exception('Failed to parse request in %s: %s', self.id,
+                socket_input)
 
     def update_smogon_data_pokemon(self, socket_input):
         # move name
         pokemon_link = re.findall(r"<a.*href.*?</a>", socket_input)
-        pokemon_name = re.findall(r">.*?<", pokemon_link[-1])[0].replace(">","").replace("<","").replace(" ","").replace(".","").replace("-","").replace("'","").replace("'","").strip().lower()
+        pokemon_name = utils.to_id(re.findall(r">.*?<", pokemon_link[-1])[0])
 
         # types
         pokemon_types_collection = []
         pokemon_types = re.findall(r"alt=\\\".*?\\\"", socket_input)
         for pok_type in pokemon_types:
-            pokemon_type = pok_type.replace("alt=\\\"","").replace("\\\"","").strip().lower()
+            pokemon_type = utils.to_id(pok_type.replace("alt=", ""))
             pokemon_types_collection.append(pokemon_type)
 
         # abilities
@@ -389,7 +430,7 @@ class Battle(Room):
         for pok_ability in pokemon_abilities:
             pokemon_abilities_names = re.findall(r">[a-zA-Z].*?<", pok_ability)
             for pokemon_ability in pokemon_abilities_names:
-                pokemon_ability_name = pokemon_ability.replace(">","").replace("<","").replace(" ","").strip().lower()
+                pokemon_ability_name = utils.to_id(pokemon_ability)
                 pokemon_abilities_collection.append(pokemon_ability_name)
 
         # stats
@@ -426,12 +467,12 @@ class Battle(Room):
     def update_smogon_data_move(self, socket_input):
         # move name
         move_link = re.findall(r"<a.*href.*?</a>", socket_input)
-        move_name = re.findall(r">.*?<", move_link[-1])[0].replace(">","").replace("<","").replace(" ","").replace("-","").strip().lower()
+        move_name = utils.to_id(re.findall(r">.*?<", move_link[-1])[0])
 
         # type and phys/spe
         attributes = re.findall(r"alt=\\\".*?\\\"", socket_input)
-        move_type = attributes[-2].replace("alt=","").replace("\\\"","").strip().lower()
-        move_category = attributes[-1].replace("alt=","").replace("\\\"","").strip().lower()
+        move_type = utils.to_id(attributes[-2].replace("alt=", ""))
+        move_category = utils.to_id(attributes[-1].replace("alt=", ""))
 
         # power and accuracy
         caracteristics = re.findall(r"<br.*?</span>", socket_input)
@@ -466,7 +507,8 @@ class Battle(Room):
         # create opponent team
         if self.opponent_team is None:
             if self.own_team is None:
-                print("IMPOSSIBLE DE CREER LA TEAM ADVERSE")
+                logger.warning('Cannot create the opponent team of %s before '
+                    'receiving a request', self.id)
             else:
                 if self.own_team.get_player() == "p2":
                     opponent_player_name = "p1"
@@ -492,7 +534,7 @@ class Battle(Room):
                 damaged_pokemon_owner = damage_event_pokemon_and_player[0].replace("a","").strip()
                 if damaged_pokemon_owner == self.opponent_team.get_player():
                     damage_event_player = damaged_pokemon_owner
-                    damage_event_pokemon = damage_event_pokemon_and_player[1].replace(" ","").replace(".","").replace("-","").replace("'","").replace(",","").strip().lower()
+                    damage_event_pokemon = utils.to_id(damage_event_pokemon_and_player[1])
                     damage_event_current_hp = damage_event_hp_bar[0].replace("\\n","").replace("fnt","").strip()
                     damage_event_max_hp = 100
                     damage_event_type = "damage"
@@ -511,7 +553,7 @@ class Battle(Room):
                 healed_pokemon_owner = heal_event_pokemon_and_player[0].replace("a","").strip()
                 if healed_pokemon_owner == self.opponent_team.get_player():
                     damage_event_player = healed_pokemon_owner
-                    damage_event_pokemon = heal_event_pokemon_and_player[1].replace(" ","").replace(".","").replace("-","").replace("'","").replace(",","").strip().lower()
+                    damage_event_pokemon = utils.to_id(heal_event_pokemon_and_player[1])
                     damage_event_current_hp = heal_event_hp_bar[0].replace("\\n","").replace("fnt","").strip()
                     damage_event_max_hp = 100
                     damage_event_type = "heal"
@@ -523,8 +565,8 @@ class Battle(Room):
                 boost_event_pokemon_and_player = boost_infos[1].split(r":")
 
                 boost_event_player = boost_event_pokemon_and_player[0].replace("a","").strip()
-                boost_event_pokemon = boost_event_pokemon_and_player[1].strip().lower()
-                boost_event_stat = boost_infos[2].strip().lower()
+                boost_event_pokemon = utils.to_id(boost_event_pokemon_and_player[1])
+                boost_event_stat = utils.to_id(boost_infos[2])
                 boost_event_level = boost_infos[3].replace("\\n","").strip()
                 
                 pokemon_boost = [boost_event_player,
@@ -540,8 +582,8 @@ class Battle(Room):
                 unboost_event_pokemon_and_player = unboost_infos[1].split(r":")
 
                 unboost_event_player = unboost_event_pokemon_and_player[0].replace("a","").strip()
-                unboost_event_pokemon = unboost_event_pokemon_and_player[1].strip().lower()
-                unboost_event_stat = unboost_infos[2].strip().lower()
+                unboost_event_pokemon = utils.to_id(unboost_event_pokemon_and_player[1])
+                unboost_event_stat = utils.to_id(unboost_infos[2])
                 unboost_event_level = unboost_infos[3].replace("\\n","").strip()
 
                 pokemon_unboost = [unboost_event_player,
@@ -556,7 +598,7 @@ class Battle(Room):
                 switch_event_pokemon_and_player = switch_infos[1].split(r":")
 
                 switch_event_player = switch_event_pokemon_and_player[0].replace("a","").strip()
-                switch_event_pokemon = switch_event_pokemon_and_player[1].replace("'","").replace(" ","").replace("-","").replace(",","").replace(".","").strip().lower()
+                switch_event_pokemon = utils.to_id(switch_event_pokemon_and_player[1])
 
                 if switch_event_pokemon == "type":
                     switch_event_pokemon = "typenull"
@@ -634,36 +676,262 @@ class Battle(Room):
                 opponent_active_pokemon = self.opponent_team.get_pokemon(damage_event_pokemon)
                 opponent_active_pokemon.set_current_hp(damage_event_current_hp)
 
+    # # # # #
+    # Actor #
+    # # # # #
+
+    def post(self, socket_input, received_time=None):
+        """
+        Queues the battle events contained in a raw socket frame for the
+        battle's actor. Events are applied in the order they are posted.
+        Requests start the trace of a decision, received_time being the time
+        the frame was read from the websocket.
+        """
+        if "active" in socket_input and "rqid" in socket_input \
+            and "wait" not in socket_input:
+            tracer = getattr(self.client, 'tracer', None)
+            if tracer is not None:
+                self.trace = tracer.begin(self, received_time,
+                    previous=self.trace)
+                self.trace.mark('posted')
+            self.mailbox.put_nowait(('request', socket_input))
+        if "turn|" in socket_input or "|upkeep" in socket_input:
+            self.mailbox.put_nowait(('turn', socket_input))
+        if "|raw|" in socket_input and "pokemonnamecol" in socket_input:
+            self.mailbox.put_nowait(('pokemon_data', socket_input))
+        if "|raw|" in socket_input and "movenamecol" in socket_input:
+            self.mailbox.put_nowait(('move_data', socket_input))
+
+    def start(self):
+        """
+        Starts the battle's actor task on the object's client. Does nothing if
+        the actor is already running.
+        """
+        assert self.client is not None, \
+            'A client is required to start the actor of {}'.format(self.id)
+        if self._actor is None or self._actor.done():
+            self._actor = self.client.add_task(self.run(), bounded=False)
+
+    def stop(self):
+        """
+        Cancels the battle's actor task. Pending calls to make_decision are
+        cancelled as well, and the decision in progress isn't traced.
+        """
+        if self._actor is not None:
+            self._actor.cancel()
+            self._actor = None
+        for waiter in self._decision_waiters:
+            waiter.cancel()
+        self._decision_waiters = []
+        self._decision_pending = False
+        self._deciding = False
+        self._decision_token = None
+        self.trace = None
+
+    async def idle(self):
+        """
+        |coro|
+
+        Waits until the actor has applied every event posted so far and made
+        the decision they led to. A decision that still misses /data
+        responses doesn't count, as it waits for the next frames.
+        """
+        await self.mailbox.join()
+        while self._deciding or (self._decision_pending
+            and self._actor is not None and self._data_status()[0]):
+            await asyncio.sleep(0)
+            await self.mailbox.join()
+
+    async def run(self):
+        """
+        |coro|
+
+        Body of the battle's actor. Applies the events of the mailbox one at a
+        time and runs the decision policy once the mailbox has been drained
+        and every /data response needed by the policy has been received.
+        Missing /data responses are requested again every
+        data_resend_interval seconds.
+        """
+        while True:
+            # asyncio.wait_for can swallow the cancellation of the actor when
+            # an event arrives at the same time, leaving a stopped actor
+            # running. asyncio.wait never does.
+            getter = asyncio.ensure_future(self.mailbox.get())
+            try:
+                await asyncio.wait((getter,),
+                    timeout=self.data_resend_interval)
+            finally:
+                if not getter.done():
+                    getter.cancel()
+            if getter.cancelled():
+                if self._decision_pending:
+                    await self._resend_missing_data()
+                continue
+            event_type, socket_input = getter.result()
+            start = time.perf_counter()
+            try:
+                await self._apply(event_type, socket_input)
+            except Exception:
+                logger.exception('Failed to apply `{}` event in {}'
+                    .format(event_type, self.id))
+            finally:
+                self.client.record_stage(event_type,
+                    time.perf_counter() - start)
+                self.mailbox.task_done()
+            if self._decision_pending and self.mailbox.empty():
+                await self._try_decide()
+
+    async def _apply(self, event_type, socket_input):
+        if event_type == 'request':
+            self._mark('applying')
+            await self.update_own_team(socket_input)
+            self._mark('applied')
+            if self._decision_token is not None:
+                # A forced switch was sent while applying the request
+                self._finish_trace()
+        elif event_type == 'turn':
+            new_turn = "turn|" in socket_input
+            if new_turn:
+                self.add_turn()
+            await self.update_turn(socket_input)
+            if new_turn and self.own_team is not None:
+                self._decision_pending = True
+        elif event_type == 'pokemon_data':
+            self.update_smogon_data_pokemon(socket_input)
+        elif event_type == 'move_data':
+            self.update_smogon_data_move(socket_input)
+        elif event_type == 'decide':
+            self._decision_pending = True
+
+    def _data_status(self):
+        """
+        Checks if the /data responses needed by the decision policy have all
+        been applied.
+
+        Returns:
+            (bool, list) : True if the data is complete, else False, and the
+                names of the moves and pokemons that should be requested again.
+        """
+        if self.own_team is None or self.opponent_team is None:
+            return False, []
+        received_moves = [move.get_name() for move in self.moves_collection]
+        missing_moves = [move_name for move_name in self.moves_name_collection
+            if move_name not in received_moves]
+        if missing_moves:
+            return False, missing_moves
+        own_updated, own_missing = self.own_team.check_smogon_data_update()
+        opponent_updated, opponent_missing = \
+            self.opponent_team.check_smogon_data_update()
+        return own_updated and opponent_updated, own_missing + opponent_missing
+
+    async def _resend_missing_data(self):
+        _, data_commands_names_to_resend = self._data_status()
+        for data_command_name in data_commands_names_to_resend:
+            logger.info('Resending /data %s in %s', data_command_name,
+                self.id)
+            await self.get_M_or_P_data(data_command_name)
+
+    def _mark(self, name):
+        if self.trace is not None:
+            self.trace.mark(name)
+
+    def _finish_trace(self):
+        trace, self.trace = self.trace, None
+        token, self._decision_token = self._decision_token, None
+        tracer = getattr(self.client, 'tracer', None)
+        if trace is not None and tracer is not None:
+            tracer.finish(trace, self, token)
+
+    async def _try_decide(self):
+        data_is_complete, _ = self._data_status()
+        if not data_is_complete:
+            return
+        self._decision_pending = False
+        self._deciding = True
+        self._mark('ready')
+        waiters, self._decision_waiters = self._decision_waiters, []
+        try:
+            async with self.client.decision_semaphore:
+                self._mark('acquired')
+                start = time.perf_counter()
+                try:
+                    await self.select_best_decision()
+                finally:
+                    self.client.record_stage('policy',
+                        time.perf_counter() - start)
+                    self._mark('decided')
+            self._finish_trace()
+        except Exception as err:
+            logger.exception('Decision policy failed in {}'.format(self.id))
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_exception(err)
+        else:
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+        finally:
+            self._deciding = False
+
+
+    def add_content(self, content):
+        """
+        Adds content to the Battle object's logs attribute and updates the
+        Battle's state. Content is also written to the client's archive, if
+        it has one, and the archived log is finished once the battle ends.
+        """
+        Room.add_content(self, content)
+        archive = getattr(self.client, 'archive', None)
+        if archive is None or self._archived:
+            return
+        archive.append(self.id, str(content))
+        if self.ended:
+            self.archive()
+
+    def archive(self):
+        """
+        Writes the battle's log to the client's archive. Lines received
+        afterwards aren't archived.
+        """
+        archive = getattr(self.client, 'archive', None)
+        if archive is not None and not self._archived:
+            self._archived = True
+            archive.finish(self)
+
     def print_own_team(self):
         if self.own_team is not None:
             self.own_team.self_print()
 
-    def update(self, inp_type, *params): #TODO: Fix this up
+    def update(self, line): #TODO: Fix this up
         """
-        Updates the Room's state from input. This his method isn't intended to
-        be called directly, but rather through a client's receiver method.
+        Updates the Room's state from a showdown.utils.ParsedLine. This his
+        method isn't intended to be called directly, but rather through a
+        client's receiver method.
         """
-        Room.update(self, inp_type, *params)
+        Room.update(self, line)
+        inp_type = line.inp_type
         if inp_type == 'player':
-            player_id, name = params[0], params[1]
+            player_id, name = line.params[0], line.params[1]
             if not name or player_id not in ('p1', 'p2'):
                 return
-            setattr(self, player_id, user.User(name, client=self.client))
+            setattr(self, player_id, user.get_user(name, client=self.client))
         elif inp_type == 'rated':
             self.rated = True
         elif inp_type == 'tier':
-            self.tier = utils.name_to_id(params[0])
+            self.tier = utils.to_id(line.params[0])
         elif inp_type == 'rule':
-            self.rules.append(params[0])
+            self.rules.append(line.params[0])
         elif inp_type == 'win':
-            winner_name = params[0]
-            if self.p1.name_matches(winner_name):
+            winner_name = line.params[0]
+            if self.p1 is not None and self.p1.name_matches(winner_name):
                 self.winner, self.winner_id = self.p1, 'p1'
                 self.loser, self.loser_id = self.p2, 'p2'
-            elif self.p2.name_matches(winner_name):
+            elif self.p2 is not None and self.p2.name_matches(winner_name):
                 self.winner, self.winner_id = self.p2, 'p2'
                 self.loser, self.loser_id = self.p1, 'p1'
             self.ended = True
+        elif inp_type == 'tie':
+            self.ended = True
 
     @utils.require_client
     async def save_replay(self, client=None, delay=0, lifespan=math.inf):
@@ -721,10 +989,12 @@ class Battle(Room):
 
         Uses the specified client or the object's client to switch into a
         different pokemon. The client must be one of the players in the battle 
-        for this to work.
+        for this to work. Returns the OutputToken of the command, which can be
+        awaited with OutputToken.wait() to know when it has been sent.
         """
-        await self.client.use_command(self.id, 'switch', '{}'.format(switch_id),
-            delay=delay, lifespan=lifespan)
+        self._decision_token = await self.client.use_command(self.id,
+            'switch', '{}'.format(switch_id), delay=delay, lifespan=lifespan)
+        return self._decision_token
 
     @utils.require_client
     async def move(self, move_id, turn_num, mega=False, client=None,
@@ -732,13 +1002,15 @@ class Battle(Room):
         """
         |coro|
 
-        Uses the specified client or the object's client attribute to turn on
-        the battle timer. The client must be one of the players in the battle 
-        for this to work.
+        Uses the specified client or the object's client attribute to use the
+        move specified by move_id. The client must be one of the players in the
+        battle for this to work. Returns the OutputToken of the command, which
+        can be awaited with OutputToken.wait() to know when it has been sent.
         """
-        await self.client.use_command(self.id, 'choose', 'move {}'
-            .format(move_id),
-            delay=delay, lifespan=lifespan)
+        self._decision_token = await self.client.use_command(self.id,
+            'choose', 'move {}'.format(move_id), delay=delay,
+            lifespan=lifespan)
+        return self._decision_token
 
     @utils.require_client
     async def get_M_or_P_data(self, move_name, mega=False, client=None,
@@ -758,68 +1030,18 @@ class Battle(Room):
     async def make_decision(self, client=None,
         delay=0, lifespan=math.inf):
         """
-        Selects a random move among the moves that can be executed.
-        """
-
-        # size tracking variables that helps resending the data if some has not been updated
-        old_moves_name_collection_size = -1
-        old_moves_collection_size = -1
-
-        # Wait for the data to be updated
-        smogon_data_has_not_been_updated = True
-        while smogon_data_has_not_been_updated:
-
-            current_moves_name_collection_size = len(self.moves_name_collection)
-            current_moves_collection_size = len(self.moves_collection)
-            # resend data command
-            if current_moves_name_collection_size != current_moves_collection_size:
-                if old_moves_name_collection_size == current_moves_name_collection_size:
-                    if old_moves_collection_size == current_moves_collection_size:
-                        # This part checks all moves present in the collection and then sends data for
-                        # each move that should be in it but is not (move information has not been received)
-                        print("Check for data to request (resend) : ", 
-                                current_moves_collection_size, " / ",
-                                current_moves_name_collection_size)
-                        # get the missing moves names
-                        current_moves_real_collection_names = []
-                        for collection_move in self.moves_collection:
-                            current_moves_real_collection_names.append(collection_move.get_name())
-
-                        # resend the command data to smogon
-                        for move_name in self.moves_name_collection:
-                            if move_name not in current_moves_real_collection_names:
-                                print("Resending (first check) : ", move_name)
-                                await self.get_M_or_P_data(move_name)
-
-                old_moves_name_collection_size = current_moves_name_collection_size
-                old_moves_collection_size = current_moves_collection_size
-
-            # check if the data has been updated
-            if  current_moves_collection_size == current_moves_name_collection_size:
-
-                data_commands_names_to_resend = []
-                # smogon_data_has_not_been_updated becomes false once all the data has been correctly updated in all pokemons
-                smogon_update, data_commands_names_to_resend1 = self.own_team.check_smogon_data_update()
-                smogon_update2, data_commands_names_to_resend2 = self.opponent_team.check_smogon_data_update()
-                
-                if smogon_update and smogon_update2:
-                    # TODO mettre le check sur la team adverse
-                    smogon_data_has_not_been_updated = False
-                else:
-                    for data_command in data_commands_names_to_resend1:
-                        data_commands_names_to_resend.append(data_command)
-                    for data_command in data_commands_names_to_resend2:
-                        data_commands_names_to_resend.append(data_command)
-
-                # resend data commands if need be
-                if smogon_data_has_not_been_updated:
-                    for data_command_name in data_commands_names_to_resend:
-                        print("Resending (second check) : ", data_command_name)
-                        await self.get_M_or_P_data(data_command_name)
-
-            await asyncio.sleep(2)
+        |coro|
 
-        await self.select_best_decision()
+        Asks the battle's actor to run the decision policy, and waits until
+        the decision has been made. The actor waits for the /data responses
+        the policy needs before deciding. Decisions are already made
+        automatically at the start of each turn, so this is only needed to
+        force one.
+        """
+        waiter = asyncio.get_event_loop().create_future()
+        self._decision_waiters.append(waiter)
+        self.mailbox.put_nowait(('decide', None))
+        await waiter
 
     # fonction qui renvoie le meilleur switch ou move à effectuer
     @utils.require_client
@@ -842,7 +1064,7 @@ class Battle(Room):
             active_pokemon_speed_tie_won = determince_speed_tie(pokemon1, pokemon2)
             active_pokemon_tanking_threat = assert_opponent_pokemon_threat(pokemon1, pokemon2)
         else:
-            print("Erreur : un des pokemons est None")
+            logger.warning('Missing an active pokemon in %s', self.id)
 
         active_pokemon_move_selected_should_be_used = False
         if active_pokemon_max_dmg >= 100 and active_pokemon_speed_tie_won:
@@ -882,7 +1104,7 @@ class Battle(Room):
                 await self.switch(switch_pokemon.get_name(),1)
                 return
 
-        print("Choosing Default Move")
+        logger.debug('Choosing a default move in %s', self.id)
         possible_default_moves=pokemon1.get_possible_moves()
         for default_move in possible_default_moves:
             if default_move.has_power():
@@ -890,7 +1112,7 @@ class Battle(Room):
                 default_command_to_send = default_move.get_name()
                 await self.move(default_command_to_send,1)
                 return
-        print("Declaring a default switch")
+        logger.debug('Declaring a default switch in %s', self.id)
         await self.make_switch()
         return
 
@@ -2,11 +2,13 @@
 """Module for Server objects"""
 import random
 import string
-import requests
 import traceback
 import logging
 import json
+import asyncio
+from collections import namedtuple
 from . import utils
+from .httpclient import HTTPClient
 from functools import wraps
 
 #Logging setup
@@ -15,23 +17,31 @@ logger = logging.getLogger(__name__)
 #Base URLs
 SERVER_INFO_URL_BASE = 'https://pokemonshowdown.com/servers/{server_id}.json'
 ACTION_URL_BASE =  'https://play.pokemonshowdown.com/~~{server_id}/action.php'
+USER_DATA_URL_BASE = 'https://pokemonshowdown.com/users/{user_id}.json'
+LADDER_URL_BASE = 'https://pokemonshowdown.com/ladder/{format_id}.json'
 WEBSOCKET_URL_BASE = 'ws://{server_hostname}/showdown/{num_triplet}/{char_octet}/websocket'
 
 REPLAY_HEADERS = {
     'content-type': 'application/x-www-form-urlencoded; charset=UTF-8'
 }
 
-def get_host(server_id):
+#Item yielded by the Server.iter_* bulk methods. Exactly one of value and
+#error is None.
+BulkResult = namedtuple('BulkResult', ['key', 'value', 'error'])
+
+async def get_host(server_id, http):
     """
-    Requests a server's host name from showdown.
+    |coro|
+
+    Requests a server's host name from showdown through the HTTPClient http.
     
     Example:
-        >>> get_host('showdown')
+        >>> await get_host('showdown', http)
         'sim2.psim.us:8000'
     """
     info_url = SERVER_INFO_URL_BASE.format(server_id=server_id)
     logger.info('Requesting server host from {}'.format(info_url))
-    response = requests.get(info_url)
+    response = await http.get(info_url)
     if not response.ok:
         raise ValueError('Info for server `{}` is unavailable.'
             .format(server_id))
@@ -74,37 +84,37 @@ def generate_action_url(server_id):
     """
     return ACTION_URL_BASE.format(server_id = server_id)
 
-def require_session(func):
+def require_http(func):
     """
-    Decorator that requires the server to have a valid aiohttp session.
+    Decorator that requires the server to have an HTTPClient.
     """
     @wraps(func)
     async def wrapper(self, *args, **kwargs):
-        session = kwargs.get('session', None) or getattr(self, 'session', None) 
-        if session is None:
+        http = kwargs.get('http', None) or getattr(self, 'http', None)
+        if http is None:
             raise Exception(\
-                "You can't use {0}.{1} without setting an aiohttp ClientSession. "
-                "This can be done with {0}.set_session method. You can also "
-                "use the keyword argument {0}.{1}(session=your_session)."
+                "You can't use {0}.{1} without setting an HTTPClient. "
+                "This can be done with the {0}.set_http or {0}.set_session "
+                "methods. You can also use the keyword argument "
+                "{0}.{1}(http=your_http_client)."
                 .format(self.__class__.__name__, func.__name__))
         else:
-            kwargs['session'] = session
+            kwargs['http'] = http
             return await func(self, *args, **kwargs)
     return wrapper
 
 class Server:
     """
     Class representing a showdown server that can be connected to. Various HTTP
-    interactions can be made through objects. Such methods require a valid
-    aiohttp session (set through Server.set_session) asynchronously, otherwise
-    synchronous options are provided as well.
+    interactions can be made through objects. Such methods are asynchronous and
+    require an HTTPClient (set through Server.set_http or Server.set_session).
 
     Params:
         id (:obj:`str`, optional) : The server's id. 
             Ex: 'showdown', 'smogtours', 'azure'
             Defaults to 'showdown'
         host (:obj:`str`, optional) : The server's host. If not specified, 
-            the object will automatically determine this by calling get_host
+            the object will determine it when Server.resolve_host is awaited.
         client (:obj:`showdown.client.Client`, optional) : client object 
             connected to this server.
 
@@ -112,19 +122,22 @@ class Server:
         id (:obj:`str`, optional) : The server's id. 
             Ex: 'showdown', 'smogtours', 'azure'
             Defaults to 'showdown'
-        host (:obj:`str`, optional) : The server's host. If not specified, 
-            the object will automatically determine this by calling get_host
+        host (:obj:`str` or None) : The server's host. None until it has been
+            specified or resolved.
         client (:obj:`showdown.client.Client`, optional) : client object 
             connected to this server.
         action_url (:obj:`str`, optional) : The server's action url
-        session (:obj:`aiohttp.ClientSession`) : Asynchronous http session
-            used for querying data through post requests.
+        http (:obj:`showdown.httpclient.HTTPClient`) : Asynchronous http
+            facade used for querying data.
+        session (:obj:`aiohttp.ClientSession`) : The session behind the http
+            attribute.
     """
     def __init__(self, id='showdown', host=None, client=None):
         self.id = id
-        self.host = host or get_host(self.id)
+        self.host = host
         self.client = client
         self.action_url = generate_action_url(self.id)
+        self.http = None
         self.session = None
 
     def __repr__(self):
@@ -132,16 +145,42 @@ class Server:
             self.id,
             self.host)
 
+    def set_http(self, http):
+        """
+        Sets the server's http attribute, and its session attribute to the
+        HTTPClient's session.
+        """
+        self.http = http
+        self.session = http.session
+
     def set_session(self, session):
         """
-        Sets the server's session attribute.
+        Sets the server's session attribute, and wraps it in a new HTTPClient
+        set as the http attribute.
+        """
+        self.set_http(HTTPClient(session))
+
+    @require_http
+    async def resolve_host(self, http=None):
+        """
+        |coro|
+
+        Requests the server's host name from showdown if it hasn't been
+        specified yet.
+
+        Returns:
+            str : The server's host.
         """
-        self.session = session
+        if self.host is None:
+            self.host = await get_host(self.id, http)
+        return self.host
 
     def generate_ws_url(self):
         """
         Returns a valid websocket URI for this server.
         """
+        assert self.host is not None, \
+            'The host of {} has not been resolved yet'.format(self)
         return generate_ws_url(self.host)
 
     @utils.require_client
@@ -155,63 +194,31 @@ class Server:
         """
         await self.client.request_rooms()
 
-    @require_session
-    async def save_replay_async(self, battle_data, session=None):
+    @require_http
+    async def save_replay_async(self, battle_data, http=None):
         """
         |coro|
 
         Makes an asynchronous post request to upload the replay specified by 
-        battle_data. Use save_replay to do so synchronously.
-        """
-        battle_data['act'] = 'uploadreplay'
-        if self.id != 'showdown':
-            battle_data['id'] = '{}-{}'.format(self.id, battle_data['id'])
-        async with self.session.post(self.action_url, data=battle_data, 
-            headers=REPLAY_HEADERS) as result:
-            logger.info('^^^ Saved replay for `{}`, outcome: {}'.format(
-                    battle_data['id'], await result.text()))
-            return result
-
-    def save_replay(self, battle_data):
-        """
-        Makes an synchronous post request to upload the replay specified by 
-        battle_data. Use save_replay_async to do so asynchronously.
+        battle_data.
         """
-        battle_data['act'] = 'uploadreplay'
+        battle_data = dict(battle_data, act='uploadreplay')
         if self.id != 'showdown':
             battle_data['id'] = '{}-{}'.format(self.id, battle_data['id'])
-        result = requests.post(self.action_url, data=battle_data,
+        result = await http.post(self.action_url, data=battle_data,
             headers=REPLAY_HEADERS)
         logger.info('^^^ Saved replay for `{}`, outcome: {}'.format(
                 battle_data['id'], result.text))
         return result
 
-    @require_session
+    @require_http
     async def login_async(self, name, password, challstr, challengekeyid,
-        session=None):
+        http=None):
         """
         |coro|
 
         Makes an asynchronous post request to obtain login data for the user
-        specified by the method's parameters. Use login to do so 
-        asynchronously.
-        """
-        data = {
-            'act': 'login',
-            'name': name,
-            'pass': password,
-            'challenge': challstr,
-            'challengekeyid': challengekeyid
-        }
-        async with self.session.post(self.action_url, data=data) as result:
-            return utils.parse_http_input(await result.text())
-
-
-    def login(self, name, password, challstr, challengekeyid):
-        """
-        Makes an synchronous post request to obtain login data for the user
-        specified by the method's parameters. Use login_async to do so
-        synchronously.
+        specified by the method's parameters.
         """
         data = {
             'act': 'login',
@@ -220,15 +227,17 @@ class Server:
             'challenge': challstr,
             'challengekeyid': challengekeyid
         }
-        result = requests.post(self.action_url, data=data)
+        result = await http.post(self.action_url, data=data)
         return utils.parse_http_input(result.text)
 
-    @require_session
-    async def get_ladder_async(self, user_id, session=None):
+    @require_http
+    async def get_ladder_async(self, user_id, http=None):
         """
         |coro|
+
         Gets the ratings for the user specified by user_id on this
-        server. Includes more detailed information than User.get_rating
+        server. Includes more detailed information than User.get_ratings.
+        Results are cached in the client's ladder_cache.
 
         Returns:
             :obj:`list` : A list of dicts representing a user's ratings
@@ -251,44 +260,145 @@ class Server:
                       'username': 'Argus2Spooky',
                       'w': '618'}]
         """
-        data = {
-            'act' : 'ladderget',
-            'user' : user_id
-        }
-        async with self.session.post(self.action_url, data=data) as result:
-            return utils.parse_http_input(await result.text())
+        async def fetch():
+            data = {
+                'act' : 'ladderget',
+                'user' : user_id
+            }
+            result = await http.post(self.action_url, data=data)
+            return utils.parse_http_input(result.text)
+        return await self._cached('ladder_cache', (self.id, user_id), fetch)
 
-    def get_ladder(self, user_id):
+    @require_http
+    async def get_user_data_async(self, user_id, http=None):
         """
-        Gets the user's ratings on the server for the specified server.
-        Includes more detailed information than User.get_ratings
-
-        Examples:
-            from pprint import pprint
-            >>> pprint(Server().get_ladder('argus2spooky'))
-            [{'col1': '1033',
-              'elo': '1736.1765984494',
-              'entryid': '15753610',
-              'formatid': 'gen7monotype',
-              'gxe': '80.7',
-              'l': '415',
-              'r': '1769.8943143527',
-              'rd': '25',
-              'rpr': '1769.8943143527',
-              'rprd': '25.876418629631',
-              'rpsigma': '0',
-              'rptime': '1547456400',
-              'sigma': '0',
-              't': '0',
-              'userid': 'argus2spooky',
-              'username': 'Argus2Spooky',
-              'w': '618'}]
+        |coro|
+
+        Gets the public profile of the user specified by user_id from the main
+        showdown server. Results are cached in the client's user_data_cache.
+
+        Returns:
+            :obj:`dict` : The user's profile.
+                Ex: {'username': 'Zarel', 'userid': 'zarel',
+                     'registertime': 1304640000, 'group': 2,
+                     'ratings': {'gen2ou': {...}, ...}}
+
+        Raises:
+            ValueError : Raised when the profile is unavailable.
         """
-        params = {
-            'act' : 'ladderget',
-            'user' : user_id
-        }
-        result = requests.get(self.action_url, params=params).text
-        return utils.parse_http_input(result)
+        async def fetch():
+            response = await http.get(
+                USER_DATA_URL_BASE.format(user_id=user_id))
+            if not response.ok:
+                raise ValueError('Data for user `{}` is unavailable.'
+                    .format(user_id))
+            return response.json()
+        return await self._cached('user_data_cache', user_id, fetch)
+
+    @require_http
+    async def get_format_ladder_async(self, battle_format, http=None):
+        """
+        |coro|
+
+        Gets the top of the ladder of the specified battle_format on the main
+        showdown server. Results are cached in the client's ladder_cache.
+
+        Returns:
+            :obj:`dict` : The format's ladder.
+                Ex: {'formatid': 'gen7ou', 'format': '[Gen 7] OU',
+                     'toplist': [{'userid': 'argus2spooky', 'elo': 1736.1, 
+                                  'gxe': 80.7, ...}, ...]}
+
+        Raises:
+            ValueError : Raised when the ladder is unavailable.
+        """
+        format_id = utils.to_id(battle_format)
+        async def fetch():
+            response = await http.get(
+                LADDER_URL_BASE.format(format_id=format_id))
+            if not response.ok:
+                raise ValueError('Ladder for format `{}` is unavailable.'
+                    .format(format_id))
+            return response.json()
+        return await self._cached('ladder_cache', ('format', format_id),
+            fetch)
+
+    async def iter_ladders(self, user_ids, max_concurrency=16):
+        """
+        Gets the ratings of many users on this server concurrently. See
+        Server.get_ladder_async.
 
-            
\ No newline at end of file
+        Args:
+            user_ids (iterable of obj:`str`) : The ids or names of the users.
+            max_concurrency (:obj:`int`, optional) : The maximum number of
+                lookups in progress at the same time. Defaults to 16.
+
+        Yields:
+            BulkResult : A (user_id, ladder, error) tuple for each user, in the
+                order the lookups complete. A failed lookup has a ladder of
+                None and the raised exception as error.
+
+        Example:
+            async for user_id, ladder, error in server.iter_ladders(ids):
+                if error is None:
+                    ratings[user_id] = ladder
+        """
+        user_ids = map(utils.to_id, user_ids)
+        async for result in _fan_out(user_ids, self.get_ladder_async,
+            max_concurrency):
+            yield result
+
+    async def iter_user_data(self, user_ids, max_concurrency=16):
+        """
+        Gets the profiles of many users concurrently. Works like
+        Server.iter_ladders, with the results of Server.get_user_data_async.
+        """
+        user_ids = map(utils.to_id, user_ids)
+        async for result in _fan_out(user_ids, self.get_user_data_async,
+            max_concurrency):
+            yield result
+
+    async def iter_format_ladders(self, battle_formats, max_concurrency=16):
+        """
+        Gets the ladders of many battle formats concurrently. Works like
+        Server.iter_ladders, with the results of
+        Server.get_format_ladder_async keyed by format id.
+        """
+        format_ids = map(utils.to_id, battle_formats)
+        async for result in _fan_out(format_ids, self.get_format_ladder_async,
+            max_concurrency):
+            yield result
+
+    async def _cached(self, cache_name, key, fetch):
+        """
+        Looks key up in the client's cache named cache_name, awaiting fetch()
+        on a miss. Fetches directly when the server has no client.
+        """
+        cache = getattr(self.client, cache_name, None)
+        if cache is None:
+            return await fetch()
+        return await cache.get_or_fetch(key, fetch)
+
+async def _fan_out(keys, fetch, max_concurrency):
+    """
+    Awaits fetch(key) for each distinct key with at most max_concurrency
+    calls in progress, and yields a BulkResult for each key as soon as its
+    call completes. Remaining calls are cancelled if the consumer stops
+    iterating early.
+    """
+    assert max_concurrency > 0, 'max_concurrency should be strictly positive'
+    semaphore = asyncio.Semaphore(max_concurrency)
+    async def run(key):
+        async with semaphore:
+            try:
+                return BulkResult(key, await fetch(key), None)
+            except Exception as err:
+                logger.debug('Bulk lookup of `%s` failed: %r', key, err)
+                return BulkResult(key, None, err)
+    tasks = [asyncio.ensure_future(run(key)) for key in dict.fromkeys(keys)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
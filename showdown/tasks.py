@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""Module for the TaskSet class used to manage a client's asyncio tasks"""
+import asyncio
+import logging
+
+#Logging setup
+logger = logging.getLogger(__name__)
+
+class TaskSet:
+    """
+    Class keeping track of running asyncio tasks. Tasks are forgotten as soon
+    as they are done, so the set only ever holds live tasks, and exceptions
+    raised by tasks are logged instead of being silently dropped.
+
+    Args:
+        loop (optional) : The event loop the tasks are scheduled on. Defaults
+            to the current event loop.
+        max_concurrency (:obj:`int`, optional) : The maximum number of bounded
+            tasks allowed to run at the same time. Bounded tasks scheduled past
+            that limit wait for a running one to finish. Defaults to None
+            (no limit).
+        on_error (:obj:`callable`, optional) : Called with (task, exception)
+            whenever a task raises an exception.
+        stop_exceptions (:obj:`tuple`, optional) : Exception types that end
+            a task normally, such as the websocket being closed. Tasks
+            raising them are counted as finished and aren't reported as
+            failed. Defaults to ().
+
+    Attributes:
+        stats (:obj:`dict`) : Number of tasks started, finished, failed and
+            cancelled since the set was created.
+    """
+    def __init__(self, loop=None, max_concurrency=None, on_error=None,
+        stop_exceptions=()):
+        assert max_concurrency is None or max_concurrency > 0, \
+            'max_concurrency should be None or strictly positive'
+        self.loop = loop
+        self.max_concurrency = max_concurrency
+        self.on_error = on_error
+        self.stop_exceptions = tuple(stop_exceptions)
+        self.stats = {
+            'started': 0,
+            'finished': 0,
+            'failed': 0,
+            'cancelled': 0
+        }
+        self._tasks = set()
+        self._waiting = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency) \
+            if max_concurrency else None
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def __iter__(self):
+        return iter(list(self._tasks))
+
+    def __repr__(self):
+        return '<TaskSet live={} waiting={}>'.format(len(self), self._waiting)
+
+    def add(self, coro, bounded=True):
+        """
+        Schedules coro as a task and adds it to the set.
+
+        Args:
+            coro (coroutine) : The coroutine to schedule.
+            bounded (:obj:`bool`, optional) : Whether the task counts towards
+                max_concurrency. Long running tasks (interval tasks, battle
+                actors) should not be bounded. Defaults to True.
+
+        Returns:
+            asyncio.Task : The scheduled task.
+        """
+        inner = coro
+        if bounded and self._semaphore is not None:
+            coro = self._bounded(inner)
+        task = asyncio.ensure_future(coro, loop=self.loop)
+        self._tasks.add(task)
+        self.stats['started'] += 1
+        task.add_done_callback(self._reap)
+        if coro is not inner:
+            # Close the wrapped coroutine if the task is cancelled before
+            # it gets a slot, so it isn't reported as never awaited
+            task.add_done_callback(lambda _: inner.close())
+        return task
+
+    async def _bounded(self, coro):
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+        try:
+            return await coro
+        finally:
+            self._semaphore.release()
+
+    def _reap(self, task):
+        self._tasks.discard(task)
+        if task.cancelled():
+            self.stats['cancelled'] += 1
+            return
+        exc = task.exception()
+        if exc is None:
+            self.stats['finished'] += 1
+            return
+        if isinstance(exc, self.stop_exceptions):
+            self.stats['finished'] += 1
+            logger.info('Task %s stopped: %r', task.get_name(), exc)
+            return
+        self.stats['failed'] += 1
+        logger.error('Task %s raised an exception', task,
+            exc_info=(type(exc), exc, exc.__traceback__))
+        if self.on_error is not None:
+            self.on_error(task, exc)
+
+    def cancel_all(self):
+        """
+        Cancels every task in the set.
+
+        Returns:
+            int : The number of tasks that were cancelled.
+        """
+        cancelled = 0
+        for task in list(self._tasks):
+            if not task.done():
+                task.cancel()
+                cancelled += 1
+                logger.info('Cancelled: %s', task)
+        return cancelled
+
+    def counts(self):
+        """
+        Returns a dict with the number of live tasks, the number of bounded
+        tasks waiting for a free slot, and the values of the stats attribute.
+        """
+        counts = {'live': len(self._tasks), 'waiting': self._waiting}
+        counts.update(self.stats)
+        return counts
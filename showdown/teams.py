@@ -1,4 +1,9 @@
+import logging
 from enum import Enum
+from . import ids
+
+#Logging setup
+logger = logging.getLogger(__name__)
 
 class Team:
     """
@@ -23,13 +28,15 @@ class Team:
             pokemon.make_inactive()
 
     def make_pokemon_active(self, pokemon_name):
+        species_num = ids.SPECIES.get(pokemon_name)
         for pokemon in self.pokemons:
-            if pokemon.has_name(pokemon_name):
+            if species_num is not None and pokemon.species_num == species_num:
                 pokemon.make_active()
 
     def get_pokemon(self, pokemon_name):
+        species_num = ids.SPECIES.get(pokemon_name)
         for pokemon in self.pokemons:
-            if pokemon.has_name(pokemon_name):
+            if species_num is not None and pokemon.species_num == species_num:
                 return pokemon
 
     def add_pokemon(self, pokemon):
@@ -84,7 +91,7 @@ class Team:
                     return False, moves_or_pok_to_resend
             else:
                 return False, []
-        print("The team was correctly updated : ", self.player)
+        logger.debug('Team of %s has all its /data', self.player)
         return True, []
 
     def update_moves_with_smogon(self, smogon_move):
@@ -94,7 +101,7 @@ class Team:
     def update_pokemons_with_smogon(self, smogon_pokemon):
         for pokemon in self.pokemons:
             if smogon_pokemon.has_name(pokemon.get_name()):
-                print("Updating this pokemon : ", pokemon.get_name())
+                logger.debug('Updating %s with its /data', pokemon.get_name())
                 types_collection = smogon_pokemon.get_types()
                 abilities_collection = smogon_pokemon.get_abilities_collection()
                 base_hp = smogon_pokemon.get_base_hp()
@@ -136,6 +143,7 @@ class Pokemon:
                         active):
         # Name
         self.name = name
+        self.species_num = ids.SPECIES.num(name)
 
         # Id of smogon
         if smogon_id is not None:
@@ -168,9 +176,11 @@ class Pokemon:
 
         # item
         self.item = item
+        self.item_num = ids.ITEMS.num(item)
 
         # ability
         self.ability = ability
+        self.ability_num = ids.ABILITIES.num(ability)
         self.base_ability = base_ability
         self.abilities_collection = []
 
@@ -183,6 +193,7 @@ class Pokemon:
 
         # type
         self.types_collection = []
+        self.type_nums = ()
 
         # boolean to check if the smogon data has been retrieved and used
         self.smogon_data_has_been_retrieved = False
@@ -205,6 +216,8 @@ class Pokemon:
                             base_special_defense,
                             base_speed):
         self.types_collection = types_collection
+        self.type_nums = tuple(ids.TYPES.num(pokemon_type)
+            for pokemon_type in types_collection)
         self.abilities_collection = abilities_collection
         self.base_hp = base_hp
         self.base_attack = base_attack
@@ -243,30 +256,32 @@ class Pokemon:
         self.complete_moves = moves
 
     def has_name(self, pokemon_name):
-        if self.name.lower() == pokemon_name.lower():
-            return True
-        else:
-            return False
+        species_num = ids.SPECIES.get(pokemon_name)
+        return species_num is not None and self.species_num == species_num
 
     def make_active(self):
-        print("Pokemon ", self.name, " is now active")
+        logger.debug('%s is now active', self.name)
         self.active = True
 
     def make_inactive(self):
-        print("Pokemon ", self.name, " is now inactive")
+        logger.debug('%s is now inactive', self.name)
         self.active = False
 
     def is_active(self):
         return self.active
 
     def get_name(self):
-        if self.name == "EiscueNoice":
-            self.name = "Eiscue"
+        if self.name == "eiscuenoice":
+            self.name = "eiscue"
+            self.species_num = ids.SPECIES.num(self.name)
         return self.name
 
     def get_types(self):
         return self.types_collection
 
+    def get_type_nums(self):
+        return self.type_nums
+
     def get_abilities_collection(self):
         return self.abilities_collection
 
@@ -295,8 +310,9 @@ class Pokemon:
         return self.base_speed
 
     def get_move(self, move_name):
+        move_num = ids.MOVES.get(move_name)
         for move in self.complete_moves:
-            if move.has_name(move_name):
+            if move_num is not None and move.num == move_num:
                 return move
         return None
 
@@ -342,7 +358,7 @@ class Pokemon:
     def has_been_updated_with_smogon(self):
         # check that the pokemon moves have been loaded
         if len(self.complete_moves) != len(self.moves_names):
-            print("Moveset not yet fully loaded (", self.name,")")
+            logger.debug('Moveset of %s not fully loaded yet', self.name)
             # get the moves that have not been updated correctly to send the data commands
 
             # moves the current pokemon actually knows
@@ -361,12 +377,12 @@ class Pokemon:
         for move in self.complete_moves:
             if move is not None:
                 if move is not None and not move.has_been_updated_with_smogon():
-                    print("Move has not been updated : ", move.get_name())
+                    logger.debug('Move %s has no /data yet', move.get_name())
                     return False, [move.get_name()]
         
         # check if the pokemon has been updated
         if not self.smogon_data_has_been_retrieved:
-            print("Pokemon has not been updated : ", self.name)
+            logger.debug('%s has no /data yet', self.name)
             return False, [self.name]
         return True, []
 
@@ -403,7 +419,8 @@ class Pokemon:
                     else:
                         # pokemon active just fainted or used uturn
                         # or is using outrage (other moves have not been loaded)
-                        print("UPDATING A MOVE NONE : ", move_name)
+                        logger.debug('Adding missing move %s to active %s',
+                            move_name, self.name)
                         pok_is_using_trapping_move = True
 
                         # TODO Temporary fix
@@ -465,6 +482,7 @@ class Move:
                         current_pp = None,
                         max_pp = None):
         self.name = name
+        self.num = ids.MOVES.num(name)
 
         # this id specifies the place of the pokemon in the team
         self.smogon_id = smogon_id
@@ -477,6 +495,7 @@ class Move:
 
         # Information below will be updated when the data is retrieved from smogon
         self.types = None
+        self.type_num = None
         self.power = None
         self.accuracy = None
         self.description = None
@@ -487,6 +506,7 @@ class Move:
 
     def update_smogon_data(self, move_type, category, power, accuracy, description):
         self.types = move_type
+        self.type_num = ids.TYPES.num(move_type)
         self.power = power
         self.accuracy = accuracy
         self.description = description
@@ -500,10 +520,8 @@ class Move:
             return False
 
     def has_name(self, move_name):
-        if self.name == move_name:
-            return True
-        else:
-            return False
+        move_num = ids.MOVES.get(move_name)
+        return move_num is not None and self.num == move_num
 
     def has_power(self):
         if self.power is not None:
@@ -519,6 +537,9 @@ class Move:
     def get_move_type(self):
         return self.types
 
+    def get_move_type_num(self):
+        return self.type_num
+
     def get_category(self):
         return self.category
 
@@ -541,43 +562,47 @@ class Move:
         print("    power - ", self.power," / accuracy - ", self.accuracy)
 
 class Side_Buffs:
+    """
+    Stat stages of a side, stored in a list indexed by the stat ids of
+    showdown.ids.STATS (atk, def, spa, spd, spe). Other stats are ignored.
+    """
+    __slots__ = ('stages',)
+
     def __init__(self):
-        self.attack = 0
-        self.defense = 0
-        self.special_attack = 0
-        self.special_defense = 0
-        self.speed = 0
+        self.stages = [0] * len(ids.STATS)
 
     def raise_stat(self, stat_name, levels):
-        if stat_name == "atk":
-            self.attack += int(levels)
-        if stat_name == "def":
-            self.defense += int(levels)
-        if stat_name == "spa":
-            self.special_attack += int(levels)
-        if stat_name == "spd":
-            self.special_defense += int(levels)
-        if stat_name == "spe":
-            self.speed += int(levels)
+        stat_num = ids.STATS.num(stat_name)
+        if stat_num is not None:
+            self.stages[stat_num] += int(levels)
 
     def lower_stat(self, stat_name, levels):
-        if stat_name == "atk":
-            self.attack -= int(levels)
-        if stat_name == "def":
-            self.defense -= int(levels)
-        if stat_name == "spa":
-            self.special_attack -= int(levels)
-        if stat_name == "spd":
-            self.special_defense -= int(levels)
-        if stat_name == "spe":
-            self.speed -= int(levels)
+        stat_num = ids.STATS.num(stat_name)
+        if stat_num is not None:
+            self.stages[stat_num] -= int(levels)
 
     def reset(self):
-        self.attack = 0
-        self.defense = 0
-        self.special_attack = 0
-        self.special_defense = 0
-        self.speed = 0
+        self.stages = [0] * len(ids.STATS)
+
+    @property
+    def attack(self):
+        return self.stages[0]
+
+    @property
+    def defense(self):
+        return self.stages[1]
+
+    @property
+    def special_attack(self):
+        return self.stages[2]
+
+    @property
+    def special_defense(self):
+        return self.stages[3]
+
+    @property
+    def speed(self):
+        return self.stages[4]
     
     def self_print(self):
         print("\natk : ", self.attack)
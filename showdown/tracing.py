@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""Module for the Tracer class, recording the latency of battle decisions"""
+import json
+import logging
+import math
+import time
+from collections import deque
+
+#Logging setup
+logger = logging.getLogger(__name__)
+
+#Stages of a decision, as (name, start mark, end mark). Marks are set by
+#the client and the battle's actor:
+#   received : the |request| frame was read from the websocket
+#   posted : the frame was parsed and posted to the battle's mailbox
+#   applying, applied : the actor started and finished applying the request
+#   ready : the turn started and every /data response needed was applied
+#   acquired : the actor acquired the client's decision_semaphore
+#   decided : the decision policy returned
+#   queued, sent : the decision entered the output queue and was sent
+STAGES = (
+    ('ingest', 'received', 'posted'),
+    ('mailbox', 'posted', 'applying'),
+    ('apply', 'applying', 'applied'),
+    ('data_wait', 'applied', 'ready'),
+    ('semaphore', 'ready', 'acquired'),
+    ('policy', 'acquired', 'decided'),
+    ('output_queue', 'queued', 'sent'),
+    ('total', 'received', 'sent'),
+)
+
+class TurnTrace:
+    """
+    Timestamps of the decision of one battle turn, from the arrival of the
+    |request| frame to the moment the decision is sent.
+
+    Attributes:
+        room_id (:obj:`str`) : The id of the battle.
+        format (:obj:`str`) : The battle's format. Ex: 'gen8randombattle'
+        turn (:obj:`int`) : The turn the decision was made for.
+        marks (:obj:`dict`) : Times of the marks reached, as returned by
+            time.time().
+        discarded (:obj:`bool`) : True if the decision was discarded from
+            the output queue instead of being sent.
+    """
+    __slots__ = ('room_id', 'format', 'turn', 'marks', 'discarded')
+
+    def __init__(self, room_id, battle_format=None, received=None):
+        self.room_id = room_id
+        self.format = battle_format
+        self.turn = None
+        self.marks = {'received': received or time.time()}
+        self.discarded = False
+
+    def __repr__(self):
+        return '<TurnTrace `{}` turn {}>'.format(self.room_id, self.turn)
+
+    def mark(self, name):
+        """
+        Records the current time for the mark specified by name.
+        """
+        self.marks[name] = time.time()
+
+    def spans(self):
+        """
+        Returns a dict of {stage : seconds} for the stages whose marks were
+        both reached.
+        """
+        marks = self.marks
+        return {stage: marks[end] - marks[start]
+            for stage, start, end in STAGES
+            if start in marks and end in marks}
+
+    def to_dict(self):
+        return {
+            'room_id': self.room_id,
+            'format': self.format,
+            'turn': self.turn,
+            'discarded': self.discarded,
+            'marks': dict(self.marks),
+            'spans': self.spans()
+        }
+
+def percentile(values, p):
+    """
+    Returns the p-th percentile of a sorted list of values, using the nearest
+    rank method.
+    """
+    if not values:
+        return None
+    rank = max(math.ceil(p * len(values) / 100) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+class Tracer:
+    """
+    Ring buffer of the traces of the last decisions made by a client's
+    battles. Battles start a trace when a |request| frame is posted to their
+    actor, and finish it once the decision it led to has been sent.
+
+    Args:
+        maxlen (:obj:`int`, optional) : The number of finished traces kept.
+            Defaults to 1000.
+
+    Attributes:
+        traces (:obj:`collections.deque`) : The finished traces, oldest
+            first.
+        stats (:obj:`dict`) : Number of traces started, finished, and dropped
+            because a new request arrived before a decision was made.
+    """
+    def __init__(self, maxlen=1000):
+        assert maxlen > 0, 'maxlen should be strictly positive'
+        self.traces = deque(maxlen=maxlen)
+        self.stats = {
+            'started': 0,
+            'finished': 0,
+            'dropped': 0
+        }
+
+    def __len__(self):
+        return len(self.traces)
+
+    def __repr__(self):
+        return '<Tracer {}/{} traces>'.format(len(self), self.traces.maxlen)
+
+    def begin(self, battle, received=None, previous=None):
+        """
+        Returns a new trace for the decision of battle. previous is the trace
+        the battle had in progress, if any, and is counted as dropped.
+
+        Args:
+            battle (:obj:`showdown.room.Battle`) : The battle deciding.
+            received (:obj:`float`, optional) : The time the |request| frame
+                was received. Defaults to now.
+            previous (:obj:`showdown.tracing.TurnTrace`, optional) : The
+                unfinished trace the new one replaces.
+        """
+        if previous is not None:
+            self.stats['dropped'] += 1
+        self.stats['started'] += 1
+        return TurnTrace(battle.id, battle.tier, received)
+
+    def finish(self, trace, battle, token=None):
+        """
+        Adds trace to the buffer once token, the OutputToken of the decision,
+        has been sent or discarded. Without a token, the trace is added right
+        away.
+        """
+        trace.turn = battle.current_turn
+        trace.format = battle.tier or trace.format
+        if token is None:
+            self._add(trace)
+            return
+        trace.marks['queued'] = token.created
+
+        def on_resolved(future):
+            if future.cancelled() or not future.result():
+                trace.discarded = True
+            if token.resolved is not None:
+                trace.marks['sent'] = token.resolved
+            self._add(trace)
+        token.future.add_done_callback(on_resolved)
+
+    def _add(self, trace):
+        self.traces.append(trace)
+        self.stats['finished'] += 1
+
+    def export(self):
+        """
+        Returns the buffered traces as a list of dicts, oldest first.
+        """
+        return [trace.to_dict() for trace in self.traces]
+
+    def dump(self, path):
+        """
+        Writes the buffered traces to path as JSON lines.
+        """
+        with open(path, 'wt') as f:
+            for trace in self.traces:
+                f.write(json.dumps(trace.to_dict()) + '\n')
+
+    def summary(self, percentiles=(50, 90, 99)):
+        """
+        Returns the latency percentiles of each stage, per battle format.
+
+        Returns:
+            dict : {format : {stage : {'count', 'max', 'p50', ...}}} with
+                latencies in seconds.
+        """
+        spans = {}
+        for trace in self.traces:
+            by_stage = spans.setdefault(trace.format, {})
+            for stage, seconds in trace.spans().items():
+                by_stage.setdefault(stage, []).append(seconds)
+        summary = {}
+        for battle_format, by_stage in spans.items():
+            summary[battle_format] = {}
+            for stage, values in by_stage.items():
+                values.sort()
+                stats = {'count': len(values), 'max': values[-1]}
+                for p in percentiles:
+                    stats['p{}'.format(p)] = percentile(values, p)
+                summary[battle_format][stage] = stats
+        return summary
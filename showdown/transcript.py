@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""Module for recording a client's websocket traffic and replaying it
+
+A transcript is a JSON lines file (gzip compressed if its name ends with
+.gz). Each line is a [timestamp, direction, data] list, where direction is
+'in' for frames received from the server and 'out' for messages sent by
+the client.
+"""
+import asyncio
+import gzip
+import json
+import logging
+import time
+from . import room, utils
+
+#Logging setup
+logger = logging.getLogger(__name__)
+
+#Messages counted as decisions by replay
+DECISION_COMMANDS = ('|/choose ', '|/move ', '|/switch ')
+
+def _open(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't')
+    return open(path, mode + 't')
+
+def read_transcript(path):
+    """
+    Iterates over the (timestamp, direction, data) entries of the transcript
+    at path. A compressed transcript whose recorder wasn't closed is read up
+    to its last complete entry.
+    """
+    with _open(path, 'r') as f:
+        try:
+            for line in f:
+                if line.endswith('\n'):
+                    timestamp, direction, data = json.loads(line)
+                    yield timestamp, direction, data
+        except EOFError:
+            logger.warning('Transcript `{}` is truncated'.format(path))
+
+def count_decisions(messages):
+    """
+    Returns the number of decisions among messages sent by a client.
+    """
+    return sum(1 for message in messages
+        for command in json.loads(message)
+        if any(name in command for name in DECISION_COMMANDS))
+
+def recorded_decisions(path):
+    """
+    Returns the number of decisions sent in the transcript at path.
+    """
+    return count_decisions(data for _, direction, data
+        in read_transcript(path) if direction == 'out')
+
+class TranscriptRecorder:
+    """
+    Writes every frame received and every message sent by a client to a
+    transcript file. Used by Client when it is created with a
+    transcript_path.
+
+    Args:
+        path (:obj:`str`) : The path of the transcript. The file is
+            compressed if path ends with .gz, and appended to if it exists.
+            It is opened on the first record after the recorder is created
+            or closed, so a client can keep recording across reconnections.
+
+    Attributes:
+        stats (:obj:`dict`) : Number of frames recorded in each direction.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.stats = {
+            'in': 0,
+            'out': 0
+        }
+        self._file = None
+
+    def __repr__(self):
+        return '<TranscriptRecorder `{}`>'.format(self.path)
+
+    def record(self, direction, data):
+        """
+        Appends data to the transcript with the current time.
+
+        Args:
+            direction (:obj:`str`) : 'in' or 'out'.
+            data (:obj:`str`) : The frame or message.
+        """
+        if self._file is None:
+            self._file = _open(self.path, 'a')
+        self._file.write(json.dumps([time.time(), direction, data]) + '\n')
+        self.stats[direction] += 1
+
+    def close(self):
+        """
+        Closes the transcript file. Compressed transcripts are only complete
+        once closed.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+class ReplaySocket:
+    """
+    Stand-in for a client's websocket that returns the received frames of a
+    transcript and keeps the messages sent to it.
+
+    Args:
+        path (:obj:`str`) : The path of the transcript.
+        realtime (:obj:`bool`, optional) : If True, frames are returned with
+            the delays they were recorded with, divided by speed. Otherwise
+            they are returned as fast as they are read. Defaults to False.
+        speed (:obj:`int` or obj:`float`, optional) : Speed factor of real
+            time replays. Defaults to 1.
+        client (:obj:`showdown.client.Client`, optional) : The client the
+            frames are returned to. If given, frames replayed as fast as
+            possible are returned once the client has processed the previous
+            frame, and its battles have applied it and made the decisions it
+            led to. Otherwise, the frames of several turns can be applied
+            before the battles' actors run their policy, merging the
+            decisions of these turns. Defaults to None.
+
+    Attributes:
+        sent (:obj:`list`) : The messages sent to the socket.
+        frames (:obj:`int`) : The number of frames returned so far.
+        finished (:obj:`asyncio.Event`) : Set once every frame has been
+            returned.
+    """
+    def __init__(self, path, realtime=False, speed=1, client=None):
+        self.path = path
+        self.realtime = realtime
+        self.speed = speed
+        self.client = client
+        self.sent = []
+        self.frames = 0
+        self.finished = asyncio.Event()
+        self._frames = ((timestamp, data) for timestamp, direction, data
+            in read_transcript(path) if direction == 'in')
+        self._first = None
+        self._start = None
+        self._previous = None
+
+    async def recv(self):
+        for timestamp, data in self._frames:
+            if not self.realtime and self.client is not None \
+                and self._previous is not None:
+                await self._wait_idle(self._previous)
+            self._previous = data
+            self.frames += 1
+            if self.realtime:
+                if self._first is None:
+                    self._first, self._start = timestamp, time.time()
+                delay = ((timestamp - self._first) / self.speed
+                    - (time.time() - self._start))
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            return data
+        self.finished.set()
+        # The transcript is over, wait until the replay is stopped
+        await asyncio.get_event_loop().create_future()
+
+    async def _wait_idle(self, data):
+        """
+        Waits for the client to process the frame data, and for the battles
+        it concerns to apply it and make the decisions it led to.
+        """
+        client = self.client
+        await client.input_queue.join()
+        if not data.startswith('a'):
+            # The 'o' frame opening the connection
+            return
+        for room_id in set(room_id for room_id, _
+            in utils.parse_socket_input(data)):
+            battle = client.rooms.get(room_id, None)
+            if isinstance(battle, room.Battle):
+                await battle.idle()
+
+    async def send(self, data):
+        self.sent.append(data)
+
+    async def close(self):
+        pass
+
+async def replay(client, path, realtime=False, speed=1, settle_timeout=5):
+    """
+    |coro|
+
+    Feeds the frames received in a transcript to client, through its usual
+    reader, receiver and sender tasks but without a connection. The client
+    doesn't log in, and its messages are kept instead of being sent.
+
+    Args:
+        client (:obj:`showdown.client.Client`) : The client to replay the
+            transcript with. It should not be connected.
+        path (:obj:`str`) : The path of the transcript.
+        realtime (:obj:`bool`, optional) : If True, frames are replayed with
+            their recorded delays, otherwise as fast as possible. Fast
+            replays feed each frame once the battles are done with the
+            previous one, so they make the decisions that were recorded.
+            Defaults to False.
+        speed (:obj:`int` or obj:`float`, optional) : Speed factor of real
+            time replays. Defaults to 1.
+        settle_timeout (:obj:`int` or obj:`float`, optional) : Maximum number
+            of seconds waited for battles to finish their decisions after the
+            last frame has been processed. Defaults to 5.
+
+    Returns:
+        dict : The number of frames replayed and decisions made, the
+            elapsed time, the frames and decisions per second, and the
+            client's stage_stats.
+    """
+    client.autologin = False
+    client.detect_hooks()
+    socket = client.websocket = ReplaySocket(path, realtime=realtime,
+        speed=speed, client=client)
+    start = time.perf_counter()
+    runner = asyncio.ensure_future(client._run_interval_tasks())
+    try:
+        await socket.finished.wait()
+        await client.input_queue.join()
+        deadline = time.perf_counter() + settle_timeout
+        while time.perf_counter() < deadline and any(
+            not battle.mailbox.empty() or battle._decision_pending
+            for battle in client.rooms.values() if hasattr(battle, 'mailbox')):
+            await asyncio.sleep(.01)
+        while not client.output_queue.empty():
+            await asyncio.sleep(.01)
+        elapsed = time.perf_counter() - start
+    finally:
+        # Cancelling the client's tasks stops the runner
+        client._on_disconnect()
+        await runner
+
+    decisions = count_decisions(socket.sent)
+    return {
+        'frames': socket.frames,
+        'decisions': decisions,
+        'elapsed': elapsed,
+        'frames_per_sec': socket.frames / elapsed if elapsed else 0.0,
+        'decisions_per_sec': decisions / elapsed if elapsed else 0.0,
+        'stages': {stage: dict(stats)
+            for stage, stats in client.stage_stats.items()}
+    }
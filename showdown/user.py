@@ -2,12 +2,38 @@
 """Module for showdown's User class"""
 import json
 import re
-import requests
 import string
 import math
+import weakref
 from . import utils, server
 
-USER_DATA_URL_BASE = 'https://pokemonshowdown.com/users/{user_id}.json'
+USER_DATA_URL_BASE = server.USER_DATA_URL_BASE
+
+def split_user_str(user_str):
+    """
+    Splits a user string into the user's auth group and name.
+
+    Examples:
+        >>> split_user_str('~Zarel')
+        ('~', 'Zarel')
+        >>> split_user_str('Script Kitty')
+        (' ', 'Script Kitty')
+    """
+    if not user_str:
+        return ' ', ''
+    elif user_str[0].lower() not in string.ascii_lowercase:
+        return user_str[0], user_str[1:]
+    return ' ', user_str
+
+def get_user(user_str, client=None):
+    """
+    Returns the User object for user_str. If client has a user registry, the
+    User shared through it is returned, otherwise a new User is built.
+    """
+    registry = getattr(client, 'users', None)
+    if registry is None:
+        return User(user_str, client=client)
+    return registry.get(user_str)
 
 class User:
     '''
@@ -31,16 +57,10 @@ class User:
         client (obj:`showdown.client.Client` or None) : client used in the
             object's utility methods
     '''
+    __slots__ = ('auth', 'name', 'id', 'client', '_user_data', '__weakref__')
+
     def __init__(self, user_str, client=None):
-        if not user_str:
-            self.auth = ' '
-            name = ''
-        elif user_str[0].lower() not in string.ascii_lowercase:
-            self.auth = user_str[0]
-            name = user_str[1:]
-        else:
-            self.auth = ' '
-            name = user_str
+        self.auth, name = split_user_str(user_str)
         self.set_name(name)
         self.client = client
         self._user_data = None
@@ -69,7 +89,7 @@ class User:
                 name and id
         """
         self.name = name
-        self.id = utils.name_to_id(name)
+        self.id = utils.to_id(name)
 
     def name_matches(self, name):
         """
@@ -89,7 +109,7 @@ class User:
            >>> User("~Zarel ^_^").name_matches('Carl'))
            False
         """
-        return self.id == utils.name_to_id(name)
+        return self.id == utils.to_id(name)
 
     @utils.require_client
     async def challenge(self, team, tier, client=None):
@@ -181,25 +201,30 @@ class User:
         await self.client.add_output('|/cmd userdetails {}'.format(self.id),
             delay=delay, lifespan=lifespan)
 
-    def _get_user_data(self, force_update=False):
-        if not force_update and self._user_data is not None:
-            return
-        response = requests.get(USER_DATA_URL_BASE.format(user_id = self.id))
-        if response.ok:
-            self._user_data = response.json()
+    @utils.require_client
+    async def _get_user_data(self, force_update=False, client=None):
+        if force_update:
+            cache = getattr(client, 'user_data_cache', None)
+            if cache is not None:
+                cache.invalidate(self.id)
+        self._user_data = await client.server.get_user_data_async(self.id)
 
-    def get_ratings(self):
+    @utils.require_client
+    async def get_ratings(self, client=None):
         """
+        |coro|
+
         Gets the user's ratings (rank) on the main showdown server. Use
         User.get_ladder to find their ratings on other servers or for
-        win loss ratios.
+        win loss ratios. Ratings are cached by the client for
+        Client.user_data_cache.ttl seconds.
 
         Returns:
             dict representing the user's ratings
 
         Examples:
             >>> from pprint import pprint
-            >>> pprint(User('zarel').get_ratings())
+            >>> pprint(await User('zarel', client=client).get_ratings())
             {'gen2ou': {'elo': '1000',
                         'gxe': '47.6',
                         'rpr': '1480.9917808997',
@@ -209,11 +234,14 @@ class User:
                     'rpr': '1459.8393856612',
                     'rprd': '122.8583080769'}}
         """
-        self._get_user_data(force_update=True)
+        await self._get_user_data(client=client)
         return self._user_data['ratings']
 
-    def get_register_time(self):
+    @utils.require_client
+    async def get_register_time(self, client=None):
         """
+        |coro|
+
         Gets the time the user's account was registered.
 
         Returns:
@@ -221,35 +249,40 @@ class User:
             registration time
 
         Examples:
-            >>> User('zarel').get_register_time()
+            >>> await User('zarel', client=client).get_register_time()
             1304640
         """
-        self._get_user_data()
+        await self._get_user_data(client=client)
         return self._user_data['registertime'] // 1000
 
-    def get_register_name(self):
+    @utils.require_client
+    async def get_register_name(self, client=None):
         """
+        |coro|
+
         Gets the name with which the user's account was registered.
 
         Returns:
             A string representing the account's registration name
 
         Examples:
-            >>> showdown.User('crashy').get_register_name()
+            >>> await showdown.User('crashy', client=client).get_register_name()
             'Crashy ★ - '
         """
-        self._get_user_data()
+        await self._get_user_data(client=client)
         return self._user_data['username']
 
-
-    def get_ladder(self, server_id=None):
+    @utils.require_client
+    async def get_ladder(self, server_id=None, client=None):
         """
+        |coro|
+
         Gets the user's ratings on the server for the specified server.
         Includes more detailed information that User.get_ratings
 
         Examples:
             from pprint import pprint
-            >>> pprint(User('argus2spooky').get_ladder())
+            >>> pprint(await User('argus2spooky', client=client).get_ladder())
             [{'col1': '1033',
               'elo': '1736.1765984494',
               'entryid': '15753610',
@@ -268,18 +301,84 @@ class User:
               'username': 'Argus2Spooky',
               'w': '618'}]
         """
-        params = {
-            'act' : 'ladderget',
-            'user' : self.id
+        ladder_server = client.server
+        if server_id is not None and server_id != ladder_server.id:
+            ladder_server = server.Server(id=server_id, client=client)
+            ladder_server.set_http(client.server.http)
+        return await ladder_server.get_ladder_async(self.id)
+
+    get_ladder_async = get_ladder
+
+class UserRegistry:
+    """
+    Client-scoped registry of User objects. Looking up a user string returns
+    the User already registered for its id, with its name updated in place,
+    so a user seen in many messages and rooms is a single object sharing its
+    cached profile data. Users are only kept alive by the rooms, messages and
+    battles referencing them.
+
+    Args:
+        client (:obj:`showdown.client.Client`, optional) : The client given
+            to the User objects built by the registry. Defaults to None.
+
+    Attributes:
+        stats (:obj:`dict`) : Number of lookups answered by an existing User
+            and number of Users built.
+
+    Notes:
+        Auth groups are room-scoped, so the Users of a registry have no auth
+        group. Rooms keep the auth group of their users in Room.auths, and
+        messages the auth group of their author.
+    """
+    def __init__(self, client=None):
+        self.client = client
+        self.stats = {
+            'hits': 0,
+            'created': 0
         }
-        if server_id is None:
-            if self.client:
-                server_id = self.client.server.id
-            else:
-                server_id = 'showdown'
-        result = requests.get(server.ACTION_URL_BASE.format(server_id=server_id), 
-            params=params).text
-        return utils.parse_http_input(result)
-
-    async def get_ladder_async(self, server_id='showdown'):
-        raise NotImplementedError
\ No newline at end of file
+        self._users = weakref.WeakValueDictionary()
+
+    def __len__(self):
+        return len(self._users)
+
+    def __contains__(self, user_id):
+        return user_id in self._users
+
+    def __getitem__(self, user_id):
+        return self._users[user_id]
+
+    def __repr__(self):
+        return '<UserRegistry {} users>'.format(len(self))
+
+    def get(self, user_str):
+        """
+        Returns the User registered for user_str, building and registering it
+        if there is none.
+
+        Args:
+            user_str (obj:`str`) : The user's name, optionally prefixed by
+                their auth group. Ex: "~Zarel", "Script Kitty"
+
+        Returns:
+            showdown.user.User : The registered User.
+        """
+        _, name = split_user_str(user_str)
+        user_id = utils.to_id(name)
+        user = self._users.get(user_id, None)
+        if user is None:
+            user = User(name, client=self.client)
+            self._users[user_id] = user
+            self.stats['created'] += 1
+            return user
+        self.stats['hits'] += 1
+        if user.name != name:
+            user.name = name
+        return user
+
+    def hit_rate(self):
+        """
+        Returns the fraction of lookups answered by an existing User, between
+        0 and 1.
+        """
+        total = self.stats['hits'] + self.stats['created']
+        return self.stats['hits'] / total if total else 0.0
@@ -2,14 +2,18 @@
 """Miscellaneous utils for the showdown module"""
 import json
 import re
+import sys
 import random
 import string
 import inspect
 import warnings
 import datetime
-import traceback
+import logging
 import inspect
-from functools import wraps
+from functools import wraps, lru_cache
+
+#Logging setup
+logger = logging.getLogger(__name__)
 
 def require_client(func): 
     """
@@ -106,32 +110,107 @@ def abbreviate(content):
     content_length = len(content)
     return content[:20].rstrip() + ('...' if content_length > 20 else '')
 
-def name_to_id(input_str):
+_NON_ID_CHARACTERS = re.compile(r'(\W|_)')
+
+@lru_cache(maxsize=8192)
+def to_id(input_str):
     """
     Removes all non-letter or number characters from input_str, and lowercases.
+    This is the canonical id used for users, formats, species, moves, types,
+    abilities and items. Results are memoized and interned, so equal ids are
+    the same string object.
 
     Example:
-        >>> name_to_id('Zarel ^_^')
+        >>> to_id('Zarel ^_^')
         'zarel'
+        >>> to_id('King\'s Shield')
+        'kingsshield'
     """
-    return re.sub(r'(\W|_)', '', input_str.lower())
+    return sys.intern(_NON_ID_CHARACTERS.sub('', input_str.lower()))
+
+#Public alias of to_id, kept for code using the name of earlier versions
+name_to_id = to_id
 
 #Parsing
+class ParsedLine:
+    """
+    A line of text input received over the client's websocket connection,
+    parsed on demand. The input type is only split off the line when it is
+    first needed, and the params only when they are first needed, so lines
+    nobody looks into are never split. The parsed line is shared by the
+    client, the room the line belongs to and the hooks.
+
+    Args:
+        text (:obj:`str`) : The line of text input. Ex: '|c|~Zarel|Hi'
+        room_id (:obj:`str`, optional) : The id of the room the line was
+            received in. Defaults to ''.
+
+    Attributes:
+        text (:obj:`str`) : The line of text input.
+        room_id (:obj:`str`) : The id of the room the line was received in.
+        inp_type (:obj:`str`) : The lowercased input type. Ex: 'c'. Lines
+            without a '|' have the input type 'rawtext'.
+        params (:obj:`list`) : The fields following the input type.
+            Ex: ['~Zarel', 'Hi']. Shared between every user of the line, so
+            it should not be mutated.
+    """
+    __slots__ = ('text', 'room_id', '_inp_type', '_params', '_rest')
+
+    def __init__(self, text, room_id=''):
+        self.text = text
+        self.room_id = room_id
+        self._inp_type = None
+        self._params = None
+        self._rest = None
+
+    def __repr__(self):
+        return '<ParsedLine `{}`>'.format(abbreviate(self.text))
+
+    def __str__(self):
+        return self.text
+
+    def __iter__(self):
+        yield self.inp_type
+        yield self.params
+
+    def _split_type(self):
+        text = self.text.strip()
+        start = text.find('|')
+        if start < 0:
+            self._inp_type, self._params = 'rawtext', [text]
+            return
+        end = text.find('|', start + 1)
+        if end < 0:
+            self._inp_type, self._params = text[start + 1:].lower(), []
+        else:
+            self._inp_type, self._rest = text[start + 1:end].lower(), \
+                text[end + 1:]
+
+    @property
+    def inp_type(self):
+        if self._inp_type is None:
+            self._split_type()
+        return self._inp_type
+
+    @property
+    def params(self):
+        if self._params is None:
+            if self._inp_type is None:
+                self._split_type()
+            if self._params is None:
+                self._params = self._rest.split('|')
+                self._rest = None
+        return self._params
+
 def parse_text_input(text_input):
     """
     Parses the text input received over the client's websocket connection.
+    See ParsedLine to only parse what is needed.
 
     Returns:
         (input_type (str), params (list))
     """
-    tokens = text_input.strip().split('|')
-    if len(tokens) == 1:
-        inp_type = 'rawtext'
-        params = tokens
-    else:
-        inp_type = tokens[1].lower()
-        params = tokens[2:]
-    return inp_type, params
+    return tuple(ParsedLine(text_input))
 
 def parse_http_input(http_input):
     """
@@ -205,8 +284,8 @@ def _to_mon_str(mon):
         name, species = name_row.split('(')
     else:
         name, species = name_row, ''
-    item = name_to_id(item)
-    species = name_to_id(species)
+    item = to_id(item)
+    species = to_id(species)
     name = name.strip()
     ivs = [''] * 6
     evs = [''] * 6
@@ -218,21 +297,21 @@ def _to_mon_str(mon):
     level = ''
     for row in rest:
         if 'Ability:' in row:
-            ability = name_to_id(row.replace('Ability:', ''))
+            ability = to_id(row.replace('Ability:', ''))
         elif 'EVs:' in row:
             evs = _extract_nums(row)
         elif 'IVs:' in row:
             ivs = _extract_nums(row)
         elif '- ' in row:
-            moves.append(name_to_id(row))
+            moves.append(to_id(row))
         elif 'Shiny:' in row:
             shiny = 'S'
         elif 'Nature' in row:
             nature = row.replace(' Nature', '')
         elif 'Level:' in row:
-            level = name_to_id(row.replace('Level:', ''))
+            level = to_id(row.replace('Level:', ''))
         elif 'Happiness:' in row:
-            happiness = name_to_id(row.replace('Happiness:', ''))
+            happiness = to_id(row.replace('Happiness:', ''))
     ivs = ','.join(ivs)
     evs = ','.join(evs)
     moves = ','.join(moves)
@@ -252,8 +331,6 @@ def to_team_str(team):
     try:
         mon_strs = map(_to_mon_str, team.split('\n\n'))
         return ']'.join(mon_strs)
-    except:
-        traceback.print_exc()
-        print('Problem occurred while parsing:')
-        print(team)
+    except Exception:
+        logger.exception('Problem occurred while parsing:\n%s', team)
         return 'null'
\ No newline at end of file
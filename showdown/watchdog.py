@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""Module for the Watchdog class, detecting when a client's event loop is
+blocked"""
+import asyncio
+import inspect
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+#Logging setup
+logger = logging.getLogger(__name__)
+
+class Watchdog:
+    """
+    Measures the scheduling lag of a client's event loop and reports what
+    blocks it. A heartbeat task wakes up every interval seconds and records
+    how late it is. A monitor thread checks the heartbeat, and when it is
+    more than threshold seconds late, captures the task running on the loop
+    and the stack of the loop's thread, through sys._current_frames. Each
+    stall is logged, kept in the stalls attribute, and counted in the
+    client's metrics.
+
+    Args:
+        client (:obj:`showdown.client.Client`) : The client whose loop is
+            watched.
+        threshold (:obj:`int` or obj:`float`, optional) : Number of seconds
+            past which the loop is considered blocked. Defaults to .25.
+        interval (:obj:`int` or obj:`float`, optional) : Number of seconds
+            between two heartbeats, and two checks of the monitor thread.
+            Defaults to .05.
+        max_stalls (:obj:`int`, optional) : The number of stalls kept.
+            Defaults to 100.
+
+    Attributes:
+        stalls (:obj:`collections.deque`) : The last stalls, as dicts with the
+            time they were detected, their duration, the name of the task and
+            coroutine running on the loop, and the stack of the loop's thread.
+            task, coroutine and stack are None if the stall ended before the
+            monitor thread saw it.
+        stats (:obj:`dict`) : Number of heartbeats and stalls, and the last
+            and maximum lag in seconds.
+    """
+    def __init__(self, client, threshold=.25, interval=.05, max_stalls=100):
+        assert threshold > 0, 'threshold should be strictly positive'
+        assert interval > 0, 'interval should be strictly positive'
+        self.client = client
+        self.threshold = threshold
+        self.interval = interval
+        self.stalls = deque(maxlen=max_stalls)
+        self.stats = {
+            'heartbeats': 0,
+            'stalls': 0,
+            'last_lag': 0.0,
+            'max_lag': 0.0
+        }
+        self._beat = None
+        self._captured = None
+        self._loop = None
+        self._loop_thread_id = None
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def __repr__(self):
+        return '<Watchdog threshold={} stalls={}>'.format(self.threshold,
+            self.stats['stalls'])
+
+    async def run(self):
+        """
+        |coro|
+
+        Body of the heartbeat task. Starts the monitor thread, then records
+        the loop's lag every interval seconds until cancelled. Errors while
+        recording a heartbeat are logged and don't stop the task.
+        """
+        self._loop = asyncio.get_event_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._start_thread()
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+                now = time.monotonic()
+                lag = max(now - self._beat - self.interval, 0)
+                self._beat = now
+                try:
+                    self._on_heartbeat(lag)
+                except Exception:
+                    logger.exception('Watchdog heartbeat failed')
+        finally:
+            self.stop()
+
+    def _on_heartbeat(self, lag):
+        self.stats['heartbeats'] += 1
+        self.stats['last_lag'] = lag
+        self.stats['max_lag'] = max(self.stats['max_lag'], lag)
+        metrics = getattr(self.client, 'metrics', None)
+        if metrics is not None:
+            metrics['loop_lag_seconds'].set(lag)
+            metrics['loop_lag_histogram_seconds'].observe(lag)
+        stall, self._captured = self._captured, None
+        if lag < self.threshold:
+            return
+        if stall is None:
+            stall = {'time': time.time() - lag, 'task': None,
+                'coroutine': None, 'stack': None}
+        stall['duration'] = lag
+        self.stalls.append(stall)
+        self.stats['stalls'] += 1
+        if metrics is not None:
+            metrics['loop_stalls_total'].inc()
+        logger.warning('Event loop blocked for %.3fs by %s (task %s)%s', lag,
+            stall['coroutine'], stall['task'],
+            ''.join(['\n'] + stall['stack']) if stall['stack'] else '')
+
+    def _start_thread(self):
+        if self._thread is not None:
+            # Wait for the thread of a previous connection to exit
+            self._stopped.set()
+            self._thread.join()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._monitor,
+            name='showdown-watchdog', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops the monitor thread. The heartbeat task is stopped with the
+        client's other tasks.
+        """
+        self._stopped.set()
+
+    def _monitor(self):
+        while not self._stopped.wait(self.interval):
+            beat = self._beat
+            if beat is None or self._captured is not None:
+                continue
+            if time.monotonic() - beat > self.threshold + self.interval:
+                self._captured = self._capture()
+
+    def _capture(self):
+        """
+        Returns the task running on the loop and the stack of the loop's
+        thread. Called from the monitor thread while the loop is blocked.
+        """
+        task = asyncio.current_task(self._loop)
+        frame = sys._current_frames().get(self._loop_thread_id, None)
+        stack = traceback.format_stack(frame, limit=15) \
+            if frame is not None else None
+        # The innermost coroutine running, rather than the task's outer
+        # coroutine, which is often a wrapper such as TaskSet._bounded
+        coroutine = None
+        while frame is not None:
+            if frame.f_code.co_flags & inspect.CO_COROUTINE:
+                coroutine = getattr(frame.f_code, 'co_qualname',
+                    frame.f_code.co_name)
+                break
+            frame = frame.f_back
+        if coroutine is None and task is not None:
+            coroutine = getattr(task.get_coro(), '__qualname__', None)
+        return {
+            'time': time.time(),
+            'task': task.get_name() if task is not None else None,
+            'coroutine': coroutine,
+            'stack': stack
+        }
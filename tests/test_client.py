@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import showdown
+from showdown import mockserver
+
+def _mailbox_events(battle):
+    events = []
+    while not battle.mailbox.empty():
+        events.append(battle.mailbox.get_nowait())
+    return events
+
+def test_frame_of_several_battles_is_split_per_battle():
+    async def run():
+        client = showdown.Client('player', watchdog_threshold=None)
+        for room_id in ('battle-a-1', 'battle-a-2'):
+            await client.process_input(mockserver.init_frame(room_id,
+                'player', 'gen8randombattle'))
+            client.rooms[room_id].stop()
+        request = mockserver.request_frame('battle-a-1', 'player', 1)
+        turn = mockserver.turn_frame('battle-a-2', 1)
+        frame = 'a' + json.dumps(json.loads(request[1:])
+            + json.loads(turn[1:]))
+        await client.process_input(frame)
+        return (_mailbox_events(client.rooms['battle-a-1']),
+            _mailbox_events(client.rooms['battle-a-2']), request, turn)
+
+    first, second, request, turn = asyncio.run(run())
+    assert [event_type for event_type, _ in first] == ['request']
+    assert [event_type for event_type, _ in second] == ['turn']
+    assert first[0][1] == request
+    assert second[0][1] == turn
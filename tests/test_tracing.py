@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from showdown.tracing import percentile
+
+def test_percentile_empty():
+    assert percentile([], 50) is None
+
+def test_percentile_two_values():
+    values = [1, 2]
+    assert percentile(values, 50) == 1
+    assert percentile(values, 90) == 2
+    assert percentile(values, 100) == 2
+
+def test_percentile_six_values():
+    values = [1, 2, 3, 4, 5, 6]
+    assert percentile(values, 50) == 3
+    assert percentile(values, 90) == 6
+    assert percentile(values, 0) == 1
+
+def test_percentile_ten_values():
+    values = list(range(1, 11))
+    assert percentile(values, 50) == 5
+    assert percentile(values, 90) == 9
+    assert percentile(values, 99) == 10
+    assert percentile(values, 100) == 10
+
+def test_percentile_hundred_values():
+    values = list(range(1, 101))
+    for p in (7, 14, 28, 55, 56):
+        assert percentile(values, p) == p
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+import showdown
+from showdown import transcript
+from showdown.mockserver import MockServer
+
+async def record(path, battles, turns):
+    async with MockServer(port=0, autostart_battles=battles,
+        turns=turns) as mock:
+        client = showdown.Client('recorder', 'password', send_interval=0,
+            transcript_path=path, watchdog_threshold=None,
+            **mock.client_kwargs())
+        mock.attach(client)
+        client.start()
+        deadline = time.monotonic() + 30
+        while mock.stats['battles_finished'] < battles \
+            and time.monotonic() < deadline:
+            await asyncio.sleep(.05)
+        assert mock.stats['battles_finished'] == battles
+        await client.websocket.close()
+        while client.connected and time.monotonic() < deadline:
+            await asyncio.sleep(.05)
+        client._on_disconnect()
+
+async def replay(path):
+    client = showdown.Client('recorder', 'password', send_interval=0,
+        watchdog_threshold=None)
+    return await transcript.replay(client, path)
+
+def test_fast_replay_makes_the_recorded_decisions(tmp_path):
+    path = str(tmp_path / 'battles.jsonl.gz')
+    asyncio.run(record(path, battles=3, turns=8))
+    recorded = transcript.recorded_decisions(path)
+    assert recorded == 3 * 8
+    for _ in range(2):
+        result = asyncio.run(replay(path))
+        assert result['decisions'] == recorded